@@ -11,6 +11,7 @@ import shutil
 import stat
 import re
 
+from osg_configure.modules import profiling
 from osg_configure.modules import utilities
 from osg_configure.modules import configfile
 from osg_configure.modules import validation
@@ -190,6 +191,14 @@ class BoscoConfiguration(JobManagerConfiguration):
         self.log('BoscoConfiguration.configure completed')
         return True
         
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        files = super(BoscoConfiguration, self).written_files()
+        if self.enabled:
+            for username in self.options['users'].value.split(","):
+                files.append(os.path.expanduser("~%s/.ssh" % username.strip()))
+        return files
+
     def _installBosco(self, username):
         """
         Install Bosco on the remote cluster for a given username
@@ -272,10 +281,11 @@ Host %(host)s
                 'rms': self.options['batch'].value}
                 
             self.log("Bosco command to execute: %s" % install_cmd)
-            process = subprocess.Popen(install_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True,
-                                       preexec_fn = demote(user_uid, user_gid), env=env)
-            (stdout, stderr) = process.communicate()
-            returncode = process.wait()
+            with profiling.span('bosco_cluster', 'subprocess', command=install_cmd):
+                process = subprocess.Popen(install_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True,
+                                           preexec_fn = demote(user_uid, user_gid), env=env)
+                (stdout, stderr) = process.communicate()
+                returncode = process.wait()
             if returncode:
                 self.log("Bosco installation command failed with exit code %i" % returncode, level=logging.ERROR)
                 self.log("stdout:\n%s" % stdout, level=logging.ERROR)
@@ -299,13 +309,12 @@ Host %(host)s
         - BOSCO_ENDPOINT
 
         """
-        contents = utilities.read_file(self.HTCONDOR_CE_CONFIG_FILE,
-                                       default="# This file is managed by osg-configure\n")
-        contents = utilities.add_or_replace_setting(contents, "BOSCO_RMS", self.options['batch'].value,
-                                                    quote_value=False)
-        contents = utilities.add_or_replace_setting(contents, "BOSCO_ENDPOINT", self.options['endpoint'].value,
-                                                    quote_value=False)
-        utilities.atomic_write(self.HTCONDOR_CE_CONFIG_FILE, contents)
+        utilities.edit_settings(self.HTCONDOR_CE_CONFIG_FILE, [("BOSCO_RMS", self.options['batch'].value),
+                                                               ("BOSCO_ENDPOINT", self.options['endpoint'].value)],
+                                quote_value=False,
+                                default="# This file is managed by osg-configure\n")
+        # values looked up before are out of date now
+        utilities.condor_config_query('condor_ce_config_val').clear()
 
     def _search_config(self, host, config_path):
         """
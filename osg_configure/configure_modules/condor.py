@@ -147,6 +147,13 @@ class CondorConfiguration(JobManagerConfiguration):
         self.log('CondorConfiguration.configure completed')
         return True
 
+    def external_inputs(self):
+        """Return a list of files outside of the config files that configure() uses"""
+        inputs = [self.DEFAULT_LOCAL_CONFIG_DIR]
+        if self.options['condor_config'].value:
+            inputs.append(self.options['condor_config'].value)
+        return inputs
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Condor"
@@ -166,8 +173,17 @@ class CondorConfiguration(JobManagerConfiguration):
             self.log("Unable to configure htcondor-ce for Condor: htcondor-ce not installed", level=logging.ERROR)
             return False
 
-        def get_condor_ce_config_val(variable):
-            return utilities.get_condor_config_val(variable, executable='condor_ce_config_val', quiet_undefined=True)
+        condor_query = utilities.condor_config_query('condor_config_val')
+        condor_ce_query = utilities.condor_config_query('condor_ce_config_val')
+        settings = [('JOB_ROUTER_SCHEDD2_NAME', ['SCHEDD_NAME', 'FULL_HOSTNAME']),
+                    ('JOB_ROUTER_SCHEDD2_POOL', ['COLLECTOR_HOST']),
+                    ('JOB_ROUTER_SCHEDD2_SPOOL', ['SPOOL'])]
+        # look up everything we need with one call of each tool
+        condor_variables = ['COLLECTOR_PORT', 'LOCAL_CONFIG_DIR']
+        for _, condor_config_keys in settings:
+            condor_variables.extend(condor_config_keys)
+        condor_query.fetch(condor_variables)
+        condor_ce_query.fetch([key for key, _ in settings])
 
         # Get values for the settings we want to update. We can get the
         # values from condor_config_val; in the case of JOB_ROUTER_SCHEDD2_NAME,
@@ -176,18 +192,15 @@ class CondorConfiguration(JobManagerConfiguration):
         # only update the setting in case the value from
         # condor_config_val is different from the value from condor_ce_config_val.
         condor_ce_config = {}
-        for condor_ce_config_key, condor_config_keys in [
-            ('JOB_ROUTER_SCHEDD2_NAME', ['SCHEDD_NAME', 'FULL_HOSTNAME']),
-            ('JOB_ROUTER_SCHEDD2_POOL', ['COLLECTOR_HOST']),
-            ('JOB_ROUTER_SCHEDD2_SPOOL', ['SPOOL'])]:
+        for condor_ce_config_key, condor_config_keys in settings:
 
             condor_config_value = None
-            for condor_config_value in (utilities.get_condor_config_val(k, quiet_undefined=True) for k in
+            for condor_config_value in (condor_query.get(k, quiet_undefined=True) for k in
                                         condor_config_keys):
                 if condor_config_value:
                     break
 
-            condor_ce_config_value = get_condor_ce_config_val(condor_ce_config_key)
+            condor_ce_config_value = condor_ce_query.get(condor_ce_config_key, quiet_undefined=True)
             if not (condor_config_value or condor_ce_config_value):
                 self.log("Unable to determine value for %s from %s and default not set; check your Condor config" %
                          (condor_ce_config_key, ' or '.join(condor_config_keys)), level=logging.ERROR)
@@ -197,21 +210,19 @@ class CondorConfiguration(JobManagerConfiguration):
 
             # Special case for JOB_ROUTER_SCHEDD2_POOL: append port if necessary (SOFTWARE-1744)
             if condor_ce_config_key == 'JOB_ROUTER_SCHEDD2_POOL':
-                condor_collector_port = (utilities.get_condor_config_val('COLLECTOR_PORT', quiet_undefined=True)
-                                         or '9618')
+                condor_collector_port = condor_query.get('COLLECTOR_PORT', quiet_undefined=True) or '9618'
                 condor_config_value = self._add_port_if_necessary(condor_config_value, condor_collector_port)
 
             if not condor_ce_config_value or condor_ce_config_value != condor_config_value:
                 condor_ce_config[condor_ce_config_key] = condor_config_value
 
         if condor_ce_config:
-            buf = utilities.read_file(JobManagerConfiguration.HTCONDOR_CE_CONFIG_FILE,
-                                      default="# This file is managed by osg-configure\n")
-            for key, value in condor_ce_config.items():
-                buf = utilities.add_or_replace_setting(buf, key, value, quote_value=False)
-
-            if not utilities.atomic_write(JobManagerConfiguration.HTCONDOR_CE_CONFIG_FILE, buf):
+            if not utilities.edit_settings(JobManagerConfiguration.HTCONDOR_CE_CONFIG_FILE,
+                                           condor_ce_config.items(),
+                                           quote_value=False,
+                                           default="# This file is managed by osg-configure\n"):
                 return False
+            condor_ce_query.clear()
 
         return True
 
@@ -249,7 +260,7 @@ class CondorConfiguration(JobManagerConfiguration):
                      level=logging.WARNING)
             return
 
-        local_config_dir = utilities.get_condor_config_val('LOCAL_CONFIG_DIR', quiet_undefined=True)
+        local_config_dir = utilities.condor_config_query().get('LOCAL_CONFIG_DIR', quiet_undefined=True)
         if not local_config_dir:
             self.log("LOCAL_CONFIG_DIR cannot be determined; check your Condor config", level=logging.WARNING)
             return
@@ -4,8 +4,6 @@ import os
 import re
 import sys
 import logging
-import subprocess
-from xml.sax import saxutils
 
 from osg_configure.modules import exceptions
 from osg_configure.modules import utilities
@@ -303,6 +301,12 @@ in your config.ini file."""
         return probes
 
     # pylint: disable-msg=W0613
+    def hosts_to_resolve(self):
+        """Return the servers of the enabled probes"""
+        if self.ignored or not self.enabled:
+            return []
+        return [server.split(':')[0] for server in self.enabled_probe_settings.values()]
+
     def check_attributes(self, attributes):
         """Check configuration  and make sure things are setup correctly"""
         self.log("GratiaConfiguration.check_attributes started")
@@ -358,13 +362,13 @@ in your config.ini file."""
             probe = 'gridftp-transfer'
 
         try:
-            buf = open(probe_file).read()
-            buf = self.replace_setting(buf, 'ProbeName', "%s:%s" % (probe, hostname))
-            buf = self.replace_setting(buf, 'SiteName', site)
-            buf = self.replace_setting(buf, 'Grid', self.grid_group)
-            buf = self.replace_setting(buf, 'EnableProbe', '1')
-            for var in ['SSLHost', 'SOAPHost', 'SSLRegistrationHost', 'CollectorHost']:
-                buf = self.replace_setting(buf, var, probe_host)
+            buf = utilities.read_contents(probe_file)
+            buf = self.replace_settings(buf, [('ProbeName', "%s:%s" % (probe, hostname)),
+                                              ('SiteName', site),
+                                              ('Grid', self.grid_group),
+                                              ('EnableProbe', '1')] +
+                                        [(var, probe_host) for var in ['SSLHost', 'SOAPHost',
+                                                                       'SSLRegistrationHost', 'CollectorHost']])
 
             if not utilities.atomic_write(probe_file, buf, mode=420):
                 self.log("Error while configuring gratia probes: " +
@@ -380,6 +384,14 @@ in your config.ini file."""
         self.log("GratiaConfiguration._make_subscription completed")
         return True
 
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        return ['/etc/gratia']
+
+    def consumed_attributes(self):
+        """Return a set with the names of the attributes configure() uses"""
+        return set(['OSG_SITE_NAME', 'OSG_HOSTNAME'])
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Gratia"
@@ -482,10 +494,10 @@ in your config.ini file."""
         """
 
         config_location = GRATIA_CONFIG_FILES['condor']
-        buf = file(config_location).read()
+        buf = utilities.read_contents(config_location)
         settings = self._probe_config['condor']
-        buf = self.replace_setting(buf, 'CondorLocation', settings['condor_location'])
-        buf = self.replace_setting(buf, 'CondorConfig', settings['condor_config'])
+        buf = self.replace_settings(buf, [('CondorLocation', settings['condor_location']),
+                                          ('CondorConfig', settings['condor_config'])])
         if not utilities.atomic_write(config_location, buf):
             return False
         return True
@@ -506,9 +518,9 @@ in your config.ini file."""
             return True
 
         config_location = GRATIA_CONFIG_FILES['pbs']
-        buf = file(config_location).read()
-        buf = self.replace_setting(buf, 'pbsAcctLogDir', accounting_dir, xml_file=False)
-        buf = self.replace_setting(buf, 'lrmsType', 'pbs', xml_file=False)
+        buf = utilities.read_contents(config_location)
+        buf = self.replace_settings(buf, [('pbsAcctLogDir', accounting_dir),
+                                          ('lrmsType', 'pbs')], xml_file=False)
         if not utilities.atomic_write(config_location, buf):
             return False
         return True
@@ -532,8 +544,7 @@ in your config.ini file."""
                      section='LSF')
             return True
         config_location = GRATIA_CONFIG_FILES['lsf']
-        buf = file(config_location).read()
-        buf = self.replace_setting(buf, 'lsfAcctLogDir', log_directory, xml_file=False)
+        buf = utilities.read_contents(config_location)
 
         # setup lsfBinDir
         if (self._probe_config['lsf']['lsf_location'] is None or
@@ -544,8 +555,9 @@ in your config.ini file."""
                      section='LSF')
             return True
         lsf_bin_dir = os.path.join(self._probe_config['lsf']['lsf_location'], 'bin')
-        buf = self.replace_setting(buf, 'lsfBinDir', lsf_bin_dir, xml_file=False)
-        buf = self.replace_setting(buf, 'lrmsType', 'lsf', xml_file=False)
+        buf = self.replace_settings(buf, [('lsfAcctLogDir', log_directory),
+                                          ('lsfBinDir', lsf_bin_dir),
+                                          ('lrmsType', 'lsf')], xml_file=False)
         if not utilities.atomic_write(config_location, buf):
             return False
         return True
@@ -556,7 +568,7 @@ in your config.ini file."""
         """
         accounting_path = self._probe_config['sge']['sge_accounting_file']
         config_location = GRATIA_CONFIG_FILES['sge']
-        buf = file(config_location).read()
+        buf = utilities.read_contents(config_location)
         buf = self.replace_setting(buf, 'SGEAccountingFile', accounting_path)
         if not utilities.atomic_write(config_location, buf):
             return False
@@ -567,7 +579,7 @@ in your config.ini file."""
         Do SLURM probe specific configuration
         """
         config_location = GRATIA_CONFIG_FILES['slurm']
-        buf = file(config_location).read()
+        buf = utilities.read_contents(config_location)
 
         settings = self._probe_config['slurm']
         if not validation.valid_file(settings['db_pass']):
@@ -577,13 +589,13 @@ in your config.ini file."""
                      section='SLURM')
             return True
 
-        buf = self.replace_setting(buf, 'SlurmDbHost', settings['db_host'])
-        buf = self.replace_setting(buf, 'SlurmDbPort', settings['db_port'])
-        buf = self.replace_setting(buf, 'SlurmDbUser', settings['db_user'])
-        buf = self.replace_setting(buf, 'SlurmDbPasswordFile', settings['db_pass'])
-        buf = self.replace_setting(buf, 'SlurmDbName', settings['db_name'])
-        buf = self.replace_setting(buf, 'SlurmCluster', settings['cluster'])
-        buf = self.replace_setting(buf, 'SlurmLocation', settings['location'])
+        buf = self.replace_settings(buf, [('SlurmDbHost', settings['db_host']),
+                                          ('SlurmDbPort', settings['db_port']),
+                                          ('SlurmDbUser', settings['db_user']),
+                                          ('SlurmDbPasswordFile', settings['db_pass']),
+                                          ('SlurmDbName', settings['db_name']),
+                                          ('SlurmCluster', settings['cluster']),
+                                          ('SlurmLocation', settings['location'])])
 
         if not utilities.atomic_write(config_location, buf):
             return False
@@ -595,7 +607,7 @@ in your config.ini file."""
         Set to suppress grid local jobs (pre-routed jobs)
         """
         config_location = GRATIA_CONFIG_FILES['htcondor-ce']
-        buf = file(config_location).read()
+        buf = utilities.read_contents(config_location)
         buf = self.replace_setting(buf, 'SuppressGridLocalRecords', '1')
         
         if not utilities.atomic_write(config_location, buf):
@@ -625,7 +637,7 @@ in your config.ini file."""
             return False
 
         config_location = GRATIA_CONFIG_FILES['condor']
-        contents = file(config_location).read()
+        contents = utilities.read_contents(config_location)
         re_obj = re.compile(r'(?m)^\s*DataFolder\s*=(.*)\s*$')
         match = re_obj.search(contents)
         if match is not None:
@@ -673,21 +685,14 @@ in your config.ini file."""
         return valid
 
     def _get_history_dir(self, condor_config_val_bin):
-        cmd = [condor_config_val_bin, '-schedd', 'PER_JOB_HISTORY_DIR']
-        try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            (history_dir, errtext) = process.communicate()
-            if process.returncode != 0:
+        query = utilities.condor_config_query(condor_config_val_bin, daemon='schedd')
+        history_dir = query.get('PER_JOB_HISTORY_DIR', quiet_undefined=True)
+        if not history_dir:
+            error = query.error('PER_JOB_HISTORY_DIR')
+            if error and not error.startswith('Not defined'):
                 self.log("While checking gratia parameters: %s failed. Output follows:\n%s" % (condor_config_val_bin,
-                                                                                               errtext),
+                                                                                               error),
                          level=logging.INFO)
-                return None
-        except OSError as err:
-            self.log("While checking gratia parameters: Error running %s: %s" % (condor_config_val_bin, str(err)),
-                     level=logging.INFO)
-            return None
-        history_dir = history_dir.strip()
-        if history_dir.startswith('Not defined'):
             return None
         return history_dir
 
@@ -704,22 +709,34 @@ in your config.ini file."""
 
           returns the string with the option string replaced/added
         """
-        value = str(value)
+        return GratiaConfiguration.replace_settings(buf, [(setting, value)], xml_file)
+
+    @staticmethod
+    def replace_settings(buf, settings, xml_file=True):
+        """
+          Like replace_setting() for a list of (setting, value) tuples, in a
+          single pass over buf
+        """
         if xml_file:
-            quoted_value = saxutils.quoteattr(value)
+            # saxutils pulls in urllib and ssl, only import it when needed
+            from xml.sax import saxutils
+            quote = saxutils.quoteattr
         else:
             # urCollector.conf files are a custom format that require '"'
             # surrounding the value but support no escaping of quotes or
             # anything.
-            quoted_value = '"' + value + '"'
+            quote = lambda value: '"' + value + '"'
 
-        re_obj = re.compile(r"^(\s*)%s\s*=.*$" % setting, re.MULTILINE)
-        new_buf, count = re_obj.subn(r'\1%s=%s' % (setting, quoted_value), buf, 1)
-        if count == 0:
+        editor = utilities.SettingsEditor(buf)
+        missing = editor.update(settings,
+                                lambda indent, setting, value: "%s%s=%s" % (indent, setting, quote(str(value))))
+        new_buf = editor.getvalue()
+        if missing:
             if xml_file:
-                new_buf = new_buf.replace('/>', "    %s=%s\n/>" % (setting, quoted_value))
+                new_buf = new_buf.replace('/>', ''.join("    %s=%s\n" % (setting, quote(str(value)))
+                                                        for setting, value in missing) + '/>')
             else:
-                new_buf += "%s = %s\n" % (setting, quoted_value)
+                new_buf += ''.join("%s = %s\n" % (setting, quote(str(value))) for setting, value in missing)
         return new_buf
 
     def enabled_services(self):
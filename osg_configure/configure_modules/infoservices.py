@@ -1,22 +1,21 @@
 """This module provides a class to handle configuration
  for CE collector info services"""
 
-import re
 import os
 import ConfigParser
-import subprocess
 import sys
 import logging
 
+from osg_configure.configure_modules import misc
 from osg_configure.configure_modules.misc import MiscConfiguration
 from osg_configure.modules import exceptions
 from osg_configure.modules import utilities
-from osg_configure.modules import gums_supported_vos
 from osg_configure.modules import validation
 from osg_configure.modules import configfile
 from osg_configure.modules.baseconfiguration import BaseConfiguration
 from osg_configure.modules import subcluster
 from osg_configure.modules import reversevomap
+from osg_configure.modules import uservomap
 
 __all__ = ['InfoServicesConfiguration']
 
@@ -32,10 +31,14 @@ BAN_MAPFILE = '/etc/grid-security/ban-mapfile'
 # coincidentally the same. If they ever change, make a mapping.
 BATCH_SYSTEMS = ['Condor', 'LSF', 'PBS', 'SGE', 'SLURM']
 
-try:
-    import classad
-except ImportError:
-    classad = None
+
+def _classad_available():
+    """Return True if the classad module can be imported, it's only imported when it's needed"""
+    try:
+        import classad  # pylint: disable-msg=W0612
+    except ImportError:
+        return False
+    return True
 
 
 class InfoServicesConfiguration(BaseConfiguration):
@@ -60,7 +63,7 @@ class InfoServicesConfiguration(BaseConfiguration):
                 HTCONDOR_CE_COLLECTOR_PORT, HTCONDOR_CE_COLLECTOR_PORT)
 
         self.ce_collectors = []
-        self.ce_collector_required_rpms_installed = utilities.rpm_installed('htcondor-ce')
+        self._ce_collector_required_rpms_installed = None
         self.osg_resource = ""
         self.osg_resource_group = ""
         self.enabled_batch_systems = []
@@ -73,6 +76,13 @@ class InfoServicesConfiguration(BaseConfiguration):
 
         self.log("InfoServicesConfiguration.__init__ completed")
 
+    @property
+    def ce_collector_required_rpms_installed(self):
+        """Whether htcondor-ce is installed, only checked when it's needed"""
+        if self._ce_collector_required_rpms_installed is None:
+            self._ce_collector_required_rpms_installed = utilities.rpm_installed('htcondor-ce')
+        return self._ce_collector_required_rpms_installed
+
     def _set_default_servers(self, configuration):
         group = utilities.config_safe_get(configuration, 'Site Information', 'group')
         if group == 'OSG-ITB':
@@ -158,7 +168,7 @@ class InfoServicesConfiguration(BaseConfiguration):
         # This is a bit clunky to parse it here and not use the result in
         # configure(), but at this point we don't have a way of knowing what
         # default_allowed_vos should be.
-        if self.ce_collector_required_rpms_installed and self.htcondor_gateway_enabled and classad is not None:
+        if self.ce_collector_required_rpms_installed and self.htcondor_gateway_enabled and _classad_available():
             subcluster.resource_catalog_from_config(self.subcluster_sections, default_allowed_vos=None)
 
         self.log('InfoServicesConfiguration.parse_configuration completed')
@@ -180,7 +190,7 @@ class InfoServicesConfiguration(BaseConfiguration):
             return True
 
         if self.ce_collector_required_rpms_installed and self.htcondor_gateway_enabled:
-            if classad is None:
+            if not _classad_available():
                 self.log("Cannot configure HTCondor CE info services: unable to import HTCondor Python bindings."
                          "\nEnsure the 'classad' Python module is installed and accessible to Python scripts."
                          "\nIf using HTCondor from RPMs, install the 'condor-python' RPM."
@@ -207,7 +217,7 @@ class InfoServicesConfiguration(BaseConfiguration):
                     if using_gums:
                         self.misc_module.update_gums_client_location()
                     self._ensure_valid_user_vo_file()
-                    default_allowed_vos = utilities.get_vos(USER_VO_MAP_LOCATION)
+                    default_allowed_vos = uservomap.load(USER_VO_MAP_LOCATION).get_vos()
                 if not default_allowed_vos:
                     # UGLY: only issue the warning if the admin has requested autodetection for some of their SCs/REs
                     raise_warning = False
@@ -236,6 +246,20 @@ class InfoServicesConfiguration(BaseConfiguration):
         self.log("InfoServicesConfiguration.configure completed")
         return True
 
+    def external_inputs(self):
+        """Return a list of files outside of the config files that configure() uses"""
+        return [BAN_MAPFILE,
+                BAN_VOMS_MAPFILE,
+                reversevomap.DEFAULT_VOMS_MAPFILE,
+                reversevomap.VOMS_MAPFILE.strip()]
+
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        return [CE_COLLECTOR_ATTRIBUTES_FILE,
+                CE_COLLECTOR_CONFIG_FILE,
+                USER_VO_MAP_LOCATION,
+                misc.GUMS_CLIENT_LOCATION]
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Infoservices"
@@ -263,6 +287,8 @@ class InfoServicesConfiguration(BaseConfiguration):
                 self.log("Writing %s %r failed" % (description, filename),
                          level=logging.ERROR)
                 return False
+        # values looked up before are out of date now
+        utilities.condor_config_query('condor_ce_config_val').clear()
 
         resourcecatalog_location = self._resourcecatalog_location()
         if not resourcecatalog_location:
@@ -326,31 +352,23 @@ CONDOR_VIEW_HOST = %s
 
         """
         errlevel = logging.ERROR
-        try:
-            process = subprocess.Popen(['condor_ce_config_val', '-verbose', 'OSG_ResourceCatalog'],
-                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output, error = process.communicate()
-            if process.returncode != 0:
-                if not (error and error.startswith('Not defined:')):
-                    self.log('condor_ce_config_val OSG_ResourceCatalog failed; exit %d; error %s' % (
-                    process.returncode, error),
-                             level=errlevel)
-                return None
-        except OSError as err:
-            self.log('Could not run condor_ce_config_val: %s' % str(err), level=errlevel)
-            return None
-        output = output.strip()
-        match = re.search(r'# at: (\S+), line \d+', output)
-        if not match:
-            self.log('Could not find definition of OSG_ResourceCatalog; condor_ce_config_val output was: \n%s' % output,
+        query = utilities.condor_config_query('condor_ce_config_val')
+        location = query.location('OSG_ResourceCatalog')
+        if location:
+            return location[0]
+        error = query.error('OSG_ResourceCatalog')
+        if error and not error.startswith('Not defined:'):
+            self.log('condor_ce_config_val OSG_ResourceCatalog failed; error %s' % error,
                      level=errlevel)
-            return None
-        else:
-            return match.group(1)
+        elif query.get('OSG_ResourceCatalog', quiet_undefined=True) is not None:
+            self.log('Could not find definition of OSG_ResourceCatalog in the condor-ce config files',
+                     level=errlevel)
+        return None
 
     def _ensure_valid_user_vo_file(self):
         using_gums = self.authorization_method == 'xacml'
-        if not (validation.valid_user_vo_file(USER_VO_MAP_LOCATION) and utilities.get_vos(USER_VO_MAP_LOCATION)):
+        user_vo_map = uservomap.load(USER_VO_MAP_LOCATION)
+        if not (user_vo_map.valid and user_vo_map.vos):
             self.log("Trying to create user-vo-map file", level=logging.INFO)
             result = False
             if using_gums:
@@ -362,6 +380,7 @@ CONDOR_VIEW_HOST = %s
                     try:
                         sys.stdout.write("Querying GUMS server via JSON interface. This may take some time\n")
                         sys.stdout.flush()
+                        from osg_configure.modules import gums_supported_vos
                         user_vo_file_text = gums_supported_vos.gums_json_user_vo_map_file(self.gums_host)
                         open(USER_VO_MAP_LOCATION, "w").write(user_vo_file_text)
                         return True
@@ -372,8 +391,9 @@ CONDOR_VIEW_HOST = %s
                 sys.stdout.flush()
                 result = utilities.run_script(['/usr/sbin/edg-mkgridmap'])
 
-            temp, invalid_lines = validation.valid_user_vo_file(USER_VO_MAP_LOCATION, True)
-            result = result and temp
+            user_vo_map = uservomap.load(USER_VO_MAP_LOCATION)
+            invalid_lines = user_vo_map.invalid_lines
+            result = result and user_vo_map.valid
             if not result:
                 if not invalid_lines:
                     self.log("Empty %s generated, please check the GUMS configuration (if using GUMS), "
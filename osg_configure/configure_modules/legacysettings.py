@@ -87,6 +87,10 @@ class LegacyConfiguration(BaseConfiguration):
         self.log('LegacyConfiguration.configure completed')
         return True
 
+    def consumed_attributes(self):
+        """Return None since configure() looks up an attribute for every option"""
+        return None
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Legacy"
@@ -164,10 +164,8 @@ class LSFConfiguration(JobManagerConfiguration):
 
     def write_lsf_confpath_to_blah_config(self):
         if os.path.exists(self.BLAH_CONFIG):
-            contents = utilities.read_file(self.BLAH_CONFIG)
-            contents = utilities.add_or_replace_setting(contents, 'lsf_confpath', self.options['lsf_conf'].value,
-                                                        quote_value=True)
-            utilities.atomic_write(self.BLAH_CONFIG, contents)
+            utilities.edit_settings(self.BLAH_CONFIG, [('lsf_confpath', self.options['lsf_conf'].value)],
+                                    quote_value=True)
 
     def enabled_services(self):
         """Return a list of  system services needed for module to work
@@ -59,10 +59,16 @@ class MiscConfiguration(BaseConfiguration):
                             configfile.Option(name='copy_host_cert_for_service_certs',
                                               required=configfile.Option.OPTIONAL,
                                               opt_type=bool,
-                                              default_value=False)}
+                                              default_value=False),
+                        'fetch_crl_deadline':
+                            configfile.Option(name='fetch_crl_deadline',
+                                              required=configfile.Option.OPTIONAL,
+                                              opt_type=int,
+                                              default_value=0)}
         self.config_section = "Misc Services"
         self.htcondor_gateway_enabled = True
         self.authorization_method = None
+        self._fetch_crl = None
         self.log('MiscConfiguration.__init__ completed')
 
     def parse_configuration(self, configuration):
@@ -91,6 +97,13 @@ class MiscConfiguration(BaseConfiguration):
 
         self.log('MiscConfiguration.parse_configuration completed')
 
+    def hosts_to_resolve(self):
+        """Return the GUMS host if check_attributes() checks it"""
+        if (self.enabled and self.authorization_method == 'xacml' and
+                not utilities.blank(self.options['gums_host'].value)):
+            return [self.options['gums_host'].value]
+        return []
+
     # pylint: disable-msg=W0613
     def check_attributes(self, attributes):
         """Check attributes currently stored and make sure that they are consistent"""
@@ -135,9 +148,23 @@ class MiscConfiguration(BaseConfiguration):
             self.log(msg, options='glexec_location', section=self.config_section, level=logging.ERROR)
             attributes_ok = False
 
+        if self.options['fetch_crl_deadline'].value < 0:
+            self.log("fetch_crl_deadline must be 0 or a positive number of seconds",
+                     option='fetch_crl_deadline',
+                     section=self.config_section,
+                     level=logging.ERROR)
+            attributes_ok = False
+
         self.log('MiscConfiguration.check_attributes completed')
         return attributes_ok
 
+    def start_configure(self):
+        """Start fetch-crl in the background"""
+        if not self.enabled or self._fetch_crl is not None:
+            return
+        deadline = self.options['fetch_crl_deadline'].value or None
+        self._fetch_crl = utilities.FetchCrl(deadline=deadline).start()
+
     def configure(self, attributes):
         """Configure installation using attributes"""
         self.log('MiscConfiguration.configure started')
@@ -147,10 +174,8 @@ class MiscConfiguration(BaseConfiguration):
             self.log('MiscConfiguration.configure completed')
             return True
 
-        # run fetch-crl script
-        if not utilities.fetch_crl():
-            self.log("Error while running fetch-crl script", level=logging.ERROR)
-            raise exceptions.ConfigureError('fetch-crl returned non-zero exit code')
+        # run fetch-crl script, unless it was started already
+        self.start_configure()
 
         if self.authorization_method == 'xacml':
             self._set_lcmaps_callout(True)
@@ -173,9 +198,31 @@ class MiscConfiguration(BaseConfiguration):
         if self.htcondor_gateway_enabled and utilities.ce_installed():
             self.write_gridmap_to_htcondor_ce_config()
 
+        # nothing here needs the CRLs, finish_configure() waits for fetch-crl
+        # after the other modules are configured
         self.log('MiscConfiguration.configure completed')
         return True
 
+    def finish_configure(self):
+        """Wait for fetch-crl to finish if it was started"""
+        if self._fetch_crl is None:
+            return
+        fetch_crl, self._fetch_crl = self._fetch_crl, None
+        if not fetch_crl.wait():
+            self.log("Error while running fetch-crl script", level=logging.ERROR)
+            raise exceptions.ConfigureError('fetch-crl returned non-zero exit code')
+
+    def external_inputs(self):
+        """Return a list of files outside of the config files that configure() uses"""
+        return [LCMAPS_DB_TEMPLATES_LOCATION]
+
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        return [GSI_AUTHZ_LOCATION,
+                GUMS_CLIENT_LOCATION,
+                LCMAPS_DB_LOCATION,
+                HTCONDOR_CE_CONFIG_FILE]
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Misc"
@@ -206,7 +253,7 @@ class MiscConfiguration(BaseConfiguration):
             gums_properties += "gums.authz=https://%s:8443" % (self.options['gums_host'].value)
             gums_properties += "/gums/services/GUMSXACMLAuthorizationServicePort"
         else:
-            gums_properties = open(GUMS_CLIENT_LOCATION).read()
+            gums_properties = utilities.read_contents(GUMS_CLIENT_LOCATION)
             replacement = "gums.location=https://%s:8443" % (self.options['gums_host'].value)
             replacement += "/gums/services/GUMSAdmin"
             gums_properties = location_re.sub(replacement, gums_properties)
@@ -285,12 +332,14 @@ class MiscConfiguration(BaseConfiguration):
         return services
 
     def write_gridmap_to_htcondor_ce_config(self):
-        contents = utilities.read_file(HTCONDOR_CE_CONFIG_FILE,
-                                       default="# This file is managed by osg-configure\n")
         if 'gridmap' not in self.authorization_method:
             # Remove GRIDMAP setting
-            contents = re.sub(r'(?m)^\s*GRIDMAP\s*=.*?$[\n]?', "", contents)
+            utilities.edit_file(HTCONDOR_CE_CONFIG_FILE,
+                                lambda contents: re.sub(r'(?m)^\s*GRIDMAP\s*=.*?$[\n]?', "", contents),
+                                default="# This file is managed by osg-configure\n")
         else:
-            contents = utilities.add_or_replace_setting(contents, "GRIDMAP", "/etc/grid-security/grid-mapfile",
-                                                        quote_value=False)
-        utilities.atomic_write(HTCONDOR_CE_CONFIG_FILE, contents)
+            utilities.edit_settings(HTCONDOR_CE_CONFIG_FILE, [("GRIDMAP", "/etc/grid-security/grid-mapfile")],
+                                    quote_value=False,
+                                    default="# This file is managed by osg-configure\n")
+        # values looked up before are out of date now
+        utilities.condor_config_query('condor_ce_config_val').clear()
@@ -2,11 +2,13 @@
 
 import os
 import re
-import shutil
 import logging
 import ConfigParser
+import cPickle
+import cStringIO
 import pwd
 
+from osg_configure.version import __version__
 from osg_configure.modules import exceptions
 from osg_configure.modules import utilities
 from osg_configure.modules import validation
@@ -15,6 +17,16 @@ from osg_configure.modules.baseconfiguration import BaseConfiguration
 
 __all__ = ['RsvConfiguration']
 
+# Ways of enabling metrics: writing the metric config files directly,
+# running rsv-control, or running rsv-control and checking that the files
+# it wrote match the ones that would have been written directly
+METRIC_WRITERS = ['native', 'rsv-control', 'check']
+# Files in the RSV config dir that hold settings rather than metric and
+# consumer state
+SETTINGS_CONF_FILES = ['rsv.conf', 'rsv-nagios.conf', 'rsv-zabbix.conf']
+# Index of the RSV meta files, kept between runs until the meta dir changes
+META_CACHE_FILE = '/var/lib/osg/rsv-meta.cache'
+
 
 class RsvConfiguration(BaseConfiguration):
     """Class to handle attributes and configuration related to osg-rsv services"""
@@ -113,7 +125,11 @@ class RsvConfiguration(BaseConfiguration):
                             configfile.Option(name='zabbix_use_sender',
                                               required=configfile.Option.OPTIONAL,
                                               opt_type=bool,
-                                              default_value=False)}
+                                              default_value=False),
+                        'metric_writer':
+                            configfile.Option(name='metric_writer',
+                                              required=configfile.Option.OPTIONAL,
+                                              default_value='rsv-control')}
 
         self._rsv_user = "rsv"
         self._ce_hosts = []
@@ -125,7 +141,9 @@ class RsvConfiguration(BaseConfiguration):
         self._gratia_probes_2d = []
         self._gratia_metric_map = {}
         self._enable_rsv_downloads = False
-        self._meta = ConfigParser.RawConfigParser()
+        self._meta_index = MetaIndex()
+        self._metric_batch = MetricBatch()
+        self._desired_files = {}
         self.htcondor_gateway_enabled = True
         self.use_service_cert = True
         self.copy_host_cert_for_service_cert = False
@@ -135,6 +153,7 @@ class RsvConfiguration(BaseConfiguration):
         self.rsv_conf_dir = '/etc/rsv'
         self.rsv_control = '/usr/bin/rsv-control'
         self.rsv_meta_dir = '/etc/rsv/meta/metrics'
+        self.rsv_meta_cache = META_CACHE_FILE
         self.rsv_metrics_dir = '/etc/rsv/metrics'
         self.rsv_conf = '/etc/rsv/rsv.conf'
         self.uid = None
@@ -252,6 +271,13 @@ class RsvConfiguration(BaseConfiguration):
 
         attributes_ok &= self._check_auth_settings()
 
+        if self.options['metric_writer'].value not in METRIC_WRITERS:
+            self.log("metric_writer must be one of: %s" % ", ".join(METRIC_WRITERS),
+                     section=self.config_section,
+                     option='metric_writer',
+                     level=logging.ERROR)
+            attributes_ok = False
+
         # check hosts
         attributes_ok &= self._validate_host_list(self._ce_hosts, "ce_hosts")
         attributes_ok &= self._validate_host_list(self._gums_hosts, "gums_hosts")
@@ -285,24 +311,33 @@ class RsvConfiguration(BaseConfiguration):
             self.log('RsvConfiguration.configure completed')
             return True
 
+        # Metric and consumer config files to write when metric_writer is native
+        self._desired_files = {}
+        native = self.options['metric_writer'].value == 'native'
         try:
-            # Reset always?
-            self._reset_configuration()
             self._create_cert_key_if_needed()
             # Put proxy information into rsv.conf
             self._configure_cert_info()
-            # Enable consumers
-            self._configure_consumers()
-            # Enable metrics
+            # Queue the metrics to enable
             self._configure_ce_metrics()
             self._configure_gums_metrics()
             self._configure_gridftp_metrics()
             self._configure_gratia_metrics()
             self._configure_local_metrics()
             self._configure_srm_metrics()
+            # rsv-control only adds to the existing state so remove what
+            # it wouldn't write now first
+            if not native:
+                self._remove_stale_rsv_files()
+            # Enable consumers
+            self._configure_consumers()
+            # Enable metrics
+            self._run_metric_batch()
             self._configure_condor_cron_ids()
             self._configure_default_ce_type()
             self._configure_ce_types()
+            if native:
+                self._sync_rsv_files()
             # Setup Apache?  I think this is done in the RPM
 
             self._configure_condor_location()
@@ -312,6 +347,12 @@ class RsvConfiguration(BaseConfiguration):
         self.log('RsvConfiguration.configure completed')
         return True
 
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        return [self.rsv_conf_dir,
+                '/etc/sysconfig/condor-cron',
+                '/etc/condor-cron/config.d']
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "RSV"
@@ -423,29 +464,47 @@ class RsvConfiguration(BaseConfiguration):
 
         return check_value
 
-    def _reset_configuration(self):
-        """ Reset all metrics and consumers to disabled """
-
-        self.log("Resetting all metrics and consumers to disabled")
+    def _remove_stale_rsv_files(self):
+        """Remove the metric and consumer config files that rsv-control
+        wouldn't write now: the files of hosts, metrics and consumers that
+        are no longer enabled and the files with settings that aren't wanted
+        anymore.  rsv-control only adds settings, so it recreates the removed
+        files that are still needed; the other files are left untouched.
 
-        for filename in os.listdir(self.rsv_conf_dir):
-            if not re.search('\.conf$', filename):
-                continue
-
-            if filename in ('rsv.conf', 'rsv-nagios.conf', 'rsv-zabbix.conf'):
-                continue
+        :raise ConfigFailed: if a metric has no meta file
 
-            path = os.path.join(self.rsv_conf_dir, filename)
-            self.log("Removing %s as part of reset" % path)
-            os.unlink(path)
+        """
+        desired = {}
+        for path, (_, sections) in self._desired_metric_configs().items():
+            desired[path] = sections
+        consumers_conf = os.path.join(self.rsv_conf_dir, 'consumers.conf')
+        desired[consumers_conf] = {'consumers': {'enabled': ", ".join(self._consumer_list())}}
+        if self.htcondor_gateway_enabled:
+            for host in self._htcondor_ce_hosts:
+                allmetrics_conf_path = os.path.join(self.rsv_metrics_dir, host, "allmetrics.conf")
+                desired[allmetrics_conf_path] = {'allmetrics': {'ce-type': 'htcondor-ce'}}
 
-        # Remove any host specific metric configuration
-        for directory in os.listdir(self.rsv_metrics_dir):
-            path = os.path.join(self.rsv_metrics_dir, directory)
-            if not os.path.isdir(path):
+        removed = 0
+        for path in sorted(self._managed_rsv_files()):
+            if path in desired and config_within(path, desired[path]):
                 continue
-
-            shutil.rmtree(path)
+            try:
+                os.unlink(path)
+                removed += 1
+                self.log("Removed %s" % path)
+            except OSError as err:
+                self.log("Error removing %s: %s" % (path, err), level=logging.ERROR)
+        self._remove_empty_host_dirs()
+        self.log("RSV metric and consumer configuration: %d stale files removed" % removed,
+                 level=logging.INFO)
+
+    def _remove_empty_host_dirs(self):
+        """Remove the metric directories of hosts that no longer have metrics"""
+        if os.path.isdir(self.rsv_metrics_dir):
+            for directory in os.listdir(self.rsv_metrics_dir):
+                path = os.path.join(self.rsv_metrics_dir, directory)
+                if os.path.isdir(path) and not os.listdir(path):
+                    os.rmdir(path)
 
     def _create_cert_key_if_needed(self):
         if not self.copy_host_cert_for_service_cert:
@@ -468,26 +527,11 @@ class RsvConfiguration(BaseConfiguration):
         Examine meta info and return the metrics that are enabled by default
         for the defined type
         """
-
-        metrics = []
-
-        for metric in self._meta.sections():
-            if re.search(" env$", metric):
-                continue
-
-            if self._meta.has_option(metric, "service-type"):
-                if self._meta.get(metric, "service-type") == metric_type:
-                    if not enabled:
-                        metrics.append(metric)
-                    else:
-                        if self._meta.has_option(metric, "enable-by-default"):
-                            if self._meta.get(metric, "enable-by-default") == "true":
-                                metrics.append(metric)
-
-        return metrics
+        return self._meta_index.metrics_by_type(metric_type, enabled)
 
     def _enable_metrics(self, host, metrics, args=None):
-        """Given a host and array of metrics, enable them via rsv-control
+        """Given a host and array of metrics, queue them to be enabled via
+        rsv-control by _run_metric_batch()
 
         :param host: FQDN of host to enable metrics for
         :type host: str
@@ -495,24 +539,163 @@ class RsvConfiguration(BaseConfiguration):
         :type metrics: list
         :param args: extra arguments to rsv-control
         :type args: list or None
-        :raise ConfigFailed: if rsv-control fails
 
         """
-        # need this to prevent weird behaviour if [] as a default argument in function def
-        args = args or []
-        if not metrics:
-            return
+        self._metric_batch.add(host, metrics, args)
 
-        if not utilities.run_script([self.rsv_control, "-v0", "--enable", "--host", host] +
-                                            args +
-                                            metrics):
-            self.log("ERROR: Attempt to enable metrics via rsv-control failed",
-                     level=logging.ERROR)
-            self.log("Host: %s" % host,
-                     level=logging.ERROR)
-            self.log("Metrics: %s" % " ".join(metrics),
-                     level=logging.ERROR)
-            raise exceptions.ConfigureError
+    def _run_metric_batch(self):
+        """Enable the metrics queued by _enable_metrics() using the method
+        given by the metric_writer option
+
+        :raise ConfigFailed: if enabling metrics fails for any host
+
+        """
+        writer = self.options['metric_writer'].value
+        try:
+            if writer == 'native':
+                for path, (_, sections) in self._desired_metric_configs().items():
+                    self._desired_files[path] = config_text(sections)
+            else:
+                self._run_rsv_control_batch()
+                if writer == 'check':
+                    self._check_metric_configs()
+        finally:
+            self._metric_batch = MetricBatch()
+
+    def _desired_metric_configs(self):
+        """Return the config files rsv-control would write to enable the
+        queued metrics, as a dict mapping each path to a dict of sections,
+        each a dict of options
+
+        :raise ConfigFailed: if a metric has no meta file
+
+        """
+        unknown = False
+        for host, metrics, _ in self._metric_batch.calls():
+            for metric in metrics:
+                if not self._meta_index.has_metric(metric):
+                    self.log("Can't enable metric %s for host %s: no meta file for it in %s" %
+                             (metric, host, self.rsv_meta_dir),
+                             level=logging.ERROR)
+                    unknown = True
+        if unknown:
+            raise exceptions.ConfigureError("Unknown RSV metrics")
+        return self._metric_batch.config_files(self.rsv_conf_dir, self.rsv_metrics_dir)
+
+    def _managed_rsv_files(self):
+        """Return a list of the metric and consumer config files on disk"""
+        files = []
+        for filename in os.listdir(self.rsv_conf_dir):
+            path = os.path.join(self.rsv_conf_dir, filename)
+            if filename.endswith('.conf') and filename not in SETTINGS_CONF_FILES and os.path.isfile(path):
+                files.append(path)
+
+        if os.path.isdir(self.rsv_metrics_dir):
+            for directory in os.listdir(self.rsv_metrics_dir):
+                path = os.path.join(self.rsv_metrics_dir, directory)
+                if not os.path.isdir(path):
+                    continue
+                for dirpath, _, filenames in os.walk(path):
+                    files.extend([os.path.join(dirpath, filename) for filename in filenames])
+        return files
+
+    def _sync_rsv_files(self):
+        """Make the metric and consumer config files on disk match the ones
+        collected in self._desired_files: write the new and changed files
+        and remove the ones that are no longer wanted.  Each file is
+        replaced atomically so RSV never sees a partial configuration.
+
+        :raise ConfigFailed: if a file can't be written
+
+        """
+        existing = set(self._managed_rsv_files())
+        added = []
+        rewritten = []
+        removed = []
+        failed_files = []
+        for path in sorted(self._desired_files):
+            contents = self._desired_files[path]
+            if path in existing:
+                if utilities.read_file(path) == contents:
+                    continue
+                rewritten.append(path)
+            else:
+                added.append(path)
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+            except OSError as err:
+                self.log("Error creating %s: %s" % (os.path.dirname(path), err), level=logging.ERROR)
+            if not utilities.atomic_write(path, contents):
+                self.log("ERROR: Could not write %s" % path, level=logging.ERROR)
+                failed_files.append(path)
+
+        for path in sorted(existing - set(self._desired_files)):
+            try:
+                os.unlink(path)
+                removed.append(path)
+            except OSError as err:
+                self.log("Error removing %s: %s" % (path, err), level=logging.ERROR)
+
+        self._remove_empty_host_dirs()
+
+        for label, paths in (('Added', added), ('Rewrote', rewritten), ('Removed', removed)):
+            for path in paths:
+                self.log("%s %s" % (label, path))
+        self.log("RSV metric and consumer configuration: %d files added, %d rewritten, %d removed, %d unchanged" %
+                 (len(added), len(rewritten), len(removed),
+                  len(self._desired_files) - len(added) - len(rewritten)),
+                 level=logging.INFO)
+
+        if failed_files:
+            raise exceptions.ConfigureError("Failed to write %s" % ", ".join(failed_files))
+
+    def _check_metric_configs(self):
+        """Log a warning for every setting written by rsv-control that is
+        different from what the native metric writer would have written
+
+        Returns True if all the settings match
+        """
+        matches = True
+        for path, (host, sections) in sorted(self._desired_metric_configs().items()):
+            config = ConfigParser.RawConfigParser()
+            config.optionxform = str  # Conf is case-sensitive.
+            config.read(path)
+            for section, options in sorted(sections.items()):
+                for option, value in sorted(options.items()):
+                    if not config.has_option(section, option):
+                        found = None
+                    else:
+                        found = config.get(section, option)
+                    if found != value:
+                        self.log("metric_writer check for host %s: %s [%s] %s is %r, expected %r" %
+                                 (host, path, section, option, found, value),
+                                 level=logging.WARNING)
+                        matches = False
+        return matches
+
+    def _run_rsv_control_batch(self):
+        """Enable the queued metrics with one rsv-control call per host and
+        set of arguments
+
+        :raise ConfigFailed: if rsv-control fails for any host
+
+        """
+        failed_hosts = []
+        for host, metrics, args in self._metric_batch.calls():
+            if not utilities.run_script([self.rsv_control, "-v0", "--enable", "--host", host] +
+                                        args +
+                                        metrics):
+                self.log("ERROR: Attempt to enable metrics via rsv-control failed",
+                         level=logging.ERROR)
+                self.log("Host: %s" % host,
+                         level=logging.ERROR)
+                self.log("Metrics: %s" % " ".join(metrics),
+                         level=logging.ERROR)
+                if host not in failed_hosts:
+                    failed_hosts.append(host)
+        if failed_hosts:
+            raise exceptions.ConfigureError("Failed to enable RSV metrics for %s" % ", ".join(failed_hosts))
 
     def _configure_ce_metrics(self):
         """Enable CE metrics.
@@ -897,6 +1080,10 @@ class RsvConfiguration(BaseConfiguration):
         host_metrics_dir = os.path.join(self.rsv_metrics_dir, hostname)
         allmetrics_conf_path = os.path.join(host_metrics_dir, "allmetrics.conf")
 
+        if self.options['metric_writer'].value == 'native':
+            self._desired_files[allmetrics_conf_path] = config_text({'allmetrics': {'ce-type': 'htcondor-ce'}})
+            return
+
         try:
             os.mkdir(host_metrics_dir)
         except OSError:
@@ -921,8 +1108,8 @@ class RsvConfiguration(BaseConfiguration):
         finally:
             config_fp.close()
 
-    def _configure_consumers(self):
-        """ Enable the appropriate consumers """
+    def _consumer_list(self):
+        """ Return the consumers to enable """
 
         # The current logic is:
         #  - we ALWAYS want the html-consumer if we are told to install consumers
@@ -931,6 +1118,16 @@ class RsvConfiguration(BaseConfiguration):
         #  - we want the zabbix-consumer if enable_zabbix is True and rsv-consumers-zabbix is installed
 
         consumers = ["html-consumer"]
+        if self.options['enable_nagios'].value:
+            consumers.append("nagios-consumer")
+        if self.options['enable_zabbix'].value and utilities.rpm_installed('rsv-consumers-zabbix'):
+            consumers.append("zabbix-consumer")
+        return consumers
+
+    def _configure_consumers(self):
+        """ Enable the appropriate consumers """
+
+        consumers = self._consumer_list()
 
         if self.opt_val("enable_gratia"):
             self.log("Your configuration has enabled the Gratia consumer but the service which the Gratia consumer "
@@ -938,24 +1135,26 @@ class RsvConfiguration(BaseConfiguration):
                      "Gratia consumer configuration will be ignored.",
                      level=logging.WARNING)
 
-        if self.options['enable_nagios'].value:
-            consumers.append("nagios-consumer")
+        if "nagios-consumer" in consumers:
             self._configure_nagios_files()
 
         if self.options['enable_zabbix'].value:
-            if not utilities.rpm_installed('rsv-consumers-zabbix'):
+            if "zabbix-consumer" not in consumers:
                 self.log('Your configuration has enabled the Zabbix consumer '
                          'but rsv-consumers-zabbix is not installed. Zabbix consumer configuration will be ignored.',
                          level=logging.WARNING)
             else:
-                consumers.append("zabbix-consumer")
                 self._configure_zabbix_files()
 
         consumer_list = " ".join(consumers)
         self.log("Enabling consumers: %s " % consumer_list)
 
-        if not utilities.run_script([self.rsv_control, "-v0", "--enable"] + consumers):
+        if self.options['metric_writer'].value == 'native':
+            consumers_conf = os.path.join(self.rsv_conf_dir, 'consumers.conf')
+            self._desired_files[consumers_conf] = config_text({'consumers': {'enabled': ", ".join(consumers)}})
+        elif not utilities.run_script([self.rsv_control, "-v0", "--enable"] + consumers):
             raise exceptions.ConfigureError
+        # also stops the consumer if RSV is running, so native mode runs it too
         utilities.run_script([self.rsv_control, "-v0", "--disable", "gratia-consumer"])  # don't care if this fails
 
     def _configure_nagios_files(self):
@@ -1015,17 +1214,64 @@ class RsvConfiguration(BaseConfiguration):
 
     def load_rsv_meta_files(self):
         """ All the RSV meta files are in INI format.  Pull them in so that we know what
-        metrics to enable """
+        metrics to enable.  The index built from them is cached in rsv_meta_cache
+        until the meta dir changes. """
 
         if not os.path.exists(self.rsv_meta_dir):
             self.log("In RSV configuration, meta dir (%s) does not exist." % self.rsv_meta_dir)
             return
 
-        files = os.listdir(self.rsv_meta_dir)
+        # stat before reading so a change while reading invalidates the cache
+        dir_key = _meta_dir_key(self.rsv_meta_dir)
+        index = self._load_meta_cache(dir_key)
+        if index is not None:
+            self._meta_index = index
+            return
 
-        for filename in files:
+        meta = ConfigParser.RawConfigParser()
+        for filename in sorted(os.listdir(self.rsv_meta_dir)):
             if re.search('\.meta$', filename):
-                self._meta.read(os.path.join(self.rsv_meta_dir, filename))
+                meta.read(os.path.join(self.rsv_meta_dir, filename))
+        self._meta_index = MetaIndex.from_meta(meta)
+        self._save_meta_cache(dir_key)
+
+    def _load_meta_cache(self, dir_key):
+        """
+        Return the MetaIndex in the meta cache file if it was built from the
+        meta dir as it is now, or None
+        """
+        if not self.rsv_meta_cache:
+            return None
+        try:
+            cache_stat = os.stat(self.rsv_meta_cache)
+            if cache_stat.st_uid != os.getuid():
+                self.log("Ignoring %s: not owned by the current user" % self.rsv_meta_cache)
+                return None
+            cache_fh = open(self.rsv_meta_cache, 'rb')
+            try:
+                cache = cPickle.load(cache_fh)
+            finally:
+                cache_fh.close()
+            if (cache['version'] != __version__ or
+                    cache['meta_dir'] != os.path.abspath(self.rsv_meta_dir) or
+                    cache['dir_key'] != dir_key):
+                return None
+            return MetaIndex(*cache['index'])
+        except (EnvironmentError, EOFError, KeyError, TypeError, ValueError,
+                cPickle.UnpicklingError) as err:
+            self.log("Not using RSV meta cache %s: %s" % (self.rsv_meta_cache, err))
+            return None
+
+    def _save_meta_cache(self, dir_key):
+        """Write the meta index to the meta cache file"""
+        if not self.rsv_meta_cache:
+            return
+        cache = {'version': __version__,
+                 'meta_dir': os.path.abspath(self.rsv_meta_dir),
+                 'dir_key': dir_key,
+                 'index': self._meta_index.contents()}
+        if not utilities.atomic_write(self.rsv_meta_cache, cPickle.dumps(cache, 2), mode=0o644):
+            self.log("Could not write RSV meta cache %s" % self.rsv_meta_cache)
 
     def split_2d_list(self, item_list):
         """
@@ -1149,7 +1395,7 @@ class RsvConfiguration(BaseConfiguration):
         """
         # check the uid/gid in the condor_ids file
         condor_id_fname = "/etc/condor-cron/config.d/condor_ids"
-        ids = open(condor_id_fname).read()
+        ids = utilities.read_contents(condor_id_fname)
         id_regex = re.compile(r'^\s*CONDOR_IDS\s+=\s+(\d+)\.(\d+).*', re.MULTILINE)
         condor_ent = pwd.getpwnam('cndrcron')
         match = id_regex.search(ids)
@@ -1173,6 +1419,172 @@ class RsvConfiguration(BaseConfiguration):
                 raise exceptions.ConfigureError
 
 
+def _meta_dir_key(path):
+    """
+    Return a key that changes when meta files are added to, removed from,
+    replaced in or edited in the directory at path: the inode and mtime (in
+    ns) of the directory and the name, inode, size and mtime of each meta
+    file
+    """
+    path_stat = os.stat(path)
+    files = []
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith('.meta'):
+            continue
+        try:
+            file_stat = os.stat(os.path.join(path, filename))
+        except OSError:
+            continue
+        files.append((filename, file_stat.st_ino, file_stat.st_size, int(round(file_stat.st_mtime * 1e9))))
+    return path_stat.st_ino, int(round(path_stat.st_mtime * 1e9)), tuple(files)
+
+
+class MetaIndex(object):
+    """
+    The metrics described by the RSV meta files, indexed by service type
+    """
+
+    def __init__(self, metrics=None, by_type=None, enabled_by_type=None):
+        self.metrics = set(metrics or [])
+        # service type -> list of metrics, in the order they were read
+        self.by_type = by_type or {}
+        # service type -> list of metrics that are enabled by default
+        self.enabled_by_type = enabled_by_type or {}
+
+    @classmethod
+    def from_meta(cls, meta):
+        """Build an index from a RawConfigParser holding the meta files"""
+        index = cls()
+        for metric in meta.sections():
+            if re.search(" env$", metric):
+                continue
+            index.metrics.add(metric)
+            if not meta.has_option(metric, "service-type"):
+                continue
+            metric_type = meta.get(metric, "service-type")
+            index.by_type.setdefault(metric_type, []).append(metric)
+            if (meta.has_option(metric, "enable-by-default") and
+                    meta.get(metric, "enable-by-default") == "true"):
+                index.enabled_by_type.setdefault(metric_type, []).append(metric)
+        return index
+
+    def contents(self):
+        """Return the arguments to recreate the index with"""
+        return self.metrics, self.by_type, self.enabled_by_type
+
+    def has_metric(self, metric):
+        """Return True if there is a meta file for metric"""
+        return metric in self.metrics
+
+    def metrics_by_type(self, metric_type, enabled=True):
+        """
+        Return the metrics of metric_type, or if enabled is True only the
+        ones that are enabled by default
+        """
+        if enabled:
+            return list(self.enabled_by_type.get(metric_type, []))
+        return list(self.by_type.get(metric_type, []))
+
+
+class MetricBatch(object):
+    """
+    Metrics to enable for each host, collected so that they can be enabled
+    with as few rsv-control calls as possible
+    """
+
+    def __init__(self):
+        # (host, metric) -> tuple of rsv-control arguments, in the order added
+        self._metric_args = {}
+        self._order = []
+
+    def add(self, host, metrics, args=None):
+        """
+        Add metrics to enable for host with the extra rsv-control arguments
+        in args; if a metric was already added for host, the last arguments
+        given for it are used, as they would be by enabling it again
+        """
+        args = tuple(args or [])
+        for metric in metrics:
+            key = (host, metric)
+            if key not in self._metric_args:
+                self._order.append(key)
+            self._metric_args[key] = args
+
+    def calls(self):
+        """
+        Return a list of (host, metrics, args) tuples, one for each
+        rsv-control call needed to enable the metrics
+        """
+        calls = []
+        call_index = {}
+        for host, metric in self._order:
+            args = self._metric_args[(host, metric)]
+            if (host, args) not in call_index:
+                call_index[(host, args)] = len(calls)
+                calls.append((host, [], list(args)))
+            calls[call_index[(host, args)]][1].append(metric)
+        return calls
+
+    def config_files(self, rsv_conf_dir, rsv_metrics_dir):
+        """
+        Return the settings rsv-control writes to enable the metrics: each
+        host's metrics are turned on in <rsv_conf_dir>/<host>.conf and the
+        --arg arguments of a metric go in the "<metric> args" section of
+        <rsv_metrics_dir>/<host>/<metric>.conf
+
+        Returns a dict mapping each path to a (host, sections) tuple where
+        sections is a dict mapping section names to dicts of options
+        """
+        files = {}
+        for host, metric in self._order:
+            host_conf = os.path.join(rsv_conf_dir, host + '.conf')
+            files.setdefault(host_conf, (host, {}))[1].setdefault(host, {})[metric] = '1'
+            args = self._metric_args[(host, metric)]
+            metric_args = {}
+            for flag, value in zip(args[::2], args[1::2]):
+                if flag == '--arg' and '=' in value:
+                    key, value = value.split('=', 1)
+                    metric_args[key] = value
+            if metric_args:
+                metric_conf = os.path.join(rsv_metrics_dir, host, metric + '.conf')
+                files[metric_conf] = (host, {metric + ' args': metric_args})
+        return files
+
+
+def config_text(sections):
+    """
+    Return the text of an ini file with the given sections, a dict mapping
+    section names to dicts of options, with sections and options sorted
+    """
+    config = ConfigParser.RawConfigParser()
+    config.optionxform = str  # Conf is case-sensitive.
+    for section in sorted(sections):
+        config.add_section(section)
+        for option in sorted(sections[section]):
+            config.set(section, option, sections[section][option])
+    buf = cStringIO.StringIO()
+    config.write(buf)
+    return buf.getvalue()
+
+
+def config_within(path, sections):
+    """
+    Return True if every option in the ini file at path is in sections, a
+    dict mapping section names to dicts of options, with the same value
+    """
+    config = ConfigParser.RawConfigParser()
+    config.optionxform = str  # Conf is case-sensitive.
+    try:
+        config.read(path)
+    except ConfigParser.Error:
+        return False
+    for section in config.sections():
+        for option, value in config.items(section):
+            if sections.get(section, {}).get(option) != value:
+                return False
+    return True
+
+
 def split_list(item_list):
     """ Split a comma separated list of items """
 
@@ -182,12 +182,9 @@ class SGEConfiguration(JobManagerConfiguration):
         Return True if successful, False otherwise
         """
         if os.path.exists(self.BLAH_CONFIG):
-            contents = utilities.read_file(self.BLAH_CONFIG)
-            contents = utilities.add_or_replace_setting(contents, "sge_rootpath", self.options['sge_root'].value,
-                                                        quote_value=True)
-            contents = utilities.add_or_replace_setting(contents, "sge_cellname", self.options['sge_cell'].value,
-                                                        quote_value=True)
-            return utilities.atomic_write(self.BLAH_CONFIG, contents)
+            return utilities.edit_settings(self.BLAH_CONFIG, [("sge_rootpath", self.options['sge_root'].value),
+                                                              ("sge_cellname", self.options['sge_cell'].value)],
+                                           quote_value=True)
         return False
 
     def enabled_services(self):
@@ -108,6 +108,13 @@ class SiteInformation(BaseConfiguration):
         self.get_options(configuration, ignore_options=self.IGNORE_OPTIONS)
         self.log('SiteInformation.parse_configuration completed')
 
+    def hosts_to_resolve(self):
+        """Return the CE host if check_attributes() checks it"""
+        host_name = self.opt_val("host_name")
+        if not self.enabled or utilities.blank(host_name):
+            return []
+        return [host_name]
+
     # pylint: disable-msg=W0613
     def check_attributes(self, attributes):
         """Check attributes currently stored and make sure that they are consistent"""
@@ -55,6 +55,17 @@ class SquidConfiguration(BaseConfiguration):
             self.options['location'].value = 'UNAVAILABLE'
         self.log('SquidConfiguration.parse_configuration completed')
 
+    def hosts_to_resolve(self):
+        """Return the squid host if check_attributes() checks it"""
+        if not (utilities.gateway_installed() and utilities.rpm_installed('frontier-squid')):
+            return []
+        if not self.enabled or self.ignored:
+            return []
+        location = str(self.options['location'].value)
+        if location.upper() in ('NONE', 'UNAVAILABLE') or len(location.split(':')) != 2:
+            return []
+        return [location.split(':')[0]]
+
     # pylint: disable-msg=W0613
     def check_attributes(self, attributes):
         """Check attributes currently stored and make sure that they are consistent"""
@@ -171,6 +171,16 @@ class StorageConfiguration(BaseConfiguration):
         self.log("StorageConfiguration.configure completed")
         return status
 
+    def external_inputs(self):
+        """Return a list of files outside of the config files that configure() uses"""
+        return ['/etc/osg/grid3-locations.txt']
+
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        if not self.options['app_dir'].value:
+            return []
+        return [os.path.join(self.options['app_dir'].value, 'etc', 'grid3-locations.txt')]
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "Storage"
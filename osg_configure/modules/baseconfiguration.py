@@ -72,10 +72,62 @@ class BaseConfiguration(object):
         """Configure installation using attributes"""
         return True
 
+    def start_configure(self):
+        """
+        Start slow work that configure() needs, e.g. running an external
+        program, so it can run in the background while other modules are
+        configured
+        """
+        pass
+
+    def finish_configure(self):
+        """
+        Wait for the work started by start_configure() or configure(), called
+        once every module is configured so other modules don't wait for it.
+        Raises ConfigureError if the work failed.
+        """
+        pass
+
     def module_name(self):
         """Return a string with the name of the module"""
         return "BaseConfiguration"
 
+    def external_inputs(self):
+        """
+        Return a list of files and directories outside of the osg-configure
+        config files that configure() reads, configure() needs to be run again
+        when any of them change
+        """
+        return []
+
+    def written_files(self):
+        """
+        Return a list of files and directories that configure() writes to,
+        modules that write to the same files are not configured at the same
+        time
+        """
+        return []
+
+    def produced_attributes(self):
+        """Return a set with the names of the attributes this module provides"""
+        return set(self.get_attributes().keys())
+
+    # pylint: disable-msg=R0201
+    def consumed_attributes(self):
+        """
+        Return a set with the names of the attributes configure() uses, or
+        None if it may use any attribute
+        """
+        return set()
+
+    # pylint: disable-msg=R0201
+    def hosts_to_resolve(self):
+        """
+        Return a list of the hostnames check_attributes() checks resolve, so
+        that they can all be looked up at the same time beforehand
+        """
+        return []
+
     def separately_configurable(self):
         """Return a boolean that indicates whether this module can be configured separately"""
         return False
@@ -83,7 +135,7 @@ class BaseConfiguration(object):
     def log(self, mesg, **kwargs):
         """
         Generate a log message if option and section are given then the file
-        that generated the error is added to log message
+        and line that generated the error are added to log message
 
         Arguments:
         mesg - message to add to default log message
@@ -100,12 +152,13 @@ class BaseConfiguration(object):
         exception = kwargs.get('exception', False)
         message = ""
         if 'option' in kwargs and 'section' in kwargs:
-            file_location = configfile.get_option_location(kwargs['option'],
-                                                           kwargs['section'])
-            if file_location is not None:
-                message = "Option '%s' in section '%s' located in %s: " % (kwargs['option'],
-                                                                           kwargs['section'],
-                                                                           file_location)
+            position = configfile.get_option_position(kwargs['option'],
+                                                      kwargs['section'])
+            if position is not None:
+                message = "Option '%s' in section '%s' located in %s, line %d: " % (kwargs['option'],
+                                                                                    kwargs['section'],
+                                                                                    position[0],
+                                                                                    position[1])
                 message += "\n" + " " * 9 + ("\n" + " " * 9).join(mesg.split("\n"))
             else:
                 message += mesg
@@ -288,7 +341,7 @@ class BaseConfiguration(object):
                 from_fh = open(from_path, 'rb')
                 success = utilities.atomic_write(to_path, from_fh.read(), mode=mode)
                 from_fh.close()
-                if not success:
+                if not success or not utilities.sync_writes():
                     self.log("Could not copy %s to %s" % (from_path, to_path), level=logging.ERROR)
                     return False
                 try:
@@ -2,21 +2,35 @@
 
 import glob
 import ConfigParser
+import cPickle
+import logging
 import os
-import sys
 
+from osg_configure.version import __version__
 from osg_configure.modules import exceptions
 from osg_configure.modules import utilities
 from osg_configure.modules import validation
 
 __all__ = ['get_option_location',
+           'get_option_position',
            'get_file_list',
            'read_config_files',
+           'load_snapshot',
+           'find_snapshot',
+           'ConfigSnapshot',
+           'RecordingConfigParser',
            'get_option',
            'jobmanager_enabled',
            'Option']
 
 CONFIG_DIRECTORY = '/etc/osg/config.d'
+CACHE_FILE = '/var/lib/osg/osg-configure-config.cache'
+
+logger = logging.getLogger(__name__)
+
+
+# Snapshots loaded with load_snapshot(), keyed by config directory
+_loaded_snapshots = {}
 
 
 def read_config_files(**kwargs):
@@ -31,31 +45,49 @@ def read_config_files(**kwargs):
       section
 
     Raises:
-    IOError -- error when parsing files
+    IOError -- error when reading files
+    ConfigFileError -- syntax errors in the files
     """
 
     config_dir = kwargs.get('config_directory', CONFIG_DIRECTORY)
     case_sensitive = kwargs.get('case_sensitive', False)
-    if not validation.valid_directory(config_dir):
-        raise IOError("%s does not exist" % config_dir)
-    file_list = get_file_list(config_directory=config_dir)
-    for filename in file_list:
-        if not validation.valid_ini_file(filename):
-            sys.stderr.write("Error found in %s\n" % filename)
-            sys.exit(1)
-    try:
-        config = ConfigParser.SafeConfigParser()
-        if case_sensitive:
-            config.optionxform = str
-    except ConfigParser.Error as e:
-        raise IOError("Can't read and parse config files:\n%s" % e)
-    read_files = config.read(file_list)
-    read_files.sort()
-    if file_list != read_files:
-        unread_files = set(file_list).difference(read_files)
-        msg = "Can't read following config files:\n %s" % ("\n".join(unread_files))
-        raise IOError(msg)
-    return config
+    snapshot = ConfigSnapshot(config_directory=config_dir)
+    return snapshot.get_config(case_sensitive=case_sensitive)
+
+
+def load_snapshot(**kwargs):
+    """
+    Read the config files in a directory once and return a ConfigSnapshot
+    for them.  The snapshot is remembered so that later calls to
+    get_option_location() for the same directory use it instead of
+    re-reading the files.
+
+    Keyword arguments:
+    config_directory -- indicates which directory holds the config files
+    cache_file -- file to cache the parsed configuration in between runs,
+      None to always read the config files
+
+    Raises:
+    IOError -- error when reading files
+    ConfigFileError -- syntax errors in the files
+    """
+    config_dir = kwargs.get('config_directory', CONFIG_DIRECTORY)
+    snapshot = ConfigSnapshot(config_directory=config_dir,
+                              cache_file=kwargs.get('cache_file', None))
+    snapshot.save_cache()
+    _loaded_snapshots[os.path.abspath(config_dir)] = snapshot
+    return snapshot
+
+
+def find_snapshot(config):
+    """
+    Return the snapshot loaded with load_snapshot() that config is a view of,
+    or None if config didn't come from a loaded snapshot
+    """
+    for snapshot in _loaded_snapshots.values():
+        if snapshot.has_config(config):
+            return snapshot
+    return None
 
 
 def get_option_location(option, section, **kwargs):
@@ -73,21 +105,84 @@ def get_option_location(option, section, **kwargs):
 
     Raises:
     IOError -- Can't read a given file
-    Exception -- Can't parse a config file in the config directory
+    """
+    position = get_option_position(option, section, **kwargs)
+    if position is None:
+        return None
+    return position[0]
+
+
+def get_option_position(option, section, **kwargs):
+    """
+    Return a (filename, line number) tuple for the line that sets the value of
+    the given option, or None if option or section is not defined.  Uses the
+    snapshot loaded for the config directory if there is one, otherwise the
+    files are read on every call.
+
+    Formal arguments:
+    option -- option name to look for
+    section -- section that the option is located in
+
+    Keyword arguments:
+    config_directory -- indicates which directory holds the config files
+
+    Raises:
+    IOError -- Can't read a given file
     """
     config_dir = kwargs.get('config_directory', CONFIG_DIRECTORY)
-    file_list = get_file_list(config_directory=config_dir)
-    file_list.reverse()
-    for fn in file_list:
-        try:
-            config = ConfigParser.SafeConfigParser()
-            config.readfp(open(fn, 'r'))
-            if config.has_option(section, option):
-                return fn
-        except ConfigParser.Error as e:
-            raise Exception("Can't parse %s:\n%s" % (fn, e))
+    snapshot = _loaded_snapshots.get(os.path.abspath(config_dir))
+    if snapshot is not None:
+        return snapshot.get_option_position(option, section)
 
-    return None
+    file_entries = []
+    for filename in get_file_list(config_directory=config_dir):
+        file_entries.append((filename, validation.scan_ini_file(filename)[0]))
+    positions = _index_option_positions(file_entries)
+    return positions.get((section, option.lower()))
+
+
+def _stat_key(path):
+    """
+    Return a (inode, size, mtime in ns) tuple that changes when the file at
+    path is modified
+    """
+    path_stat = os.stat(path)
+    return path_stat.st_ino, path_stat.st_size, int(round(path_stat.st_mtime * 1e9))
+
+
+def _index_option_positions(file_entries):
+    """
+    Map the (section, option) pairs set in a sequence of config files to the
+    (filename, line number) that sets them.  Files later in the sequence
+    override earlier ones, as they do when read by a ConfigParser.  Like
+    has_option(), an option in the DEFAULT section of a file counts as being
+    set in every section of that file.  Option names are lowercased.
+
+    Arguments:
+    file_entries -- list of (filename, entries) tuples in the order the files
+      are read, where entries come from validation.scan_ini_file()
+    """
+    positions = {}
+    for filename, entries in file_entries:
+        sections = set()
+        defaults = {}
+        explicit = {}
+        for lineno, section, option, _ in entries:
+            if option is None:
+                if section != ConfigParser.DEFAULTSECT:
+                    sections.add(section)
+            elif section == ConfigParser.DEFAULTSECT:
+                defaults[option.lower()] = lineno
+            else:
+                explicit[(section, option.lower())] = lineno
+
+        for option, lineno in defaults.items():
+            positions[(ConfigParser.DEFAULTSECT, option)] = (filename, lineno)
+            for section in sections:
+                positions[(section, option)] = (filename, lineno)
+        for key, lineno in explicit.items():
+            positions[key] = (filename, lineno)
+    return positions
 
 
 def get_file_list(**kwargs):
@@ -224,3 +319,242 @@ class Option(object):
         in osg attributes file
         """
         return self.mapping is not None
+
+
+class ConfigSnapshot(object):
+    """
+    The contents of the config files in a config directory, read and
+    validated once.  Hands out parsed views of the configuration and
+    remembers which file and line each option came from.
+    """
+
+    def __init__(self, config_directory=CONFIG_DIRECTORY, cache_file=None):
+        """
+        Read and validate every config file in config_directory.  If
+        cache_file is given and holds the results of reading the same,
+        unchanged files with this version of osg-configure, those are used
+        instead of reading the files.
+
+        Raises:
+        IOError -- error when reading files
+        ConfigFileError -- syntax errors in the files
+        """
+        self.config_directory = config_directory
+        self.cache_file = cache_file
+        # Results of checks on the configuration, kept in the cache file
+        self.results = {}
+        self._dirty = False
+        if not validation.valid_directory(config_directory):
+            raise IOError("%s does not exist" % config_directory)
+
+        self.from_cache = cache_file is not None and self._load_cache()
+        if not self.from_cache:
+            self._read_files()
+
+        errors = [x for x in self.diagnostics if x.is_error()]
+        if errors:
+            raise exceptions.ConfigFileError(errors)
+        for diagnostic in self.diagnostics:
+            logger.warning(str(diagnostic))
+
+        self._configs = {}
+        self._positions = _index_option_positions(self._entries)
+
+    def _read_files(self):
+        """Scan the config files, recording their stat keys for the cache"""
+        self._directory_key = _stat_key(self.config_directory)
+        self.file_list = get_file_list(config_directory=self.config_directory)
+        self._file_keys = []
+        self._entries = []
+        self.diagnostics = []
+        unread_files = []
+        for filename in self.file_list:
+            try:
+                # stat before reading so a change while reading invalidates the cache
+                self._file_keys.append((filename, _stat_key(filename)))
+                entries, diagnostics = validation.scan_ini_file(filename)
+            except EnvironmentError:
+                unread_files.append(filename)
+                continue
+            self._entries.append((filename, entries))
+            self.diagnostics.extend(diagnostics)
+        if unread_files:
+            msg = "Can't read following config files:\n %s" % ("\n".join(unread_files))
+            raise IOError(msg)
+        self._dirty = True
+
+    def _load_cache(self):
+        """
+        Load the scanned config files from the cache file if it is valid for
+        the current files.  Returns True if the cache was used.
+        """
+        try:
+            cache_stat = os.stat(self.cache_file)
+            if cache_stat.st_uid != os.getuid():
+                logger.debug("Ignoring %s: not owned by the current user" % self.cache_file)
+                return False
+            cache_fh = open(self.cache_file, 'rb')
+            try:
+                cache = cPickle.load(cache_fh)
+            finally:
+                cache_fh.close()
+            if (cache['version'] != __version__ or
+                    cache['config_directory'] != os.path.abspath(self.config_directory) or
+                    cache['directory_key'] != _stat_key(self.config_directory)):
+                return False
+            # the directory is unchanged so no files were added or removed
+            for filename, key in cache['file_keys']:
+                if _stat_key(filename) != key:
+                    return False
+        except (EnvironmentError, EOFError, KeyError, TypeError, ValueError,
+                cPickle.UnpicklingError) as err:
+            logger.debug("Not using config cache %s: %s" % (self.cache_file, err))
+            return False
+
+        self._directory_key = cache['directory_key']
+        self._file_keys = cache['file_keys']
+        self.file_list = [filename for filename, _ in self._file_keys]
+        self._entries = cache['entries']
+        self.diagnostics = [validation.IniDiagnostic(*x) for x in cache['diagnostics']]
+        self.results = cache['results']
+        logger.debug("Using cached configuration from %s" % self.cache_file)
+        return True
+
+    def save_cache(self):
+        """
+        Write the scanned config files and the check results to the cache file
+        if either changed since the snapshot was loaded
+        """
+        if self.cache_file is None or not self._dirty:
+            return
+        cache = {'version': __version__,
+                 'config_directory': os.path.abspath(self.config_directory),
+                 'directory_key': self._directory_key,
+                 'file_keys': self._file_keys,
+                 'entries': self._entries,
+                 'diagnostics': [tuple(x) for x in self.diagnostics],
+                 'results': self.results}
+        if utilities.atomic_write(self.cache_file, cPickle.dumps(cache, 2), mode=0o644):
+            self._dirty = False
+        else:
+            logger.debug("Could not write config cache %s" % self.cache_file)
+
+    def set_result(self, name, value):
+        """Remember the result of a check on the configuration in the cache"""
+        self.results[name] = value
+        self._dirty = True
+
+    def has_config(self, config):
+        """Return True if config is one of the views handed out by get_config()"""
+        config = getattr(config, 'base', config)
+        for view in self._configs.values():
+            if view is config:
+                return True
+        return False
+
+    def get_config(self, case_sensitive=False):
+        """
+        Return a SafeConfigParser with the contents of all the config files.
+        The parser is built from the entries found while validating the files,
+        once per view; callers must not modify it.
+
+        Arguments:
+        case_sensitive -- if True, option names keep their case, this is needed
+          for the Local Settings section
+        """
+        case_sensitive = bool(case_sensitive)
+        if case_sensitive not in self._configs:
+            config = ConfigParser.SafeConfigParser()
+            if case_sensitive:
+                config.optionxform = str
+            for _, entries in self._entries:
+                for _, section, option, value in entries:
+                    if option is not None:
+                        # Values aren't interpolated until they're used, like
+                        # when reading a file, so bypass SafeConfigParser.set()
+                        ConfigParser.RawConfigParser.set(config, section, option, value)
+                    elif section != ConfigParser.DEFAULTSECT and not config.has_section(section):
+                        config.add_section(section)
+                        ConfigParser.RawConfigParser.set(config, section, '__name__', section)
+            self._configs[case_sensitive] = config
+        return self._configs[case_sensitive]
+
+    def get_recording_config(self, case_sensitive=False):
+        """
+        Return a new RecordingConfigParser over the view given by
+        get_config(case_sensitive)
+        """
+        return RecordingConfigParser(self.get_config(case_sensitive))
+
+    def get_option_location(self, option, section):
+        """
+        Return the name of the last file that sets option in section, or None
+        if the option is not set.  Like has_option(), options in a file's
+        DEFAULT section count for every section in that file.
+        """
+        position = self._positions.get((section, option.lower()))
+        if position is None:
+            return None
+        return position[0]
+
+    def get_option_position(self, option, section):
+        """
+        Return a (filename, line number) tuple for the line that sets option
+        in section, or None if the option is not set.
+        """
+        return self._positions.get((section, option.lower()))
+
+
+class RecordingConfigParser(ConfigParser.SafeConfigParser):
+    """
+    A view of a parsed configuration that shares the contents of another
+    parser and records which sections are looked at, so the parts of the
+    configuration a module depends on can be compared between runs.
+    Callers must not modify it.
+    """
+
+    def __init__(self, config):
+        ConfigParser.SafeConfigParser.__init__(self)
+        self.base = config
+        self.optionxform = config.optionxform
+        self._sections = config._sections
+        self._defaults = config._defaults
+        self.read_sections = set()
+        self.listed_sections = False
+
+    def sections(self):
+        self.listed_sections = True
+        return ConfigParser.SafeConfigParser.sections(self)
+
+    def has_section(self, section):
+        self.read_sections.add(section)
+        return ConfigParser.SafeConfigParser.has_section(self, section)
+
+    def options(self, section):
+        self.read_sections.add(section)
+        return ConfigParser.SafeConfigParser.options(self, section)
+
+    def has_option(self, section, option):
+        self.read_sections.add(section)
+        return ConfigParser.SafeConfigParser.has_option(self, section, option)
+
+    def get(self, section, option, raw=False, vars=None):
+        self.read_sections.add(section)
+        return ConfigParser.SafeConfigParser.get(self, section, option, raw, vars)
+
+    def items(self, section, raw=False, vars=None):
+        self.read_sections.add(section)
+        return ConfigParser.SafeConfigParser.items(self, section, raw, vars)
+
+    def recorded_contents(self):
+        """
+        Return the raw contents of the parts of the configuration that were
+        looked at: the defaults, the list of sections if it was asked for and
+        every section that was read or checked for
+        """
+        contents = [sorted(self._defaults.items())]
+        if self.listed_sections:
+            contents.append(sorted(self._sections.keys()))
+        for section in sorted(self.read_sections):
+            contents.append((section, sorted(self._sections.get(section, {}).items())))
+        return contents
@@ -0,0 +1,154 @@
+""" Module to remember what each configuration module was configured with so
+that modules whose inputs haven't changed can be skipped """
+
+import hashlib
+import json
+import logging
+import os
+
+from osg_configure.version import __version__
+from osg_configure.modules import utilities
+
+__all__ = ['STATE_FILE',
+           'HTCONDOR_CE_INPUTS',
+           'path_digest',
+           'module_digest',
+           'htcondor_ce_digest',
+           'ConfigureState']
+
+STATE_FILE = '/var/lib/osg/osg-configure-state.json'
+# Files that condor_ce_reconfig needs to be run for when they change
+HTCONDOR_CE_INPUTS = ['/etc/condor-ce/config.d',
+                      '/var/lib/osg/osg-job-environment.conf',
+                      '/var/lib/osg/osg-local-job-environment.conf']
+# Modules check which packages are installed, so the rpm database is an
+# input to all of them
+RPM_DATABASE = '/var/lib/rpm/Packages'
+# Key used in the state file for the HTCondor-CE configuration
+HTCONDOR_CE_KEY = 'condor-ce'
+
+logger = logging.getLogger(__name__)
+
+
+def _update_file_digest(digest, path):
+    """Add the contents of a regular file to digest"""
+    if not os.path.isfile(path):
+        digest.update('missing\0')
+        return
+    try:
+        file_fh = open(path, 'rb')
+        try:
+            while True:
+                chunk = file_fh.read(65536)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        finally:
+            file_fh.close()
+    except EnvironmentError as err:
+        digest.update("unreadable %s\0" % err.errno)
+
+
+def path_digest(path):
+    """
+    Return a hex digest of the contents of a file or of the names and
+    contents of all the files under a directory.  Missing files get a digest
+    too, so creating or removing a file changes the digest.
+    """
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                digest.update(file_path + '\0')
+                _update_file_digest(digest, file_path)
+    else:
+        _update_file_digest(digest, path)
+    return digest.hexdigest()
+
+
+def _rpm_database_key():
+    """Return something that changes when packages are installed or removed"""
+    try:
+        db_stat = os.stat(RPM_DATABASE)
+    except OSError:
+        return None
+    return db_stat.st_size, db_stat.st_mtime
+
+
+def module_digest(module, config, attributes):
+    """
+    Return a hex digest of everything the configure() method of module
+    depends on
+
+    Arguments:
+    module -- configuration module object, after its configuration was parsed
+    config -- the RecordingConfigParser the module parsed its configuration from
+    attributes -- dict of attributes that are passed to configure()
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((__version__, module.__class__.__name__)))
+    digest.update(repr(config.recorded_contents()))
+    digest.update(repr([(name, module.options[name].value) for name in sorted(module.options)]))
+    consumed = module.consumed_attributes()
+    if consumed is None:
+        digest.update(repr(sorted(attributes.items())))
+    else:
+        digest.update(repr(sorted((x, attributes.get(x)) for x in consumed)))
+    digest.update(repr(_rpm_database_key()))
+    for path in sorted(set(module.external_inputs() + module.written_files())):
+        digest.update(repr((path, path_digest(path))))
+    return digest.hexdigest()
+
+
+def htcondor_ce_digest():
+    """Return a hex digest of the files HTCondor-CE reads its configuration from"""
+    digest = hashlib.sha1()
+    for path in HTCONDOR_CE_INPUTS:
+        digest.update(repr((path, path_digest(path))))
+    return digest.hexdigest()
+
+
+class ConfigureState(object):
+    """
+    Digests of the inputs of each module, recorded at the end of the last
+    successful configuration run
+    """
+
+    def __init__(self, state_file=STATE_FILE):
+        """
+        Load the digests from state_file, a missing or unreadable state file
+        or one written by a different version of osg-configure is treated as
+        having no digests
+        """
+        self.state_file = state_file
+        self.digests = {}
+        try:
+            state_fh = open(state_file)
+            try:
+                state = json.load(state_fh)
+            finally:
+                state_fh.close()
+            if state['version'] == __version__:
+                self.digests = dict(state['digests'])
+        except (EnvironmentError, KeyError, TypeError, ValueError) as err:
+            logger.debug("Not using configuration state %s: %s" % (state_file, err))
+
+    def unchanged(self, name, digest):
+        """Return True if digest is the digest recorded for name"""
+        return self.digests.get(name) == digest
+
+    def record(self, name, digest):
+        """Record the digest for name"""
+        self.digests[name] = digest
+
+    def forget(self, name):
+        """Remove the digest for name so it is considered changed on the next run"""
+        self.digests.pop(name, None)
+
+    def save(self):
+        """Write the digests to the state file, returns True on success"""
+        contents = json.dumps({'version': __version__, 'digests': self.digests},
+                              indent=1, sort_keys=True)
+        return utilities.atomic_write(self.state_file, contents, mode=0o644)
@@ -14,3 +14,10 @@ class SettingError(Error):
 class ConfigureError(Error):
     """Class for exceptions due to problems while running vdt configure scripts"""
     pass
+
+
+class ConfigFileError(Error):
+    """Class for exceptions due to syntax errors in the ini files"""
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        Error.__init__(self, "\n".join([str(x) for x in diagnostics]))
@@ -5,12 +5,16 @@ import os
 import re
 import pwd
 import json
+import time
 import pipes
+import socket
 import urllib
 import httplib
 import urllib2
+import threading
 
 from osg_configure.modules import exceptions
+from osg_configure.modules import profiling
 
 _debug = False
 
@@ -18,6 +22,9 @@ _debug = False
 #default_capath  = "/etc/grid-security/certificates/"
 default_certpath = "/etc/grid-security/hostcert.pem"
 default_keypath  = "/etc/grid-security/hostkey.pem"
+default_timeout  = 60
+default_retries  = 2
+default_backoff  = 1.0
 
 # curl example:
 # curl --capath /etc/grid-security/certificates/ --cert /etc/grid-security/hostcert.pem --key /etc/grid-security/hostkey.pem 'https://fermicloud331.fnal.gov:8443/gums/json/getOsgVoUserMap?hostname=test.cs.wisc.edu'
@@ -43,22 +50,155 @@ def certurlopen(url, certpath, keypath):
     opener  = urllib2.build_opener(handler)
     return opener.open(url)
 
-def get_subject(certpath):
-    # TODO: use some SSL/X509 python module to extract DN
-    subject = os.popen("openssl x509 -in %s -noout -subject" %
-                       pipes.quote(certpath)).read()
+# subjects of the certificates read so far, by path, with the stat key of
+# the file they were read from
+_subjects = {}
+_subjects_lock = threading.Lock()
+
+def _openssl_subject(certpath):
+    with profiling.span('openssl x509', 'subprocess', certificate=certpath):
+        subject = os.popen("openssl x509 -in %s -noout -subject -nameopt compat" %
+                           pipes.quote(certpath)).read()
     pfx = "subject="
     if subject.startswith(pfx):
         subject = subject[len(pfx):]
     return subject.strip()
 
+def get_subject(certpath):
+    try:
+        cert_stat = os.stat(certpath)
+        key = (cert_stat.st_ino, cert_stat.st_size, cert_stat.st_mtime)
+    except OSError:
+        key = None
+    with _subjects_lock:
+        cached = _subjects.get(certpath)
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[1]
+    subject = _openssl_subject(certpath)
+    if key is not None and subject:
+        with _subjects_lock:
+            _subjects[certpath] = (key, subject)
+    return subject
+
+class GumsClient(object):
+    """
+    Client for the GUMS json interface that keeps its connection to the
+    GUMS host open between requests, and retries failed requests with a
+    growing delay
+    """
+
+    def __init__(self, gums_host, certpath=default_certpath, keypath=default_keypath,
+                 timeout=default_timeout, retries=default_retries,
+                 backoff=default_backoff, context=None):
+        """
+        Arguments:
+        gums_host - GUMS host, with an optional :port (8443 by default)
+
+        Keyword arguments:
+        certpath, keypath - client certificate and key
+        timeout - seconds to wait for the GUMS host on each request
+        retries - number of times to retry a failed request
+        backoff - seconds to wait before the first retry, doubled each retry
+        context - ssl.SSLContext to use instead of the httplib default
+        """
+        if not re.search(r':\d+$', gums_host):
+            gums_host = gums_host + ":8443"
+        self.gums_host = gums_host
+        self.certpath = certpath
+        self.keypath = keypath
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.context = context
+        self.connections_made = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            kwargs = {'key_file': self.keypath,
+                      'cert_file': self.certpath,
+                      'timeout': self.timeout}
+            if self.context is not None:
+                kwargs['context'] = self.context
+            self._connection = httplib.HTTPSConnection(self.gums_host, **kwargs)
+            self.connections_made += 1
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _request(self, path):
+        connection = self._connect()
+        connection.request('GET', path, headers={'Connection': 'keep-alive',
+                                                 'Accept': 'application/json'})
+        response = connection.getresponse()
+        body = response.read()
+        if response.will_close:
+            self._connection.close()
+            self._connection = None
+        if response.status != httplib.OK:
+            raise _HTTPStatusError(response.status, response.reason)
+        return body
+
+    def json_map(self, command, params):
+        """
+        Run command on the GUMS host with the query parameters in params and
+        return the decoded json response.  Raises EnvironmentError if the
+        request still fails after all retries.
+        """
+        path = '/gums/json/%s?%s' % (command, urllib.urlencode(params))
+        with self._lock:
+            attempt = 0
+            while True:
+                reused = self._connection is not None
+                try:
+                    with profiling.span(command, 'gums', host=self.gums_host, attempt=attempt):
+                        body = self._request(path)
+                    break
+                except (socket.error, httplib.HTTPException, _HTTPStatusError) as e:
+                    if self._connection is not None:
+                        self._connection.close()
+                        self._connection = None
+                    if isinstance(e, _HTTPStatusError) and e.status < 500:
+                        raise IOError(str(e))
+                    if reused and not isinstance(e, _HTTPStatusError):
+                        # the GUMS host closed the idle connection, reconnect
+                        # without counting it as a failure
+                        continue
+                    if attempt >= self.retries:
+                        raise IOError("%s (after %d attempts)" % (e, attempt + 1))
+                    time.sleep(self.backoff * 2 ** attempt)
+                    attempt += 1
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise IOError("Invalid json from %s: %s" % (self.gums_host, e))
+
+class _HTTPStatusError(Exception):
+    def __init__(self, status, reason):
+        Exception.__init__(self, "HTTP Error %d: %s" % (status, reason))
+        self.status = status
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def gums_client(gums_host, certpath=default_certpath, keypath=default_keypath):
+    """
+    Return the GumsClient for gums_host and the given client certificate,
+    shared for the rest of the run so its connection is reused
+    """
+    key = (gums_host, certpath, keypath)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = GumsClient(gums_host, certpath, keypath)
+        return _clients[key]
+
 def gums_json_map(gums_host, command, params, certpath, keypath):
-    params = urllib.urlencode(params)
-    if not re.search(r':\d+$', gums_host):
-        gums_host = gums_host + ":8443"
-    url = 'https://%s/gums/json/%s?%s' % (gums_host, command, params)
-    handle = certurlopen(url, certpath, keypath)
-    return json.load(handle)
+    return gums_client(gums_host, certpath, keypath).json_map(command, params)
 
 def user_exists(user):
     try:
@@ -35,6 +35,10 @@ class JobManagerConfiguration(BaseConfiguration):
             services.add('condor-ce')
         return services
 
+    def written_files(self):
+        """Return a list of files that configure() writes to"""
+        return [self.BLAH_CONFIG, self.HTCONDOR_CE_CONFIG_FILE]
+
     def write_binpaths_to_blah_config(self, jobmanager, submit_binpath):
         """
         Change the *_binpath variables in /etc/blah.config for the given
@@ -47,24 +51,20 @@ class JobManagerConfiguration(BaseConfiguration):
           executables for that jobmanager
         """
         if os.path.exists(self.BLAH_CONFIG):
-            contents = utilities.read_file(self.BLAH_CONFIG)
-            contents = utilities.add_or_replace_setting(contents, jobmanager + "_binpath", submit_binpath,
-                                                        quote_value=True)
-            utilities.atomic_write(self.BLAH_CONFIG, contents)
+            utilities.edit_settings(self.BLAH_CONFIG, [(jobmanager + "_binpath", submit_binpath)],
+                                    quote_value=True)
 
     def write_blah_disable_wn_proxy_renewal_to_blah_config(self):
         if os.path.exists(self.BLAH_CONFIG):
-            contents = utilities.read_file(self.BLAH_CONFIG)
-            for option, value in [("blah_disable_wn_proxy_renewal", "yes"),
-                                  ("blah_delegate_renewed_proxies", "no"),
-                                  ("blah_disable_limited_proxy", "yes")]:
-                contents = utilities.add_or_replace_setting(contents, option, value,
-                                                            quote_value=True)
-            utilities.atomic_write(self.BLAH_CONFIG, contents)
+            utilities.edit_settings(self.BLAH_CONFIG, [("blah_disable_wn_proxy_renewal", "yes"),
+                                                       ("blah_delegate_renewed_proxies", "no"),
+                                                       ("blah_disable_limited_proxy", "yes")],
+                                    quote_value=True)
 
     def write_htcondor_ce_sentinel(self):
         if self.htcondor_gateway_enabled and utilities.ce_installed():
-            contents = utilities.read_file(self.HTCONDOR_CE_CONFIG_FILE,
-                                           default="# This file is managed by osg-configure\n")
-            contents = utilities.add_or_replace_setting(contents, "OSG_CONFIGURED", "true", quote_value=False)
-            utilities.atomic_write(self.HTCONDOR_CE_CONFIG_FILE, contents)
+            utilities.edit_settings(self.HTCONDOR_CE_CONFIG_FILE, [("OSG_CONFIGURED", "true")],
+                                    quote_value=False,
+                                    default="# This file is managed by osg-configure\n")
+            # values looked up before are out of date now
+            utilities.condor_config_query('condor_ce_config_val').clear()
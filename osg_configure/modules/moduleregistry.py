@@ -0,0 +1,129 @@
+""" Registry of the configuration modules in osg_configure.configure_modules
+
+The registry describes each module so that commands like listing modules
+don't have to import and construct them; modules are only imported when a
+command needs their configuration objects.
+"""
+
+import os
+
+__all__ = ['PACKAGE',
+           'ModuleEntry',
+           'MODULES',
+           'available_modules']
+
+PACKAGE = 'osg_configure.configure_modules'
+
+# files in the configure_modules directory that aren't configuration modules;
+# siteattributes.py was renamed to siteinformation.py but it may be left over
+# from an old install
+IGNORED_FILES = ['__init__.py', 'siteattributes.py']
+
+
+class ModuleEntry(object):
+    """
+    Metadata about a configuration module, and a way to import it when it
+    is needed
+    """
+
+    def __init__(self, filename, class_name, name, section, separately_configurable, services=None):
+        """
+        Arguments:
+        filename -- name of the python module in configure_modules
+        class_name -- name of the configuration class in the module
+        name -- the module_name() of the configuration class
+        section -- the config_section of the configuration class
+        separately_configurable -- whether the module can be configured by itself
+
+        Keyword arguments:
+        services -- the system services enabled_services() can return, or
+                    None if they're not known
+        """
+        self.filename = filename
+        self.class_name = class_name
+        self.name = name
+        self.section = section
+        self.separately_configurable = separately_configurable
+        if services is None:
+            self.services = None
+        else:
+            self.services = frozenset(services)
+        self._class = None
+
+    def load(self):
+        """Import the module and return its configuration class"""
+        if self._class is None:
+            module_ref = __import__(PACKAGE + '.' + self.filename, globals(), locals(), [''])
+            self._class = getattr(module_ref, self.class_name)
+        return self._class
+
+    def instantiate(self):
+        """Return a new object of the module's configuration class"""
+        return self.load()()
+
+    @classmethod
+    def discover(cls, filename):
+        """
+        Return an entry for a module that isn't in the registry, this imports
+        and constructs the module to get its metadata
+        """
+        module_ref = __import__(PACKAGE + '.' + filename, globals(), locals(), [''])
+        class_name = module_ref.__all__[0]
+        module = getattr(module_ref, class_name)()
+        entry = cls(filename, class_name, module.module_name(), module.config_section,
+                    module.separately_configurable())
+        entry._class = module.__class__
+        return entry
+
+
+JOB_MANAGER_SERVICES = ['globus-gridftp-server', 'condor-ce']
+
+MODULES = [ModuleEntry('bosco', 'BoscoConfiguration', 'BaseConfiguration', 'BOSCO', False, []),
+           ModuleEntry('condor', 'CondorConfiguration', 'Condor', 'Condor', True,
+                       JOB_MANAGER_SERVICES),
+           ModuleEntry('gateway', 'GatewayConfiguration', 'Gateway', 'Gateway', False, []),
+           ModuleEntry('gratia', 'GratiaConfiguration', 'Gratia', 'Gratia', False,
+                       ['gratia-probes-cron']),
+           ModuleEntry('infoservices', 'InfoServicesConfiguration', 'Infoservices', 'Info Services',
+                       False, ['condor-ce']),
+           ModuleEntry('installlocations', 'InstallLocations', 'InstallLocations',
+                       'Install Locations', True, []),
+           ModuleEntry('legacysettings', 'LegacyConfiguration', 'Legacy', '', False, []),
+           ModuleEntry('localsettings', 'LocalSettings', 'LocalSettings', 'Local Settings', True, []),
+           ModuleEntry('lsf', 'LSFConfiguration', 'LSF', 'LSF', True, JOB_MANAGER_SERVICES),
+           ModuleEntry('misc', 'MiscConfiguration', 'Misc', 'Misc Services', True,
+                       ['fetch-crl-cron', 'fetch-crl-boot', 'gums-client-cron', 'edg-mkgridmap']),
+           ModuleEntry('pbs', 'PBSConfiguration', 'PBS', 'PBS', True, JOB_MANAGER_SERVICES),
+           ModuleEntry('rsv', 'RsvConfiguration', 'RSV', 'RSV', True, ['rsv', 'condor-cron']),
+           ModuleEntry('sge', 'SGEConfiguration', 'SGE', 'SGE', True, JOB_MANAGER_SERVICES),
+           ModuleEntry('siteinformation', 'SiteInformation', 'SiteInformation', 'Site Information',
+                       True, []),
+           ModuleEntry('slurm', 'SlurmConfiguration', 'SLURM', 'SLURM', True, JOB_MANAGER_SERVICES),
+           ModuleEntry('squid', 'SquidConfiguration', 'Squid', 'Squid', True, []),
+           ModuleEntry('storage', 'StorageConfiguration', 'Storage', 'Storage', True, [])]
+
+
+def available_modules(modules_dir=None):
+    """
+    Return the entries for the modules installed in the configure_modules
+    directory, sorted by file name; modules that aren't in the registry are
+    imported to get their metadata
+
+    Keyword arguments:
+    modules_dir -- the configure_modules directory, defaults to the one in
+                   this installation
+    """
+    if modules_dir is None:
+        modules_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'configure_modules')
+    registered = dict((entry.filename, entry) for entry in MODULES)
+    entries = []
+    for filename in sorted(os.listdir(modules_dir)):
+        if not filename.endswith('.py') or filename in IGNORED_FILES:
+            continue
+        module_name = filename[:-len('.py')]
+        if module_name in registered:
+            entries.append(registered[module_name])
+        else:
+            entries.append(ModuleEntry.discover(module_name))
+    return entries
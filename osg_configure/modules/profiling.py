@@ -0,0 +1,189 @@
+""" Module to time the phases of an osg-configure run and the slow operations
+in them, and to report where the time went """
+
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+__all__ = ['enable',
+           'enabled',
+           'reset',
+           'record',
+           'span',
+           'timed',
+           'summary',
+           'report',
+           'write_trace']
+
+_enabled = False
+_origin = time.time()
+# (name, category, start, end, thread id, thread name, args)
+_events = []
+_lock = threading.Lock()
+
+
+def enable(origin=None):
+    """
+    Start recording spans
+
+    Keyword arguments:
+    origin -- time the run started, traces and the report are relative to it
+    """
+    global _enabled, _origin
+    _enabled = True
+    if origin is not None:
+        _origin = origin
+
+
+def enabled():
+    """Return True if spans are being recorded"""
+    return _enabled
+
+
+def reset():
+    """Stop recording spans and forget the recorded ones"""
+    global _enabled
+    _enabled = False
+    _lock.acquire()
+    try:
+        del _events[:]
+    finally:
+        _lock.release()
+
+
+def record(name, category, start, end, **args):
+    """
+    Record a span that has already finished
+
+    Arguments:
+    name -- what was being done, spans with the same name and category are
+            added up in the report
+    category -- kind of operation, e.g. 'module' or 'subprocess'
+    start, end -- times the span started and ended
+
+    Keyword arguments are kept in the trace as the span's arguments
+    """
+    if not _enabled:
+        return
+    thread = threading.currentThread()
+    _lock.acquire()
+    try:
+        _events.append((name, category, start, end, thread.ident, thread.getName(), args))
+    finally:
+        _lock.release()
+
+
+@contextmanager
+def span(name, category, **args):
+    """
+    Context manager that records the time spent in its block as a span,
+    see record() for the arguments
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(name, category, start, time.time(), **args)
+
+
+def timed(category, name=None):
+    """
+    Decorator that records each call of the function as a span, named after
+    the function unless name is given
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def summary():
+    """
+    Return a list of (total seconds, calls, longest call, category, name)
+    tuples for the recorded spans, the longest total first
+    """
+    totals = {}
+    _lock.acquire()
+    try:
+        events = list(_events)
+    finally:
+        _lock.release()
+    for name, category, start, end, _, _, _ in events:
+        total, calls, longest = totals.get((category, name), (0.0, 0, 0.0))
+        totals[(category, name)] = (total + end - start, calls + 1, max(longest, end - start))
+    return sorted(((total, calls, longest, category, name)
+                   for (category, name), (total, calls, longest) in totals.items()),
+                  reverse=True)
+
+
+def report(stream=None, limit=None):
+    """
+    Write a table of the wall time spent in the recorded spans to stream,
+    standard error by default
+
+    Keyword arguments:
+    limit -- only write this many of the longest rows
+    """
+    if stream is None:
+        stream = sys.stderr
+    wall_time = time.time() - _origin
+    rows = summary()
+    stream.write("Time spent (total wall time %.3fs, spans may overlap):\n" % wall_time)
+    stream.write("%10s %6s %10s %6s  %-12s %s\n" % ('Total(s)', 'Calls', 'Max(s)', '%Wall', 'Category', 'Name'))
+    for total, calls, longest, category, name in rows[:limit]:
+        if wall_time > 0:
+            percent = 100.0 * total / wall_time
+        else:
+            percent = 0.0
+        stream.write("%10.3f %6d %10.3f %5.1f%%  %-12s %s\n" % (total, calls, longest, percent, category, name))
+    if limit is not None and len(rows) > limit:
+        stream.write("(%d more)\n" % (len(rows) - limit))
+
+
+def write_trace(filename):
+    """
+    Write the recorded spans to filename in the Chrome trace event format,
+    which chrome://tracing and Perfetto can load
+    """
+    pid = os.getpid()
+    trace_events = []
+    thread_names = {}
+    _lock.acquire()
+    try:
+        events = list(_events)
+    finally:
+        _lock.release()
+    for name, category, start, end, thread_id, thread_name, args in events:
+        thread_names[thread_id] = thread_name
+        trace_events.append({'name': name,
+                             'cat': category,
+                             'ph': 'X',
+                             'ts': int((start - _origin) * 1000000),
+                             'dur': int((end - start) * 1000000),
+                             'pid': pid,
+                             'tid': thread_id,
+                             'args': dict((key, str(value)) for key, value in args.items())})
+    for thread_id, thread_name in thread_names.items():
+        trace_events.append({'name': 'thread_name',
+                             'ph': 'M',
+                             'pid': pid,
+                             'tid': thread_id,
+                             'args': {'name': thread_name}})
+    trace_file = open(filename, 'w')
+    try:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, trace_file)
+    finally:
+        trace_file.close()
@@ -0,0 +1,224 @@
+""" Module to resolve the hostnames given in the configuration, all at once and
+with a timeout for each lookup """
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from osg_configure.version import __version__
+from osg_configure.modules import profiling
+from osg_configure.modules import utilities
+
+__all__ = ['CACHE_FILE',
+           'DEFAULT_TIMEOUT',
+           'RESOLVED',
+           'FAILED',
+           'TIMED_OUT',
+           'Resolver',
+           'get_resolver',
+           'set_resolver']
+
+# Results of lookups kept between runs
+CACHE_FILE = '/var/lib/osg/osg-configure-dns.cache'
+# Seconds to wait for a lookup
+DEFAULT_TIMEOUT = 10
+# Seconds to keep successful lookups in the cache file; failed lookups are
+# only remembered for the run and timed out ones not at all
+DEFAULT_TTL = 3600
+
+RESOLVED = 'resolved'
+FAILED = 'failed'
+TIMED_OUT = 'timed out'
+
+logger = logging.getLogger(__name__)
+
+
+class Resolver(object):
+    """
+    Resolves hostnames in parallel threads, giving up on lookups that take
+    longer than a timeout, and remembers the results for the rest of the run
+    and, for hosts that resolve, optionally in a cache file.  A lookup that
+    timed out is waited for again the next time the host is checked.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, cache_file=None, ttl=DEFAULT_TTL,
+                 lookup=socket.gethostbyname):
+        """
+        Arguments:
+        timeout -- seconds to wait for a lookup
+        cache_file -- file to keep successful lookups in between runs, or None
+        ttl -- seconds to keep successful lookups in the cache file
+        lookup -- function resolving a hostname, raising socket.error if
+                  it doesn't resolve
+        """
+        self.timeout = timeout
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.lookup = lookup
+        self._lock = threading.Lock()
+        # host -> (status, expiration time or None for the rest of the run)
+        self._results = {}
+        # host -> thread of a lookup that timed out and may still finish
+        self._running = {}
+        # host -> status, set by the lookup threads
+        self._answers = {}
+        self._warned = set()
+        self._dirty = False
+        if cache_file is not None:
+            self._load_cache()
+
+    def prefetch(self, hosts):
+        """
+        Resolve the hosts that haven't been resolved yet, all at the same
+        time, waiting at most timeout seconds
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            pending = []
+            for host in hosts:
+                if host and host not in pending and not self._cached(host, now):
+                    pending.append(host)
+            if not pending:
+                return
+
+            answers = self._answers
+
+            def resolve(host):
+                try:
+                    with profiling.span(host, 'dns'):
+                        self.lookup(host)
+                    answers[host] = RESOLVED
+                except (socket.error, UnicodeError):
+                    answers[host] = FAILED
+
+            threads = []
+            for host in pending:
+                # keep waiting for a lookup that timed out earlier
+                thread = self._running.pop(host, None)
+                if thread is None:
+                    thread = threading.Thread(target=resolve, args=(host,))
+                    # a lookup that hangs must not keep osg-configure from exiting
+                    thread.setDaemon(True)
+                    thread.start()
+                threads.append((host, thread))
+            deadline = now + self.timeout
+            for host, thread in threads:
+                thread.join(max(0, deadline - time.time()))
+                status = answers.pop(host, TIMED_OUT)
+                if status == RESOLVED:
+                    self._results[host] = (status, now + self.ttl)
+                    if self.cache_file is not None:
+                        self._dirty = True
+                else:
+                    self._results[host] = (status, None)
+                    if status == TIMED_OUT:
+                        self._running[host] = thread
+        finally:
+            self._lock.release()
+
+    def status(self, host):
+        """Return RESOLVED, FAILED or TIMED_OUT for host, resolving it if needed"""
+        if not host:
+            return FAILED
+        self.prefetch([host])
+        return self._results[host][0]
+
+    def resolves(self, host):
+        """
+        Return False if host doesn't resolve.  A host whose lookup timed out
+        isn't known not to resolve, so True is returned with a warning.
+        """
+        status = self.status(host)
+        if status == TIMED_OUT:
+            if host not in self._warned:
+                self._warned.add(host)
+                logger.warning("Lookup of %s timed out after %s seconds, assuming it resolves" %
+                               (host, self.timeout))
+            return True
+        return status == RESOLVED
+
+    def problems(self):
+        """
+        Return a (timed out, failed) tuple with sorted lists of the hosts that
+        took too long to resolve and that didn't resolve
+        """
+        timed_out = []
+        failed = []
+        for host, (status, _) in self._results.items():
+            if status == TIMED_OUT:
+                timed_out.append(host)
+            elif status == FAILED:
+                failed.append(host)
+        return sorted(timed_out), sorted(failed)
+
+    def log_report(self):
+        """Log the hosts that timed out or failed to resolve"""
+        timed_out, failed = self.problems()
+        if timed_out:
+            logger.warning("Lookups of these hosts timed out after %s seconds: %s" %
+                           (self.timeout, ", ".join(timed_out)))
+        if failed:
+            logger.warning("These hosts do not resolve: %s" % ", ".join(failed))
+
+    def save_cache(self):
+        """Write the successful lookups that haven't expired to the cache file"""
+        if self.cache_file is None or not self._dirty:
+            return
+        now = time.time()
+        entries = {}
+        for host, (status, expires) in self._results.items():
+            if status == RESOLVED and expires > now:
+                entries[host] = [status, expires]
+        cache = {'version': __version__, 'entries': entries}
+        if utilities.atomic_write(self.cache_file, json.dumps(cache, sort_keys=True), mode=0o644):
+            self._dirty = False
+        else:
+            logger.debug("Could not write DNS cache %s" % self.cache_file)
+
+    def _cached(self, host, now):
+        """Return True if there is an unexpired result for host"""
+        if host not in self._results:
+            return False
+        status, expires = self._results[host]
+        if status == TIMED_OUT:
+            return False
+        return expires is None or expires > now
+
+    def _load_cache(self):
+        """Load the unexpired results from the cache file"""
+        try:
+            cache_stat = os.stat(self.cache_file)
+            if cache_stat.st_uid != os.getuid():
+                logger.debug("Ignoring %s: not owned by the current user" % self.cache_file)
+                return
+            cache_fh = open(self.cache_file)
+            try:
+                cache = json.load(cache_fh)
+            finally:
+                cache_fh.close()
+            if cache['version'] != __version__:
+                return
+            now = time.time()
+            for host, (status, expires) in cache['entries'].items():
+                if status == RESOLVED and expires > now:
+                    self._results[str(host)] = (str(status), expires)
+        except (EnvironmentError, KeyError, TypeError, ValueError) as err:
+            logger.debug("Not using DNS cache %s: %s" % (self.cache_file, err))
+
+
+_resolver = Resolver()
+
+
+def get_resolver():
+    """Return the Resolver used to check hostnames"""
+    return _resolver
+
+
+def set_resolver(resolver):
+    """Use resolver to check hostnames from now on"""
+    global _resolver
+    _resolver = resolver
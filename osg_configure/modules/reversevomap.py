@@ -9,7 +9,6 @@ import sys
 import logging
 
 from collections import namedtuple
-from itertools import ifilter
 
 
 DEFAULT_VOMS_MAPFILE = "/usr/share/osg/voms-mapfile-default"
@@ -23,12 +22,11 @@ class Mapping(namedtuple('Mapping', 'pattern user')):
 
 
 def read_mapfiles():
-    """Get the VO pattern -> username mappings from the VOMS mapfiles, if they exist
+    """Get the VO pattern -> username mappings from the VOMS mapfiles, if they exist,
+    reading one line at a time
     
-    :return: List of Mappings
+    :return: Iterator of Mappings
     """
-    mappings = []
-
     # matches stuff like
     #   "/GLOW/*" glow
     #   "/cms/Role=pilot/Capability=NULL" cmspilot
@@ -42,15 +40,13 @@ def read_mapfiles():
                     if not match:
                         continue
                     else:
-                        mappings.append(Mapping(match.group(1), match.group(2)))
+                        yield Mapping(match.group(1), match.group(2))
         except EnvironmentError as err:
             if err.errno == errno.ENOENT:
                 continue
             else:
                 raise
 
-    return mappings
-
 
 def read_banfile():
     """Get the banned VOMS attrib patterns
@@ -80,49 +76,100 @@ def read_banfile():
     return bans
 
 
+class BanMatcher(object):
+    """Matches VOMS attrib patterns against all the ban globs at once"""
+
+    def __init__(self, bans):
+        """
+        :param bans: List of banned patterns (fnmatch globs)
+        """
+        self.bans = list(bans)
+        regexes = []
+        for ban in self.bans:
+            regex = fnmatch.translate(ban)
+            # translate() ends each regex with its own flags, which can
+            # only be given once for the combined regex
+            if regex.endswith(r'\Z(?ms)'):
+                regex = regex[:-len(r'(?ms)')]
+            regexes.append('(?:%s)' % regex)
+        if regexes:
+            self._regex = re.compile('(?ms)' + '|'.join(regexes))
+        else:
+            self._regex = None
+
+    def banned(self, pattern):
+        """Return True if ``pattern`` matches any of the bans"""
+        return self._regex is not None and self._regex.match(pattern) is not None
+
+
 def filter_out_bans(mappings, bans):
-    """Get a list of mappings minus any that match the patterns in ``bans``
+    """Get the mappings minus any that match the patterns in ``bans``
     
-    :return: List of Mappings
+    :return: Iterator of Mappings
     """
-    new_mappings = []
+    matcher = BanMatcher(bans)
     for mapping in mappings:
-        for ban in bans:
-            if fnmatch.fnmatch(mapping.pattern, ban):
-                break
-        else:
-            new_mappings.append(mapping)
-    return new_mappings
+        if not matcher.banned(mapping.pattern):
+            yield mapping
+
+
+def get_usernames():
+    """Get the names of the Unix users
+
+    :return: Set of usernames
+    """
+    return set(x[0] for x in pwd.getpwall())
 
 
 def filter_by_existing_users(mappings):
-    """Get a list of mappings minus any that do not have corresponding Unix users
+    """Get the mappings minus any that do not have corresponding Unix users
     
-    :return: List of Mappings
+    :return: Iterator of Mappings
     """
-    usernames = [x[0] for x in pwd.getpwall()]
-    new_mappings = [mapping for mapping in mappings if mapping.user in usernames]
-    return new_mappings
+    usernames = get_usernames()
+    for mapping in mappings:
+        if mapping.user in usernames:
+            yield mapping
+
+
+def iter_vos(mappings):
+    """Get the VOs from mappings (assumption is that the first VO group in the pattern matches the VO name),
+    each VO the first time it is found
+
+    :return: Iterator of VOs
+    """
+    regex = re.compile(r"^/(\w+)/")
+    seen = set()
+    for mapping in mappings:
+        match = regex.match(mapping.pattern)
+        if match:
+            vo = match.group(1).lower()
+            if vo not in seen:
+                seen.add(vo)
+                yield vo
 
 
 def get_vos(mappings):
-    """Get the VOs from a list of mappings (assumption is that the first VO group in the pattern matches the VO name)
+    """Get the VOs from mappings (assumption is that the first VO group in the pattern matches the VO name)
 
     :return: Set of VOs
     """
-    regex = re.compile("^/(\w+)/")
-    patterns = (m.pattern for m in mappings)
-    matches = ifilter(None, (regex.match(p) for p in patterns))
-    vo_groups = set(m.group(1).lower() for m in matches)
+    return set(iter_vos(mappings))
 
-    return vo_groups
+
+def iter_allowed_vos():
+    """Get the VOs that might be allowed on this site (based on voms-mapfiles and Unix users on the CE),
+    reading the mapfiles as the VOs are asked for
+    :return: Iterator of VOs
+    """
+    return iter_vos(filter_by_existing_users(filter_out_bans(read_mapfiles(), read_banfile())))
 
 
 def get_allowed_vos():
     """Get a set of all the VOs that might be allowed on this site (based on voms-mapfiles and Unix users on the CE)
     :return: Set of VOs
     """
-    return get_vos(filter_by_existing_users(filter_out_bans(read_mapfiles(), read_banfile())))
+    return set(iter_allowed_vos())
 
 
 def main(*args):
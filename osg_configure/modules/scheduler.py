@@ -0,0 +1,251 @@
+""" Module to run the configure() methods of configuration modules in parallel
+while keeping modules that depend on each other in order """
+
+import logging
+import os
+import Queue
+import sys
+import thread
+import threading
+
+__all__ = ['DEFAULT_JOBS',
+           'module_dependencies',
+           'run_modules']
+
+# Running modules in parallel relies on each module declaring the files it
+# writes and on the process-wide state it touches, so it is opt-in
+DEFAULT_JOBS = 1
+
+
+def _paths_overlap(path1, path2):
+    """Return True if path1 and path2 are the same or one contains the other"""
+    path1 = os.path.normpath(path1)
+    path2 = os.path.normpath(path2)
+    return (path1 == path2 or
+            path2.startswith(path1.rstrip('/') + '/') or
+            path1.startswith(path2.rstrip('/') + '/'))
+
+
+def _files_conflict(written, used):
+    """Return True if any of the files in written is one of the files in used"""
+    for path1 in written:
+        for path2 in used:
+            if _paths_overlap(path1, path2):
+                return True
+    return False
+
+
+def module_dependencies(modules):
+    """
+    Return a list with the set of indices of the modules each module has to
+    wait for.  A module waits for an earlier module if it uses an attribute
+    the earlier module provides, if it uses a file the earlier module writes
+    or if it writes a file the earlier module uses.  Dependencies always
+    point to earlier modules so modules that share files run in the same
+    order as they would one after another.
+
+    Arguments:
+    modules -- list of module objects, after their configuration was parsed
+    """
+    declarations = []
+    for module in modules:
+        written = module.written_files()
+        declarations.append((module.produced_attributes(),
+                             module.consumed_attributes(),
+                             written,
+                             written + module.external_inputs()))
+
+    dependencies = []
+    for index, (_, consumed, written, used) in enumerate(declarations):
+        waits = set()
+        for earlier in range(index):
+            produced_earlier, _, written_earlier, used_earlier = declarations[earlier]
+            if consumed is None:
+                uses_attributes = bool(produced_earlier)
+            else:
+                uses_attributes = bool(consumed & produced_earlier)
+            if (uses_attributes or
+                    _files_conflict(written_earlier, used) or
+                    _files_conflict(written, used_earlier)):
+                waits.add(earlier)
+        dependencies.append(waits)
+    return dependencies
+
+
+class _LogBuffer(object):
+    """
+    Holds back the log records made by worker threads so that they can be
+    emitted in module order, making the log read the same as when modules
+    are configured one after another
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # thread id -> index of the module the thread is running
+        self.current = {}
+        # module index -> list of (handler, record) tuples
+        self.records = {}
+        self.filters = []
+        for handler in logging.getLogger().handlers:
+            self.filters.append((handler, _BufferFilter(self, handler)))
+
+    def install(self):
+        """Start holding back records sent to the root logger's handlers"""
+        for handler, log_filter in self.filters:
+            handler.addFilter(log_filter)
+
+    def remove(self):
+        """Stop holding back records"""
+        for handler, log_filter in self.filters:
+            handler.removeFilter(log_filter)
+
+    def start(self, index):
+        """Hold back the records from the current thread for module index"""
+        self.lock.acquire()
+        try:
+            self.current[thread.get_ident()] = index
+            self.records[index] = []
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        """Stop holding back the records from the current thread"""
+        self.lock.acquire()
+        try:
+            del self.current[thread.get_ident()]
+        finally:
+            self.lock.release()
+
+    def add(self, handler, record):
+        """
+        Hold back record if it comes from a worker thread, returns True if it
+        was held back
+        """
+        self.lock.acquire()
+        try:
+            index = self.current.get(thread.get_ident())
+            if index is None:
+                return False
+            self.records[index].append((handler, record))
+            return True
+        finally:
+            self.lock.release()
+
+    def flush(self, index):
+        """Emit the records held back for module index"""
+        self.lock.acquire()
+        try:
+            records = self.records.pop(index, [])
+        finally:
+            self.lock.release()
+        for handler, record in records:
+            handler.handle(record)
+
+
+class _BufferFilter(logging.Filter):
+    """Filter for one handler that passes the records it gets to a _LogBuffer"""
+
+    def __init__(self, log_buffer, handler):
+        logging.Filter.__init__(self)
+        self.log_buffer = log_buffer
+        self.handler = handler
+
+    def filter(self, record):
+        return not self.log_buffer.add(self.handler, record)
+
+
+def run_modules(modules, task, jobs=DEFAULT_JOBS):
+    """
+    Call task(module) for each module, running modules that don't depend on
+    each other at the same time in up to jobs threads.  Log messages are
+    emitted in module order.
+
+    If task raises an exception, no more modules are started and the
+    exception from the earliest module is raised again once the modules that
+    are running finish.
+
+    Arguments:
+    modules -- list of module objects, after their configuration was parsed
+    task -- function to call with each module
+    jobs -- maximum number of modules to run at the same time
+
+    Returns:
+    list with the value returned by task for each module
+    """
+    if jobs <= 1 or len(modules) <= 1:
+        return [task(module) for module in modules]
+
+    dependencies = module_dependencies(modules)
+    dependents = [[] for _ in modules]
+    for index, waits in enumerate(dependencies):
+        for earlier in waits:
+            dependents[earlier].append(index)
+    waiting_on = [len(waits) for waits in dependencies]
+
+    results = [None] * len(modules)
+    errors = {}
+    ready = Queue.Queue()
+    finished = Queue.Queue()
+    log_buffer = _LogBuffer()
+
+    def worker():
+        while True:
+            index = ready.get()
+            if index is None:
+                return
+            log_buffer.start(index)
+            try:
+                results[index] = task(modules[index])
+            except:
+                # SystemExit from error_exit() needs to get to the main thread too
+                errors[index] = sys.exc_info()
+            log_buffer.stop()
+            finished.put(index)
+
+    running = 0
+    for index in range(len(modules)):
+        if not waiting_on[index]:
+            ready.put(index)
+            running += 1
+
+    done = set()
+    next_flush = 0
+    log_buffer.install()
+    workers = []
+    try:
+        for _ in range(min(jobs, len(modules))):
+            worker_thread = threading.Thread(target=worker)
+            worker_thread.setDaemon(True)
+            worker_thread.start()
+            workers.append(worker_thread)
+
+        while running:
+            index = finished.get()
+            running -= 1
+            done.add(index)
+            while next_flush in done:
+                log_buffer.flush(next_flush)
+                next_flush += 1
+            if errors:
+                continue
+            for later in dependents[index]:
+                waiting_on[later] -= 1
+                if not waiting_on[later]:
+                    ready.put(later)
+                    running += 1
+
+        for _ in workers:
+            ready.put(None)
+        for worker_thread in workers:
+            worker_thread.join()
+    finally:
+        log_buffer.remove()
+    # modules after one that failed may have finished before it
+    for index in sorted(done):
+        if index >= next_flush:
+            log_buffer.flush(index)
+
+    if errors:
+        exc_type, exc_value, exc_traceback = errors[min(errors)]
+        raise exc_type, exc_value, exc_traceback
+    return results
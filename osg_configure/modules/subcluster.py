@@ -2,6 +2,7 @@ import logging
 import re
 import ConfigParser
 
+from osg_configure.modules import configfile
 from osg_configure.modules import exceptions
 from osg_configure.modules import utilities
 
@@ -160,7 +161,14 @@ def check_config(config):
     Check all subcluster definitions in an entire config
     :type config: ConfigParser.ConfigParser
     :return: True if there are any subcluster definitions, False otherwise
+
+    If config comes from a loaded ConfigSnapshot, a successful result is
+    remembered in the snapshot's cache so unchanged configs aren't rechecked.
     """
+    snapshot = configfile.find_snapshot(config)
+    if snapshot is not None and 'subcluster.check_config' in snapshot.results:
+        return snapshot.results['subcluster.check_config']
+
     has_sc = False
     for section in config.sections():
         lsection = section.lower()
@@ -168,6 +176,9 @@ def check_config(config):
             continue
         has_sc = True
         check_section(config, section)
+
+    if snapshot is not None:
+        snapshot.set_result('subcluster.check_config', has_sc)
     return has_sc
 
 
@@ -0,0 +1,140 @@
+""" Module to read the user-vo-map file once and share its contents """
+
+import os
+import re
+import threading
+
+from osg_configure.modules import validation
+
+__all__ = ['USER_VO_MAP',
+           'UserVoMap',
+           'load']
+
+USER_VO_MAP = '/var/lib/osg/user-vo-map'
+
+_JAVA_RE = re.compile('(java|exception)', re.I)
+_ACCOUNT_RE = re.compile('^[a-z0-9-._]+$', re.IGNORECASE)
+
+
+class UserVoMap(object):
+    """
+    The contents of a user-vo-map file, read in one pass: the VOs in the
+    order they first appear, the VO of each account and whether the file is
+    valid
+    """
+
+    def __init__(self, path=USER_VO_MAP):
+        """
+        Read the user-vo-map file at path
+
+        Arguments:
+        path - location of the user-vo-map file
+        """
+        self.path = path
+        # VO names in the order they first appear, and the same as a set
+        self.vos = []
+        self.vo_set = set()
+        # account -> VO, from the first line for the account
+        self.account_vos = {}
+        # True if the file exists, is not empty and has no invalid lines
+        self.valid = False
+        self.invalid_lines = []
+        if validation.valid_file(path) and os.path.getsize(path) > 0:
+            self.valid = True
+            map_fh = open(path)
+            try:
+                self._scan(map_fh)
+            finally:
+                map_fh.close()
+
+    def _scan(self, lines):
+        """Scan the lines of the file, recording VOs and invalid lines"""
+        valid_vo_names = {}
+        for line in lines:
+            line = line.strip()
+            if line == "":
+                # skip blank lines
+                continue
+
+            if _JAVA_RE.search(line):
+                # found java exception
+                self._invalid(line)
+                is_java = True
+            else:
+                is_java = False
+            if line.startswith("#"):
+                continue
+
+            fields = line.split()
+            if len(fields) < 2:
+                if not is_java:
+                    self._invalid(line)
+                continue
+            account, vo = fields[0], fields[1]
+            listed_vo = vo
+            if listed_vo.startswith('us'):
+                listed_vo = listed_vo[2:]
+            if listed_vo not in self.vo_set:
+                self.vo_set.add(listed_vo)
+                self.vos.append(listed_vo)
+            self.account_vos.setdefault(account, listed_vo)
+
+            if is_java:
+                continue
+            if vo not in valid_vo_names:
+                valid_vo_names[vo] = validation.valid_vo_name(vo)
+            if len(fields) != 2 or not (_ACCOUNT_RE.match(account) and valid_vo_names[vo]):
+                # not a comment or entry
+                self._invalid(line)
+
+    def _invalid(self, line):
+        """Record an invalid line"""
+        self.invalid_lines.append(line)
+        self.valid = False
+
+    def get_vos(self):
+        """Return a list of the VO names in the file"""
+        return list(self.vos)
+
+    def has_vo(self, vo):
+        """Return True if vo is in the file"""
+        return vo in self.vo_set
+
+    def account_vo(self, account):
+        """Return the VO account is mapped to, or None"""
+        return self.account_vos.get(account)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _stat_key(path):
+    """Return a tuple that changes when the file at path changes"""
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return None
+    return path_stat.st_ino, path_stat.st_size, path_stat.st_mtime
+
+
+def load(path=USER_VO_MAP):
+    """
+    Return the UserVoMap for path, reading the file only if it changed
+    since it was last read
+    """
+    key = _stat_key(path)
+    _cache_lock.acquire()
+    try:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    finally:
+        _cache_lock.release()
+    user_vo_map = UserVoMap(path)
+    _cache_lock.acquire()
+    try:
+        _cache[path] = (key, user_vo_map)
+    finally:
+        _cache_lock.release()
+    return user_vo_map
@@ -12,9 +12,12 @@ import subprocess
 import platform
 import ConfigParser
 import errno
+import hashlib
 import logging
+import threading
+import time
 
-import rpm
+from osg_configure.modules import profiling
 
 __all__ = ['get_elements',
            'write_attribute_file',
@@ -24,14 +27,31 @@ __all__ = ['get_elements',
            'get_vos',
            'service_enabled',
            'fetch_crl',
+           'FetchCrl',
            'run_script',
            'get_condor_location',
            'get_condor_config',
            'get_condor_config_val',
+           'CondorConfigQuery',
+           'condor_config_query',
+           'read_file',
+           'read_contents',
            'atomic_write',
+           'WriteStats',
+           'write_stats',
+           'reset_write_stats',
+           'WriteTransaction',
+           'write_transaction',
+           'sync_writes',
+           'ManagedFiles',
+           'edit_file',
+           'edit_settings',
            'ce_installed',
            'any_rpms_installed',
            'rpm_installed',
+           'PackageIndex',
+           'package_index',
+           'set_package_backend',
            'get_test_config',
            'make_directory',
            'get_os_version',
@@ -39,6 +59,8 @@ __all__ = ['get_elements',
            'config_safe_getboolean',
            'classad_quote',
            'add_or_replace_setting',
+           'add_or_replace_settings',
+           'SettingsEditor',
            'NullLogger',
            'split_host_port',
 ]
@@ -56,7 +78,11 @@ def get_elements(element=None, filename=None):
     import xml.parsers.expat
 
     try:
-        dom = xml.dom.minidom.parse(filename)
+        staged = _staged_contents(filename)
+        if staged is not None:
+            dom = xml.dom.minidom.parseString(staged)
+        else:
+            dom = xml.dom.minidom.parse(filename)
     except IOError:
         return []
     except xml.parsers.expat.ExpatError:
@@ -166,29 +192,12 @@ def get_vos(user_vo_file):
     """
     Returns a list of valid VO names.
     """
+    from osg_configure.modules import uservomap
 
     if (user_vo_file is None or
             not os.path.isfile(user_vo_file)):
-        user_vo_file = '/var/lib/osg/user-vo-map'
-    if not os.path.isfile(user_vo_file):
-        return []
-    file_buffer = open(user_vo_file, 'r')
-    vo_list = []
-    for line in file_buffer:
-        try:
-            line = line.strip()
-            if line.startswith("#"):
-                continue
-            vo = line.split()[1]
-            if vo.startswith('us'):
-                vo = vo[2:]
-            if vo not in vo_list:
-                vo_list.append(vo)
-        except (KeyboardInterrupt, SystemExit):
-            raise
-        except (TypeError, AttributeError, IndexError):
-            pass
-    return vo_list
+        user_vo_file = uservomap.USER_VO_MAP
+    return uservomap.load(user_vo_file).get_vos()
 
 
 def service_enabled(service_name):
@@ -197,9 +206,10 @@ def service_enabled(service_name):
     """
     if service_name is None or service_name == "":
         return False
-    process = subprocess.Popen(['/sbin/service', '--list', service_name],
-                               stdout=subprocess.PIPE)
-    output = process.communicate()[0]
+    with profiling.span('service --list', 'subprocess', service=service_name):
+        process = subprocess.Popen(['/sbin/service', '--list', service_name],
+                                   stdout=subprocess.PIPE)
+        output = process.communicate()[0]
     if process.returncode != 0:
         return False
 
@@ -215,57 +225,130 @@ def service_enabled(service_name):
         return False
 
 
+FETCH_CRL = '/usr/sbin/fetch-crl'
+
+# Some CRLs are often problematic; it's better to ignore some errors than to halt configuration. (SOFTWARE-1428)
+FETCH_CRL_ERROR_WHITELIST = [  # whitelist partially taken from osg-test
+                               'CRL has lastUpdate time in the future',
+                               'CRL has nextUpdate time in the past',
+                               'CRL verification failed for',
+                               'Download error',
+                               'CRL retrieval for',
+                               r'^\s*$',
+                               ]
+
+
 def fetch_crl():
     """
     Run fetch_crl script and return a boolean indicating whether it was successful
     """
+    return FetchCrl().start().wait()
 
-    try:
-        crl_files = glob.glob('/etc/grid-security/certificates/*.r0')
-        if len(crl_files) > 0:
-            sys.stdout.write("CRLs exist, skipping fetch-crl invocation\n")
-            sys.stdout.flush()
-            return True
 
-        crl_path = '/usr/sbin/fetch-crl'
-
-        # Some CRLs are often problematic; it's better to ignore some errors than to halt configuration. (SOFTWARE-1428)
-        error_message_whitelist = [  # whitelist partially taken from osg-test
-                                     'CRL has lastUpdate time in the future',
-                                     'CRL has nextUpdate time in the past',
-                                     'CRL verification failed for',
-                                     'Download error',
-                                     'CRL retrieval for',
-                                     r'^\s*$',
-                                     ]
+class FetchCrl(object):
+    """
+    Runs the fetch-crl script in the background, passing its output on as it
+    is produced
+    """
+
+    def __init__(self, crl_path=FETCH_CRL, deadline=None):
+        """
+        Arguments:
+        crl_path - location of the fetch-crl script
+        deadline - seconds after starting to stop waiting for fetch-crl and
+                   kill it, or None to wait until it finishes
+        """
+        self.crl_path = crl_path
+        self.deadline = deadline
+        self.process = None
+        self._reader = None
+        self._started = None
+        # output lines that aren't in the whitelist
+        self._errors = []
+        self._result = None
+
+    def start(self):
+        """
+        Start fetch-crl if the CRLs haven't been fetched already, returns
+        this object
+        """
         try:
-            fetch_crl_process = subprocess.Popen([crl_path, '-p', '10', '-T', '30'], stdout=subprocess.PIPE,
-                                                 stderr=subprocess.STDOUT)
-        except OSError as e:
-            if e.errno == errno.ENOENT:
-                sys.stdout.write("Can't find fetch-crl script, skipping fetch-crl invocation\n")
+            crl_files = glob.glob('/etc/grid-security/certificates/*.r0')
+            if len(crl_files) > 0:
+                sys.stdout.write("CRLs exist, skipping fetch-crl invocation\n")
                 sys.stdout.flush()
-                return True
-            else:
-                raise
-        sys.stdout.write("Running %s, this process may take " % crl_path +
+                self._result = True
+                return self
+
+            try:
+                self.process = subprocess.Popen([self.crl_path, '-p', '10', '-T', '30'], stdout=subprocess.PIPE,
+                                                stderr=subprocess.STDOUT)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    sys.stdout.write("Can't find fetch-crl script, skipping fetch-crl invocation\n")
+                    sys.stdout.flush()
+                    self._result = True
+                    return self
+                else:
+                    raise
+        except IOError:
+            self._result = False
+            return self
+        sys.stdout.write("Running %s in the background, this process may take " % self.crl_path +
                          "some time to fetch all the crl updates\n")
         sys.stdout.flush()
-        outerr = fetch_crl_process.communicate()[0]
-        if fetch_crl_process.returncode != 0:
-            sys.stdout.write("fetch-crl script had some errors:\n" + outerr + "\n")
+        self._started = time.time()
+        self._reader = threading.Thread(target=self._read_output)
+        self._reader.setDaemon(True)
+        self._reader.start()
+        return self
+
+    def _read_output(self):
+        """Pass on the output of fetch-crl a line at a time, noting errors"""
+        for line in iter(self.process.stdout.readline, ''):
+            sys.stdout.write("fetch-crl: " + line)
             sys.stdout.flush()
-            for line in outerr.rstrip("\n").split("\n"):
-                for msg in error_message_whitelist:
-                    if re.search(msg, line):
-                        break
-                else:
-                    return False
-            sys.stdout.write("Ignoring errors and continuing\n")
+            for msg in FETCH_CRL_ERROR_WHITELIST:
+                if re.search(msg, line.rstrip("\n")):
+                    break
+            else:
+                self._errors.append(line)
+        self.process.stdout.close()
+        self.process.wait()
+        profiling.record('fetch-crl', 'subprocess', self._started, time.time(), command=self.crl_path)
+
+    def wait(self):
+        """
+        Wait for fetch-crl to finish or the deadline to pass and return a
+        boolean indicating whether it was successful.  Errors in the whitelist
+        and running past the deadline are not failures.
+        """
+        if self._result is not None:
+            return self._result
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(0, self._started + self.deadline - time.time())
+        self._reader.join(timeout)
+        if self._reader.isAlive():
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+            sys.stdout.write("fetch-crl did not finish within %s seconds, stopped it and continuing\n" %
+                             self.deadline)
             sys.stdout.flush()
-    except IOError:
-        return False
-    return True
+            self._result = True
+        elif self.process.returncode != 0:
+            sys.stdout.write("fetch-crl script had some errors\n")
+            if self._errors:
+                self._result = False
+            else:
+                sys.stdout.write("Ignoring errors and continuing\n")
+                self._result = True
+            sys.stdout.flush()
+        else:
+            self._result = True
+        return self._result
 
 
 def run_script(script):
@@ -278,14 +361,21 @@ def run_script(script):
     True if script runs successfully, False otherwise
     """
 
-    try:
-        process = subprocess.Popen(script)
-    except OSError as e:
-        if e.errno == errno.ENOENT:
-            return False
-        else:
-            raise
-    process.communicate()
+    if isinstance(script, types.StringTypes):
+        name = script.split()[0]
+    else:
+        name = script[0]
+    # the program may read files staged in a write transaction
+    sync_writes()
+    with profiling.span(os.path.basename(name), 'subprocess', command=script):
+        try:
+            process = subprocess.Popen(script)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return False
+            else:
+                raise
+        process.communicate()
     if process.returncode != 0:
         return False
 
@@ -321,6 +411,7 @@ def get_condor_config(default_config='/etc/condor/condor_config'):
 def get_condor_config_val(variable, executable='condor_config_val', quiet_undefined=False):
     """
     Use condor_config_val to return the expanded value of a variable.
+    Values are remembered for the rest of the run, see condor_config_query().
 
     Arguments:
     variable - name of the variable whose value to return
@@ -332,17 +423,212 @@ def get_condor_config_val(variable, executable='condor_config_val', quiet_undefi
     The stripped output of condor_config_val, or None if
     condor_config_val reports an error.
     """
+    return condor_config_query(executable).get(variable, quiet_undefined=quiet_undefined)
+
+
+# The htcondor module once it has been imported, False if it isn't available
+_htcondor = None
+# The bindings have one global config, only reload it in one thread at a time
+_htcondor_lock = threading.Lock()
+
+
+def _htcondor_bindings():
+    """Return the htcondor module, or None if it can't be imported"""
+    global _htcondor
+    if _htcondor is None:
+        try:
+            import htcondor
+            _htcondor = htcondor
+        except ImportError:
+            _htcondor = False
+    return _htcondor or None
+
+
+class CondorConfigQuery(object):
+    """
+    Looks up the values of HTCondor config variables and remembers the values
+    and where they are defined.  Values of condor_config_val are read
+    in-process with the HTCondor Python bindings when they are available;
+    otherwise, and for condor_ce_config_val etc., the executable is run for
+    many variables per call.  Call clear() after changing the config files the values come
+    from.
+    """
+
+    def __init__(self, executable='condor_config_val', daemon=None):
+        """
+        Arguments:
+        executable - the condor_config_val executable to run
+        daemon - if given, query the running daemon of this type (e.g.
+                 'schedd') instead of reading the config files
+        """
+        self.executable = executable
+        self.daemon = daemon
+        self._lock = threading.Lock()
+        # upper case variable name -> value
+        self._values = {}
+        # upper case variable name -> (file, line) or None
+        self._locations = {}
+        # upper case variable name -> error output of the lookup
+        self._errors = {}
+
+    def fetch(self, variables):
+        """Look up the variables that haven't been looked up yet in one go"""
+        self._lock.acquire()
+        try:
+            missing = []
+            for variable in variables:
+                if variable.upper() not in self._values and variable not in missing:
+                    missing.append(variable)
+            if missing and not self._read_with_bindings(missing):
+                self._run_config_val(missing)
+        finally:
+            self._lock.release()
+
+    def get(self, variable, quiet_undefined=False):
+        """
+        Return the expanded value of variable, or None if it is not defined
+        or condor_config_val failed
+
+        Arguments:
+        variable - name of the variable whose value to return
+        quiet_undefined - set to True if messages claiming the variable is
+                 undefined should be silenced
+        """
+        self.fetch([variable])
+        value = self._values[variable.upper()]
+        if value is None and not quiet_undefined:
+            for line in self._errors.get(variable.upper(), '').splitlines(True):
+                if (line.startswith('Not defined:') and
+                        line.split(':', 1)[1].strip().upper() == variable.upper()):
+                    sys.stderr.write(line)
+        return value
+
+    def location(self, variable):
+        """
+        Return a (file, line) tuple for where variable is defined, or None if
+        it is not defined in a config file
+        """
+        self._lock.acquire()
+        try:
+            # the bindings don't say where values come from
+            if variable.upper() not in self._locations:
+                self._run_config_val([variable])
+            return self._locations[variable.upper()]
+        finally:
+            self._lock.release()
+
+    def error(self, variable):
+        """Return the error output from looking up variable, if any"""
+        self.fetch([variable])
+        return self._errors.get(variable.upper(), '')
+
+    def clear(self):
+        """Forget all values that have been looked up"""
+        self._lock.acquire()
+        try:
+            self._values = {}
+            self._locations = {}
+            self._errors = {}
+        finally:
+            self._lock.release()
+
+    def _read_with_bindings(self, variables):
+        """
+        Read the values of variables with the HTCondor Python bindings and
+        store them.  Returns False if the bindings can't be used.
+
+        The bindings read the config the process environment points to, so
+        they are only used in place of plain condor_config_val; the CE and
+        cron variants use other configs and pointing CONDOR_CONFIG at them
+        would also change it for the programs other threads run.
+        """
+        bindings = _htcondor_bindings()
+        if self.daemon or self.executable != 'condor_config_val' or bindings is None:
+            return False
+        config_file = get_condor_config()
+        values = {}
+        sync_writes()
+        _htcondor_lock.acquire()
+        try:
+            with profiling.span('htcondor.param', 'condor config', config=config_file,
+                                variables=' '.join(variables)):
+                bindings.reload_config()
+                for variable in variables:
+                    values[variable.upper()] = bindings.param.get(variable)
+        except (RuntimeError, ValueError, EnvironmentError) as err:
+            logger.debug("Reading %s with the HTCondor bindings failed: %s" % (config_file, err))
+            return False
+        finally:
+            _htcondor_lock.release()
+        for name, value in values.items():
+            if value is None:
+                self._errors[name] = "Not defined: %s\n" % name
+            else:
+                value = value.strip()
+            self._values[name] = value
+        return True
+
+    def _run_config_val(self, variables):
+        """Run condor_config_val -verbose for variables and store the results"""
+        command = [self.executable]
+        if self.daemon:
+            command.append('-' + self.daemon)
+        command.append('-verbose')
+        command.extend(variables)
+        results = dict((variable.upper(), [None, None]) for variable in variables)
+        sync_writes()
+        try:
+            with profiling.span(os.path.basename(self.executable), 'subprocess', command=' '.join(command)):
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                output, error = process.communicate()
+            returncode = process.returncode
+        except OSError as err:
+            output, error, returncode = '', '', None
+            for name in results:
+                self._errors[name] = "Error running %s: %s" % (self.executable, err)
+
+        current = None
+        for line in output.splitlines():
+            match = re.match(r'(\S+)\s*=\s?(.*)$', line)
+            if match and match.group(1).upper() in results:
+                current = results[match.group(1).upper()]
+                current[0] = match.group(2).strip()
+                continue
+            match = re.match(r'\s*# at: (\S+), line (\d+)', line)
+            if match and current is not None:
+                current[1] = (match.group(1), int(match.group(2)))
+        if (len(variables) == 1 and current is None and returncode == 0 and
+                output.strip() and not output.startswith('Not defined')):
+            # daemons may ignore -verbose and just give the value
+            results[variables[0].upper()][0] = output.strip()
+
+        for line in error.splitlines(True):
+            if not line.startswith('Not defined:'):
+                sys.stderr.write(line)
+        for name, (value, location) in results.items():
+            self._values[name] = value
+            self._locations[name] = location
+            if value is None and error:
+                self._errors[name] = error
+
+
+_condor_config_queries = {}
+_condor_config_queries_lock = threading.Lock()
+
+
+def condor_config_query(executable='condor_config_val', daemon=None):
+    """
+    Return the CondorConfigQuery for executable and daemon, shared for the
+    rest of the run so that each variable is only looked up once
+    """
+    _condor_config_queries_lock.acquire()
     try:
-        process = subprocess.Popen([executable, variable],
-                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        output, error = process.communicate()
-        if error and not (error.startswith('Not defined:') and quiet_undefined):
-            sys.stderr.write(error)
-        if process.returncode != 0:
-            return None
-        return output.strip()
-    except OSError:
-        return None
+        key = (executable, daemon)
+        if key not in _condor_config_queries:
+            _condor_config_queries[key] = CondorConfigQuery(executable, daemon)
+        return _condor_config_queries[key]
+    finally:
+        _condor_config_queries_lock.release()
 
 
 def read_file(filename, default=None):
@@ -354,16 +640,30 @@ def read_file(filename, default=None):
     :param default: value to return if file cannot be read
     :return: contents of the file or default
     """
-    contents = default
     try:
-        fh = open(filename, 'r')
-        try:
-            contents = fh.read()
-        finally:
-            fh.close()
+        return read_contents(filename)
     except EnvironmentError:
-        pass
-    return contents
+        return default
+
+
+def read_contents(filename):
+    """
+    Read the contents of a file, including writes staged in the active
+    WriteTransaction.
+
+    :param filename: name of file to read
+    :type filename: str
+    :return: contents of the file
+    :raise IOError: if the file cannot be read
+    """
+    contents = _staged_contents(filename)
+    if contents is not None:
+        return contents
+    fh = open(filename, 'r')
+    try:
+        return fh.read()
+    finally:
+        fh.close()
 
 
 def atomic_write(filename=None, contents=None, **kwargs):
@@ -381,67 +681,672 @@ def atomic_write(filename=None, contents=None, **kwargs):
     Returns:
     True if file has successfully been written, False otherwise
 
+    If a WriteTransaction is active, the file is only staged and is written
+    when the transaction is committed, read_file() returns the staged
+    contents until then.
+
+    A file that already has the contents (and mode, if one is given) isn't
+    written, so its mtime doesn't change; write_stats() counts the files
+    that were and weren't changed.
     """
 
     if filename is None or contents is None:
         return True
 
+    with profiling.span(filename, 'write', size=len(contents)):
+        transaction = _write_transaction
+        if transaction is not None:
+            return transaction.stage(filename, contents, kwargs.get('mode', None))
+        return _atomic_write(filename, contents, kwargs.get('mode', None))
+
+
+def _write_temp_file(filename, contents, mode, sync):
+    """
+    Write contents to a temporary file next to filename with the mode
+    filename should get, returns the name of the temporary file
+    """
+    # hidden, so programs that read every file in the directory (e.g. HTCondor
+    # with config.d) skip it
+    (config_fd, temp_name) = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.')
     try:
-        (config_fd, temp_name) = tempfile.mkstemp(dir=os.path.dirname(filename))
-        mode = kwargs.get('mode', None)
-        if mode is None:
-            try:
-                mode = stat.S_IMODE(os.stat(filename).st_mode)
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    # file doesn't exist; give it 0644 permissions by default
-                    mode = 0o644
-                else:
-                    raise
         try:
-            try:
-                os.write(config_fd, contents)
+            if mode is None:
+                try:
+                    mode = stat.S_IMODE(os.stat(filename).st_mode)
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        # file doesn't exist; give it 0644 permissions by default
+                        mode = 0o644
+                    else:
+                        raise
+            os.write(config_fd, contents)
+            os.fchmod(config_fd, mode)
+            if sync:
                 # need to fsync data to make sure data is written on disk before renames
                 # see ext4 documentation for more information
                 os.fsync(config_fd)
-            finally:
-                os.close(config_fd)
-        except:
-            os.unlink(temp_name)
-            raise
+        finally:
+            os.close(config_fd)
+    except:
+        os.unlink(temp_name)
+        raise
+    return temp_name
+
+
+def _atomic_write(filename, contents, mode):
+    """Write contents to filename with mode, see atomic_write()"""
+    if _same_contents(filename, contents, mode):
+        _write_stats.record(filename, False)
+        return True
+    try:
+        temp_name = _write_temp_file(filename, contents, mode, sync=True)
         os.rename(temp_name, filename)
-        os.chmod(filename, mode)
     except EnvironmentError:
         return False
+    _write_stats.record(filename, True)
     return True
 
 
-__ce_installed = None
-__gateway_installed = None
+def _same_contents(filename, contents, mode=None):
+    """
+    Return True if filename is a regular file with contents and, if mode
+    isn't None, with mode.  The sizes are compared first so most changed
+    files aren't read.
+    """
+    try:
+        file_stat = os.stat(filename)
+    except OSError:
+        return False
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size != len(contents):
+        return False
+    if mode is not None and stat.S_IMODE(file_stat.st_mode) != mode:
+        return False
+    digest = hashlib.sha1()
+    try:
+        file_fh = open(filename, 'rb')
+        try:
+            while True:
+                chunk = file_fh.read(65536)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        finally:
+            file_fh.close()
+    except EnvironmentError:
+        return False
+    return digest.digest() == hashlib.sha1(contents).digest()
 
 
-def ce_installed():
+class WriteStats(object):
     """
-    Return True if one of the base osg-ce metapackages (osg-ce or osg-htcondor-ce) is installed
+    Files written with atomic_write() during a run, split into the ones
+    whose contents changed and the ones that already had the contents
     """
-    global __ce_installed
 
-    if __ce_installed is None:
-        __ce_installed = any_rpms_installed("osg-ce", "osg-htcondor-ce")
+    def __init__(self):
+        self.changed = set()
+        self.unchanged = set()
+        self._lock = threading.Lock()
 
-    return __ce_installed
+    def record(self, filename, changed):
+        """Record that filename was written, a later write of a file overrides an earlier one"""
+        path = os.path.abspath(filename)
+        self._lock.acquire()
+        try:
+            if changed:
+                self.unchanged.discard(path)
+                self.changed.add(path)
+            elif path not in self.changed:
+                self.unchanged.add(path)
+        finally:
+            self._lock.release()
 
+    def changed_files(self):
+        """Return the sorted list of changed files"""
+        self._lock.acquire()
+        try:
+            return sorted(self.changed)
+        finally:
+            self._lock.release()
 
-def gateway_installed():
+    def summary(self):
+        """Return a summary like '3 files changed, 12 unchanged'"""
+        self._lock.acquire()
+        try:
+            changed, unchanged = len(self.changed), len(self.unchanged)
+        finally:
+            self._lock.release()
+        if changed == 1:
+            return "1 file changed, %d unchanged" % unchanged
+        return "%d files changed, %d unchanged" % (changed, unchanged)
+
+
+_write_stats = WriteStats()
+
+
+def write_stats():
+    """Return the WriteStats of the files written so far"""
+    return _write_stats
+
+
+def reset_write_stats():
+    """Forget the files written so far"""
+    global _write_stats
+    _write_stats = WriteStats()
+
+
+class WriteTransaction(object):
     """
-    Check to see if a job gateway (i.e. htcondor-ce) is installed
+    Batches the writes done with atomic_write(): files are staged in
+    temporary files and written together on commit(), with one round of
+    fsyncs for all of them instead of one wait per file.  Files flushed
+    before the commit (see sync_writes()) keep a hard link to the file
+    they replaced until the transaction ends, so abort(), or a failed
+    commit(), puts back every file the transaction wrote.
+
+    Use write_transaction() to start one; only one can be active.
     """
-    global __gateway_installed
 
-    if __gateway_installed is None:
-        __gateway_installed = rpm_installed("htcondor-ce")
+    def __init__(self):
+        # path -> (temporary file, contents), in the order first staged
+        self._staged = {}
+        self._order = []
+        self._lock = threading.RLock()
+        self.failed = False
+        # files several modules edit, staged when the transaction is flushed
+        self.managed = ManagedFiles(self._lock)
+        # path -> hard link to the file it had before the transaction wrote
+        # it, or None if it didn't exist; in the order first written
+        self._originals = {}
+        self._written = []
+
+    def stage(self, filename, contents, mode=None):
+        """
+        Stage contents to be written to filename on commit, mode works as it
+        does in atomic_write().  Returns False if the file couldn't be staged.
+        """
+        path = os.path.abspath(filename)
+        self._lock.acquire()
+        try:
+            if self.managed.replace(path, contents):
+                return True
+            if _same_contents(path, contents, mode):
+                # drop an earlier write of different contents
+                if path in self._staged:
+                    _unlink_quietly(self._staged.pop(path)[0])
+                    self._order.remove(path)
+                _write_stats.record(path, False)
+                return True
+            try:
+                temp_name = _write_temp_file(path, contents, mode, sync=False)
+            except EnvironmentError as e:
+                logger.debug("Can't stage write to %s: %s" % (path, e))
+                return False
+            if path in self._staged:
+                _unlink_quietly(self._staged[path][0])
+            else:
+                self._order.append(path)
+            self._staged[path] = (temp_name, contents)
+            return True
+        finally:
+            self._lock.release()
+
+    def staged_contents(self, filename):
+        """Return the contents staged for filename, or None"""
+        path = os.path.abspath(filename)
+        self._lock.acquire()
+        try:
+            contents = self.managed.contents(path)
+            if contents is not None:
+                return contents
+            staged = self._staged.get(path)
+        finally:
+            self._lock.release()
+        if staged is None:
+            return None
+        return staged[1]
+
+    def flush(self):
+        """
+        Write the files staged so far and keep the transaction open.  If any
+        of them can't be written, the ones already renamed are put back and
+        False is returned.
+        """
+        self._lock.acquire()
+        try:
+            if not self.managed.write():
+                self.failed = True
+            if not self._order:
+                return not self.failed
+            with profiling.span('commit', 'write', files=len(self._order)):
+                result = self._write_staged()
+            if not result:
+                self.failed = True
+            return result
+        finally:
+            self._lock.release()
+
+    def _write_staged(self):
+        """Sync, back up and rename the staged files, see flush()"""
+        order, staged = self._order, self._staged
+        self._order, self._staged = [], {}
+        # path -> hard link to the file it replaced, or None if it's new
+        replaced = {}
+        renamed = []
+        try:
+            for path in order:
+                temp_fd = os.open(staged[path][0], os.O_RDONLY)
+                try:
+                    os.fsync(temp_fd)
+                finally:
+                    os.close(temp_fd)
+            for path in order:
+                if path in self._originals:
+                    replaced[path] = _backup_link(path)
+                else:
+                    replaced[path] = _backup_link(path, 'original')
+                os.rename(staged[path][0], path)
+                renamed.append(path)
+            for directory in sorted(set(os.path.dirname(path) for path in order)):
+                _fsync_directory(directory)
+            for path in order:
+                _write_stats.record(path, True)
+                if path not in self._originals:
+                    self._originals[path] = replaced.pop(path)
+                    self._written.append(path)
+        except EnvironmentError as e:
+            logger.error("Error writing %s: %s" % (', '.join(order), e))
+            for path in reversed(renamed):
+                try:
+                    if replaced[path] is None:
+                        os.unlink(path)
+                    else:
+                        os.rename(replaced[path], path)
+                        replaced[path] = None
+                except EnvironmentError as restore_error:
+                    logger.error("Can't restore %s: %s" % (path, restore_error))
+            for path in order:
+                if path not in renamed:
+                    _unlink_quietly(staged[path][0])
+            return False
+        finally:
+            for backup in replaced.values():
+                if backup is not None:
+                    _unlink_quietly(backup)
+        return True
+
+    def commit(self):
+        """
+        Write the staged files and end the transaction.  If any write in the
+        transaction failed, the files it already wrote are put back and
+        False is returned.
+        """
+        result = False
+        try:
+            result = self.flush()
+            return result
+        finally:
+            self._lock.acquire()
+            try:
+                if result:
+                    self._forget_originals()
+                else:
+                    self._restore_originals()
+            finally:
+                self._lock.release()
+            self._end()
+
+    def abort(self):
+        """
+        Throw away the staged files, put back the files already flushed and
+        end the transaction
+        """
+        self._lock.acquire()
+        try:
+            for path in self._order:
+                _unlink_quietly(self._staged[path][0])
+            self._order, self._staged = [], {}
+            self.managed = ManagedFiles(self._lock)
+            self._restore_originals()
+        finally:
+            self._lock.release()
+        self._end()
+
+    def _forget_originals(self):
+        """Remove the links to the files the transaction replaced"""
+        for path in self._written:
+            if self._originals[path] is not None:
+                _unlink_quietly(self._originals[path])
+        self._originals, self._written = {}, []
+
+    def _restore_originals(self):
+        """Put back the files the transaction replaced and remove the ones it created"""
+        if not self._written:
+            return
+        for path in reversed(self._written):
+            try:
+                if self._originals[path] is None:
+                    os.unlink(path)
+                else:
+                    os.rename(self._originals[path], path)
+            except EnvironmentError as e:
+                logger.error("Can't restore %s: %s" % (path, e))
+        for directory in sorted(set(os.path.dirname(path) for path in self._written)):
+            try:
+                _fsync_directory(directory)
+            except EnvironmentError:
+                pass
+        self._originals, self._written = {}, []
+
+    def _end(self):
+        global _write_transaction
+        _write_transaction_lock.acquire()
+        try:
+            if _write_transaction is self:
+                _write_transaction = None
+        finally:
+            _write_transaction_lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            if not self.commit():
+                raise IOError("Error writing files")
+        else:
+            self.abort()
+        return False
+
+
+class ManagedFiles(object):
+    """
+    Registry of the files that several modules edit during a run, e.g.
+    /etc/blah.config: edits go to one in-memory buffer per file and each
+    file is written at most once, when write() is called, and only if its
+    contents changed
+    """
 
-    return __gateway_installed
+    def __init__(self, lock=None):
+        """
+        Keyword arguments:
+        lock - lock protecting the buffers; a WriteTransaction passes its own
+               lock, since editing a file reads its staged contents and
+               flushing the transaction writes the buffers
+        """
+        # path -> [contents when first read, current contents]
+        self._buffers = {}
+        self._lock = lock or threading.RLock()
+
+    def edit(self, filename, function, default=None):
+        """
+        Replace the contents of filename with function(contents); default is
+        used as the contents if the file can't be read.  Returns False if the
+        file can't be read and there is no default.
+        """
+        path = os.path.abspath(filename)
+        self._lock.acquire()
+        try:
+            if path not in self._buffers:
+                contents = read_file(path)
+                if contents is None and default is None:
+                    return False
+                self._buffers[path] = [contents, contents]
+            if self._buffers[path][1] is None:
+                self._buffers[path][1] = default
+            self._buffers[path][1] = function(self._buffers[path][1])
+            return True
+        finally:
+            self._lock.release()
+
+    def replace(self, filename, contents):
+        """
+        Set the contents of filename if it's in the registry, returns False
+        if it isn't
+        """
+        path = os.path.abspath(filename)
+        self._lock.acquire()
+        try:
+            if path not in self._buffers:
+                return False
+            self._buffers[path][1] = contents
+            return True
+        finally:
+            self._lock.release()
+
+    def contents(self, filename):
+        """Return the current contents of filename, or None if it isn't in the registry"""
+        self._lock.acquire()
+        try:
+            buf = self._buffers.get(os.path.abspath(filename))
+        finally:
+            self._lock.release()
+        if buf is None:
+            return None
+        return buf[1]
+
+    def write(self):
+        """
+        Write the files whose contents changed with atomic_write(), returns
+        False if any of them couldn't be written
+        """
+        result = True
+        self._lock.acquire()
+        try:
+            for path in sorted(self._buffers):
+                original, current = self._buffers[path]
+                if current == original:
+                    if original is not None:
+                        _write_stats.record(path, False)
+                    continue
+                # forget the buffer while writing, atomic_write() would
+                # just put the contents back into it
+                del self._buffers[path]
+                if atomic_write(path, current):
+                    self._buffers[path] = [current, current]
+                else:
+                    self._buffers[path] = [original, current]
+                    result = False
+        finally:
+            self._lock.release()
+        return result
+
+
+_write_transaction = None
+_write_transaction_lock = threading.Lock()
+
+
+def write_transaction():
+    """
+    Start a WriteTransaction that atomic_write() stages its writes in until
+    it's committed or aborted, and return it
+    """
+    global _write_transaction
+    _write_transaction_lock.acquire()
+    try:
+        if _write_transaction is not None:
+            raise RuntimeError("A write transaction is already active")
+        _write_transaction = WriteTransaction()
+        return _write_transaction
+    finally:
+        _write_transaction_lock.release()
+
+
+def sync_writes():
+    """
+    Write the files staged in the active WriteTransaction, if any, so that
+    programs run afterwards see them.  Aborting the transaction still puts
+    back the files this writes.  Returns False if they couldn't be written.
+    """
+    transaction = _write_transaction
+    if transaction is None:
+        return True
+    return transaction.flush()
+
+
+def edit_file(filename, function, default=None):
+    """
+    Replace the contents of filename with function(contents), using default
+    as the contents if the file can't be read.
+
+    If a WriteTransaction is active, the edit goes to its ManagedFiles
+    registry, so the edits of all the modules to a file are written
+    together; otherwise the file is rewritten now.  The file is only
+    written if its contents changed.  Returns False if the file can't be
+    read and there is no default, or if it can't be written.
+    """
+    transaction = _write_transaction
+    if transaction is not None:
+        return transaction.managed.edit(filename, function, default)
+    contents = read_file(filename, default)
+    if contents is None:
+        return False
+    return atomic_write(filename, function(contents))
+
+
+def edit_settings(filename, settings, quote_value=True, default=None):
+    """
+    Set variables in a file in "var=value" format with
+    add_or_replace_setting(), see edit_file()
+
+    Arguments:
+    filename - name of the file to edit
+    settings - list of (variable, value) tuples
+
+    Keyword arguments:
+    quote_value - whether to double-quote the values
+    default - contents to use if the file can't be read
+    """
+    return edit_file(filename,
+                     lambda contents: add_or_replace_settings(contents, settings, quote_value=quote_value),
+                     default)
+
+
+def _staged_contents(filename):
+    """Return the contents staged for filename in the active WriteTransaction, or None"""
+    transaction = _write_transaction
+    if transaction is None:
+        return None
+    return transaction.staged_contents(filename)
+
+
+def _backup_link(path, kind='backup'):
+    """
+    Hard link path to a new hidden name next to it and return that, or None
+    if path doesn't exist.  The name starts with a dot so that programs that
+    read every file in the directory, like HTCondor with config.d, skip it.
+    """
+    backup = os.path.join(os.path.dirname(path),
+                          '.%s.osg-configure-%s-%d' % (os.path.basename(path), kind, os.getpid()))
+    try:
+        os.link(path, backup)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        if e.errno != errno.EEXIST:
+            raise
+        os.unlink(backup)
+        os.link(path, backup)
+    return backup
+
+
+def _fsync_directory(directory):
+    """fsync a directory so that renames in it are on disk"""
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _unlink_quietly(path):
+    """Remove path, ignoring errors"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _rpmdb_package_names():
+    """Return the names of the packages in the rpm database"""
+    import rpm
+
+    try:
+        with profiling.span('read package names', 'rpmdb'):
+            return [header['name'] for header in rpm.TransactionSet().dbMatch()]
+    except rpm.error as err:
+        logger.warning("Could not read the rpm database: %s" % err)
+        return []
+
+
+class PackageIndex(object):
+    """
+    The names of the installed packages, read once on first use
+    """
+
+    def __init__(self, backend=_rpmdb_package_names):
+        """
+        Arguments:
+        backend - function returning the names of the installed packages
+        """
+        self.backend = backend
+        self._names = None
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Return a frozenset of the names of the installed packages"""
+        if self._names is None:
+            self._lock.acquire()
+            try:
+                if self._names is None:
+                    self._names = frozenset(self.backend())
+            finally:
+                self._lock.release()
+        return self._names
+
+    def installed(self, name):
+        """Return True if package name is installed"""
+        return name in self.names()
+
+    def all_installed(self, names):
+        """Return True if all the packages in names are installed"""
+        return self.names().issuperset(names)
+
+    def any_installed(self, names):
+        """Return True if any of the packages in names is installed"""
+        return not self.names().isdisjoint(names)
+
+
+_package_index = PackageIndex()
+
+
+def package_index():
+    """Return the PackageIndex of the installed packages"""
+    return _package_index
+
+
+def set_package_backend(backend=_rpmdb_package_names):
+    """
+    Use backend, a function returning the names of the installed packages,
+    to find installed packages instead of the rpm database, e.g. in tests.
+    Call without arguments to go back to the rpm database.
+    """
+    global _package_index
+    _package_index = PackageIndex(backend)
+
+
+def ce_installed():
+    """
+    Return True if one of the base osg-ce metapackages (osg-ce or osg-htcondor-ce) is installed
+    """
+    return any_rpms_installed("osg-ce", "osg-htcondor-ce")
+
+
+def gateway_installed():
+    """
+    Check to see if a job gateway (i.e. htcondor-ce) is installed
+    """
+    return rpm_installed("htcondor-ce")
 
 
 def any_rpms_installed(*rpm_names):
@@ -452,7 +1357,7 @@ def any_rpms_installed(*rpm_names):
     """
     if isinstance(rpm_names[0], list) or isinstance(rpm_names[0], tuple):
         rpm_names = list(rpm_names[0])
-    return (True in (rpm_installed(rpm_name) for rpm_name in rpm_names))
+    return package_index().any_installed(rpm_names)
 
 
 def rpm_installed(rpm_name):
@@ -466,18 +1371,11 @@ def rpm_installed(rpm_name):
     Returns:
     True if rpms are installed, False otherwise
     """
-    trans_set = rpm.TransactionSet()
     if isinstance(rpm_name, types.StringType):
-        return trans_set.dbMatch('name', rpm_name).count() in (1, 2)
+        return package_index().installed(rpm_name)
 
     # check with iterable type
-    try:
-        for name in rpm_name:
-            if trans_set.dbMatch('name', name).count() not in (1, 2):
-                return False
-        return True
-    except rpm.error:
-        return False
+    return package_index().all_installed(rpm_name)
 
 
 def get_test_config(config_file=''):
@@ -576,6 +1474,66 @@ def classad_quote(input_value):
     return classad.quote(str(input_value))
 
 
+_SETTING_LINE_RE = re.compile(r'(?m)^([^\S\n]*)([^\s=]+)[^\S\n]*=.*$')
+
+
+class SettingsEditor(object):
+    """
+    Editor for buffers with one "var=value" setting per line, like
+    blah.config, HTCondor config files and Gratia ProbeConfig files.  The
+    setting lines are indexed in one scan, so setting many variables is one
+    pass over the buffer instead of a regex scan per variable; other lines,
+    including comments, are left as they are.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        # variable -> match of the first line setting it
+        self.index = {}
+        for match in _SETTING_LINE_RE.finditer(buf):
+            self.index.setdefault(match.group(2), match)
+        # offset of a replaced line -> (offset of its end, new line)
+        self._replaced = {}
+
+    def update(self, settings, make_line):
+        """
+        Replace the first line setting each variable in settings
+
+        Arguments:
+        settings - list of (variable, value) tuples
+        make_line - function called with the indentation of the line, the
+                    variable and the value that returns the new line
+
+        Returns the list of (variable, value) tuples for the variables that
+        have no line, in order; if a variable is given more than once, its
+        last value is used.
+        """
+        missing = []
+        missing_index = {}
+        for variable, value in settings:
+            match = self.index.get(variable)
+            if match is not None:
+                self._replaced[match.start()] = (match.end(), make_line(match.group(1), variable, value))
+            elif variable in missing_index:
+                missing[missing_index[variable]] = (variable, value)
+            else:
+                missing_index[variable] = len(missing)
+                missing.append((variable, value))
+        return missing
+
+    def getvalue(self):
+        """Return the edited buffer"""
+        pieces = []
+        position = 0
+        for start in sorted(self._replaced):
+            end, line = self._replaced[start]
+            pieces.append(self.buf[position:start])
+            pieces.append(line)
+            position = end
+        pieces.append(self.buf[position:])
+        return ''.join(pieces)
+
+
 def add_or_replace_setting(old_buf, variable, new_value, quote_value=True):
     """
     If there is a line setting 'variable' in 'old_buf' (in a "var=value" format),
@@ -584,15 +1542,26 @@ def add_or_replace_setting(old_buf, variable, new_value, quote_value=True):
 
     If quote_value is True (default), the value is double-quoted first
     """
-    if quote_value:
-        new_value = '"%s"' % new_value
+    return add_or_replace_settings(old_buf, [(variable, new_value)], quote_value=quote_value)
+
 
-    new_line = '%s=%s' % (variable, new_value)
-    new_buf, count = re.subn(r'(?m)^\s*%s\s*=.*$' % re.escape(variable), new_line, old_buf, 1)
-    if count == 0:
+def add_or_replace_settings(old_buf, settings, quote_value=True):
+    """
+    Like add_or_replace_setting() for a list of (variable, value) tuples,
+    in a single pass over old_buf
+    """
+    def make_line(indent, variable, value):
+        if quote_value:
+            value = '"%s"' % value
+        return '%s=%s' % (variable, value)
+
+    editor = SettingsEditor(old_buf)
+    missing = editor.update(settings, make_line)
+    new_buf = editor.getvalue()
+    if missing:
         if not new_buf.endswith('\n'):
             new_buf += "\n"
-        new_buf += new_line + "\n"
+        new_buf += ''.join(make_line('', variable, value) + "\n" for variable, value in missing)
     return new_buf
 
 
@@ -639,12 +1608,17 @@ def split_host_port(host_port):
 
 def reconfig_service(service, reconfig_cmd):
     """If condor is running, run condor_reconfig to make it reload its configuration"""
-    if os.system('/sbin/service %s status >/dev/null 2>&1' % service) != 0:
+    sync_writes()
+    with profiling.span('service status', 'subprocess', service=service):
+        status = os.system('/sbin/service %s status >/dev/null 2>&1' % service)
+    if status != 0:
         logger.info("%s is not running -- skipping reconfigure" % service)
         return True
 
     logger.info("Reconfiguring %s using %s" % (service, reconfig_cmd))
-    if os.system(reconfig_cmd + ' >/dev/null') == 0:
+    with profiling.span(reconfig_cmd.split()[0], 'subprocess', command=reconfig_cmd):
+        status = os.system(reconfig_cmd + ' >/dev/null')
+    if status == 0:
         logger.info("Reconfigure successful")
         return True
 
@@ -6,9 +6,11 @@ import os
 import pwd
 import ConfigParser
 import sys
-import cStringIO
+
+from collections import namedtuple
 
 from osg_configure.modules import utilities
+from osg_configure.modules import resolver
 
 __all__ = ['valid_domain',
            'valid_email',
@@ -21,6 +23,8 @@ __all__ = ['valid_domain',
            'valid_boolean',
            'valid_executable',
            'valid_ini_file',
+           'scan_ini_file',
+           'IniDiagnostic',
            'valid_contact',
            'valid_integer']
 
@@ -28,7 +32,8 @@ __all__ = ['valid_domain',
 def valid_domain(host, resolve=False):
     """Return True if the string passed in is a valid domain
 
-    If resolve=True, also check that it resolves (according to gethostbyname).
+    If resolve=True, also check that it resolves (according to gethostbyname,
+    through the resolver module so each host is only looked up once).
 
     """
     if not host:
@@ -51,11 +56,7 @@ def valid_domain(host, resolve=False):
     if not resolve:
         return True
 
-    try:
-        socket.gethostbyname(host)
-    except (socket.herror, socket.gaierror):
-        return False
-    return True
+    return resolver.get_resolver().resolves(host)
 
 
 def valid_hostname(hostname):
@@ -129,57 +130,19 @@ def valid_user_vo_file(map_file=None, return_invalid_lines=False):
     """
     Check an osg-user-vo-file and make sure that it's valid.
     """
-    if map_file is None or map_file == "":
-        if return_invalid_lines:
-            return (False, [])
-        else:
-            return False
+    from osg_configure.modules import uservomap
 
-    if not valid_file(map_file):
-        if return_invalid_lines:
-            return (False, [])
-        else:
-            return False
-
-    if os.path.getsize(map_file) == 0:
+    if map_file is None or map_file == "":
         if return_invalid_lines:
             return (False, [])
         else:
             return False
 
-    valid = True
-    comment = re.compile(r'^\s*#')
-    java = re.compile('(java|exception)', re.I)
-    account_regex = re.compile('^[a-z0-9-._]+$', re.IGNORECASE)
-    invalid_lines = []
-    for line in [x.strip() for x in open(map_file)]:
-        if line == "":
-            # skip blank lines
-            continue
-
-        if java.search(line):
-            # found java exception
-            invalid_lines.append(line)
-            valid = False
-            continue
-
-        if not comment.match(line):
-            if len(line.strip().split()) != 2:
-                invalid_lines.append(line)
-                valid = False
-                continue
-
-            (account, vo) = line.strip().split()
-            if not (account_regex.match(account) and valid_vo_name(vo)):
-                # not a comment or entry
-                invalid_lines.append(line)
-                valid = False
-                continue
-
+    user_vo_map = uservomap.load(map_file)
     if return_invalid_lines:
-        return (valid, invalid_lines)
+        return (user_vo_map.valid, list(user_vo_map.invalid_lines))
     else:
-        return valid
+        return user_vo_map.valid
 
 
 def valid_vo_name(vo_name):
@@ -232,46 +195,138 @@ def valid_executable(file_name):
     return True
 
 
+# Diagnostic kinds that make an ini file unusable; the others are warnings
+INI_ERROR_KINDS = frozenset(['continuation-line',
+                             'missing-section-header',
+                             'syntax-error'])
+
+_interpvar_re = re.compile(r"%\(([^)]+)\)s")
+
+
+class IniDiagnostic(namedtuple('IniDiagnostic', ['filename', 'line', 'column', 'kind', 'message'])):
+    """A problem found in an ini file; line and column are 1-based"""
+    __slots__ = ()
+
+    def is_error(self):
+        """Return True if the problem makes the file unusable"""
+        return self.kind in INI_ERROR_KINDS
+
+    def __str__(self):
+        return "%s:%d:%d: %s" % (self.filename, self.line, self.column, self.message)
+
+
+def _bad_reference_offsets(value):
+    """
+    Return the offsets in value of '%' signs that SafeConfigParser can't
+    interpolate, i.e. ones that don't start '%%' or a '%(name)s' reference
+    """
+    offsets = []
+    pos = value.find('%')
+    while pos != -1:
+        if value[pos + 1:pos + 2] == '%':
+            pos += 2
+        else:
+            match = _interpvar_re.match(value, pos)
+            if match:
+                pos = match.end()
+            else:
+                offsets.append(pos)
+                pos += 1
+        pos = value.find('%', pos)
+    return offsets
+
+
+def scan_ini_file(filename, fp=None):
+    """
+    Check an ini file in a single pass and tokenize it the way a ConfigParser
+    would read it.  Besides syntax errors, the checks enforce our own
+    requirements: no lines starting with whitespace (so no multi-line values),
+    no repeated sections and no bad variable references.
+
+    Arguments:
+    filename -- name of the file to scan
+    fp -- file object to read instead of opening filename
+
+    Returns:
+    An (entries, diagnostics) tuple.  entries is a list of
+    (line number, section, option, value) tuples in file order, where option
+    and value are None for section headers; option names are not normalized.
+    diagnostics is a list of IniDiagnostic objects.
+    """
+    if fp is None:
+        fp = open(filename, 'r')
+        try:
+            return scan_ini_file(filename, fp)
+        finally:
+            fp.close()
+
+    entries = []
+    diagnostics = []
+    seen_sections = set()
+    section = None
+    lineno = 0
+    for line in fp:
+        lineno += 1
+        if line.strip() == '' or line[0] in '#;':
+            continue
+        if line.split(None, 1)[0].lower() == 'rem' and line[0] in 'rR':
+            continue
+        if line[0].isspace():
+            column = len(line) - len(line.lstrip()) + 1
+            diagnostics.append(IniDiagnostic(filename, lineno, column, 'continuation-line',
+                                             "Line starts with whitespace, lines with "
+                                             "options should not start with a space"))
+            continue
+        match = ConfigParser.RawConfigParser.SECTCRE.match(line)
+        if match:
+            section = match.group('header')
+            if section in seen_sections:
+                diagnostics.append(IniDiagnostic(filename, lineno, 1, 'duplicate-section',
+                                                 "Section %s is repeated" % section))
+            seen_sections.add(section)
+            entries.append((lineno, section, None, None))
+            continue
+        if section is None:
+            diagnostics.append(IniDiagnostic(filename, lineno, 1, 'missing-section-header',
+                                             "Option found before any section header"))
+            continue
+        match = ConfigParser.RawConfigParser.OPTCRE.match(line)
+        if not match:
+            diagnostics.append(IniDiagnostic(filename, lineno, 1, 'syntax-error',
+                                             "Line is not a section header, option or comment: %r" %
+                                             line.rstrip('\r\n')))
+            continue
+        value = match.group('value')
+        value_column = match.start('value') + 1
+        # ';' starts a comment only if it follows whitespace
+        pos = value.find(';')
+        if pos != -1 and value[pos - 1].isspace():
+            value = value[:pos]
+        value = value.strip()
+        if value == '""':
+            value = ''
+        for offset in _bad_reference_offsets(value):
+            diagnostics.append(IniDiagnostic(filename, lineno, value_column + offset, 'bad-reference',
+                                             "Invalid variable reference in %s, use %%(name)s "
+                                             "or %%%% for a literal %%" % value))
+        entries.append((lineno, section, match.group('option').rstrip(), value))
+    return entries, diagnostics
+
+
 def valid_ini_file(filename):
     """
     Check an ini file to make sure that it's conforms to our requirements
-    E.g. no repeated sections, no newlines in options
+    E.g. no newlines in options, see scan_ini_file() for details
 
     returns True/False
     """
     if filename == "" or filename is None:
         return False
 
-    config_file = os.path.abspath(filename)
-    configuration = ConfigParser.ConfigParser()
-    file_buffer = cStringIO.StringIO()
-    temp = open(config_file).read()
-    temp = temp.replace('%(', '-')
-    file_buffer.write(temp)
-    file_buffer.seek(0)
-    try:
-        configuration.readfp(file_buffer)
-    except ConfigParser.ParsingError as e:
-        sys.stderr.write("Error while parsing: %s\n%s\n" % (filename, e))
-        sys.stderr.write("Lines with options should not start with a space\n")
-        return False
-
-    sections = configuration.sections()
-    for section in sections:
-        for option in configuration.options(section):
-            try:
-                value = configuration.get(section, option)
-                if "\n" in value:
-                    # pylint: disable-msg=E1103
-                    error_line = value.split('\n')[1]
-                    sys.stderr.write("INI syntax error in section %s: \n" % section)
-                    sys.stderr.write("The following line starts with a space: %s\n" % error_line)
-                    sys.stderr.write("Please removing the leading space\n")
-                    return False
-            except ValueError:
-                sys.stderr.write("syntax error in section %s with option %s\n" % (section, option))
-                return False
-
+    diagnostics = scan_ini_file(os.path.abspath(filename))[1]
+    for diagnostic in diagnostics:
+        if diagnostic.is_error():
+            return False
     return True
 
 
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Benchmark for GUMS json queries against a local stand-in server
+
+Compares a new GumsClient (so a new TLS connection) per request with one
+shared keep-alive client, and reading the host DN with openssl every time
+with the cached reader.  Run from the tests directory:
+
+    python benchmark_gums.py [requests] [users] [delay]
+"""
+
+import os
+import sys
+import time
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import gums_supported_vos
+
+import mock_gums_server
+
+
+def timed(function, count):
+    """Return the seconds it took to call function count times"""
+    start = time.time()
+    for _ in range(count):
+        function()
+    return time.time() - start
+
+
+def main(requests=200, users=1000, delay=0):
+    requests = int(requests)
+    users = int(users)
+    vo_user_map = dict(('vo%d' % i, ['user%d' % j for j in range(i, users, 50)]) for i in range(50))
+    user_vo_map_text = "".join("user%d vo%d\n" % (i, i % 50) for i in range(users))
+    server = mock_gums_server.MockGumsServer(vo_user_map, user_vo_map_text, float(delay))
+    server.start()
+    try:
+        def client():
+            return gums_supported_vos.GumsClient(server.host, server.certpath, server.keypath,
+                                                 context=server.client_context())
+
+        def query(gums, close=False):
+            gums.json_map('getOsgVoUserMap', {'hostname': 'ce.example.com'})
+            if close:
+                gums.close()
+
+        new_client_time = timed(lambda: query(client(), close=True), requests)
+        shared = client()
+        shared_time = timed(lambda: query(shared), requests)
+        shared.close()
+        print("%d requests, %d users: new connection each %.3fs (%.1f/s), keep-alive %.3fs (%.1f/s)" %
+              (requests, users, new_client_time, requests / new_client_time,
+               shared_time, requests / shared_time))
+
+        openssl_time = timed(lambda: gums_supported_vos._openssl_subject(server.certpath), requests)
+        subject_time = timed(lambda: gums_supported_vos.get_subject(server.certpath), requests)
+        print("get_subject: openssl %.3fs, cached %.3fs for %d calls" %
+              (openssl_time, subject_time, requests))
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Benchmark for banning and user filtering in reversevomap
+
+Compares the matcher in reversevomap with matching every (mapping, ban) pair
+with fnmatch and looking up users in a list, using a synthetic VOMS mapfile
+and passwd database.  Run from the tests directory:
+
+    python benchmark_reversevomap.py [mappings] [users] [bans]
+"""
+
+import fnmatch
+import os
+import pwd
+import sys
+import time
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import reversevomap
+
+
+def synthetic_mappings(count, users_count):
+    """Return count Mappings spread over 500 VOs, half with existing users"""
+    return [reversevomap.Mapping('/vo%d/group%d/Role=role%d/Capability=NULL' % (i % 500, i % 37, i % 7),
+                                 'user%d' % ((i * 7919) % (users_count * 2)))
+            for i in range(count)]
+
+
+def synthetic_bans(count):
+    """Return count ban globs, some of which match the synthetic mappings"""
+    bans = []
+    for i in range(count):
+        if i % 4 == 0:
+            bans.append('/vo%d/*' % (i * 7 + 1))
+        elif i % 4 == 1:
+            bans.append('/vo%d/group%d/*' % (i, i % 37))
+        elif i % 4 == 2:
+            bans.append('/vo*/group%d/Role=role%d/*' % (i % 37 + 40, i % 7))
+        else:
+            bans.append('/banned%d/*' % i)
+    return bans
+
+
+def synthetic_passwd(count):
+    """Return count pwd entries"""
+    return [('user%d' % i, 'x', 10000 + i, 10000 + i, '', '/home/user%d' % i, '/bin/bash')
+            for i in range(count)]
+
+
+def old_filter_out_bans(mappings, bans):
+    """Match every mapping against every ban with fnmatch"""
+    new_mappings = []
+    for mapping in mappings:
+        for ban in bans:
+            if fnmatch.fnmatch(mapping.pattern, ban):
+                break
+        else:
+            new_mappings.append(mapping)
+    return new_mappings
+
+
+def old_filter_by_existing_users(mappings):
+    """Look up the user of every mapping in a list of all users"""
+    usernames = [x[0] for x in pwd.getpwall()]
+    return [mapping for mapping in mappings if mapping.user in usernames]
+
+
+def timed(function, *args):
+    """Return the result of function(*args) as a list and the seconds it took"""
+    start = time.time()
+    result = list(function(*args))
+    return result, time.time() - start
+
+
+def main(mappings_count=50000, users_count=100000, bans_count=50):
+    mappings = synthetic_mappings(int(mappings_count), int(users_count))
+    bans = synthetic_bans(int(bans_count))
+    passwd = synthetic_passwd(int(users_count))
+    real_getpwall = pwd.getpwall
+    pwd.getpwall = lambda: passwd
+    try:
+        print("%d mappings, %d bans, %d users" % (len(mappings), len(bans), len(passwd)))
+        new_unbanned, new_ban_time = timed(reversevomap.filter_out_bans, mappings, bans)
+        old_unbanned, old_ban_time = timed(old_filter_out_bans, mappings, bans)
+        assert new_unbanned == old_unbanned
+        print("filter_out_bans:          %8.3fs (fnmatch per pair: %8.3fs)" % (new_ban_time, old_ban_time))
+
+        # the list lookups take minutes with the full data, time a slice
+        sample = new_unbanned[:2000]
+        new_users, new_user_time = timed(reversevomap.filter_by_existing_users, sample)
+        old_users, old_user_time = timed(old_filter_by_existing_users, sample)
+        assert new_users == old_users
+        _, full_user_time = timed(reversevomap.filter_by_existing_users, new_unbanned)
+        print("filter_by_existing_users: %8.3fs (list lookups: %8.3fs) for %d mappings, %.3fs for all %d" %
+              (new_user_time, old_user_time, len(sample), full_user_time, len(new_unbanned)))
+    finally:
+        pwd.getpwall = real_getpwall
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""Benchmark for the var=value editors used on blah.config and ProbeConfig
+
+Compares add_or_replace_settings() and GratiaConfiguration.replace_settings()
+with running one regex substitution per setting as they used to, on a
+synthetic ProbeConfig and blah.config.  Run from the tests directory:
+
+    python benchmark_settings.py [lines] [runs]
+"""
+
+import os
+import re
+import sys
+import time
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from xml.sax import saxutils
+
+from osg_configure.modules import utilities
+from osg_configure.configure_modules import gratia
+
+SUBSCRIPTION = [('ProbeName', 'condor:ce.example.org'),
+                ('SiteName', 'Example Site'),
+                ('Grid', 'OSG'),
+                ('EnableProbe', '1'),
+                ('SSLHost', 'gratia.example.org:443'),
+                ('SOAPHost', 'gratia.example.org:443'),
+                ('SSLRegistrationHost', 'gratia.example.org:443'),
+                ('CollectorHost', 'gratia.example.org:443')]
+
+BLAH_SETTINGS = [('condor_binpath', '/usr/bin'),
+                 ('lsf_binpath', '/opt/lsf/bin'),
+                 ('lsf_confpath', '/opt/lsf/conf'),
+                 ('sge_rootpath', '/opt/sge'),
+                 ('sge_cellname', 'default'),
+                 ('blah_disable_wn_proxy_renewal', 'yes'),
+                 ('blah_delegate_renewed_proxies', 'no'),
+                 ('blah_disable_limited_proxy', 'yes'),
+                 ('new_setting', 'added')]
+
+
+def synthetic_probe_config(lines):
+    """Return a ProbeConfig with lines attributes, the subscription ones near the end"""
+    attributes = ['    <!-- Attribute%d is a comment -->' % i if i % 5 == 0 else
+                  '    Attribute%d="value%d"' % (i, i) for i in range(lines)]
+    attributes += ['    %s="old"' % name for name, _ in SUBSCRIPTION]
+    return '<ProbeConfiguration\n' + '\n'.join(attributes) + '\n/>\n'
+
+
+def synthetic_blah_config(lines):
+    """Return a blah.config with lines settings, most of the edited ones near the end"""
+    settings = ['# comment %d' % i if i % 5 == 0 else 'setting%d="value%d"' % (i, i) for i in range(lines)]
+    settings += ['%s="old"' % name for name, _ in BLAH_SETTINGS[:-1]]
+    return '\n'.join(settings) + '\n'
+
+
+def old_add_or_replace_setting(old_buf, variable, new_value, quote_value=True):
+    """One regex substitution per setting"""
+    if quote_value:
+        new_value = '"%s"' % new_value
+
+    new_line = '%s=%s' % (variable, new_value)
+    new_buf, count = re.subn(r'(?m)^\s*%s\s*=.*$' % re.escape(variable), new_line, old_buf, 1)
+    if count == 0:
+        if not new_buf.endswith('\n'):
+            new_buf += "\n"
+        new_buf += new_line + "\n"
+    return new_buf
+
+
+def old_replace_setting(buf, setting, value):
+    """One regex compile and substitution per setting"""
+    quoted_value = saxutils.quoteattr(str(value))
+    re_obj = re.compile(r"^(\s*)%s\s*=.*$" % setting, re.MULTILINE)
+    new_buf, count = re_obj.subn(r'\1%s=%s' % (setting, quoted_value), buf, 1)
+    if count == 0:
+        new_buf = new_buf.replace('/>', "    %s=%s\n/>" % (setting, quoted_value))
+    return new_buf
+
+
+def old_blah(buf):
+    for variable, value in BLAH_SETTINGS:
+        buf = old_add_or_replace_setting(buf, variable, value)
+    return buf
+
+
+def old_probe(buf):
+    for setting, value in SUBSCRIPTION:
+        buf = old_replace_setting(buf, setting, value)
+    return buf
+
+
+def timed(function, buf, runs):
+    """Return the result of function(buf) and the best time of runs calls"""
+    best = None
+    result = None
+    for _ in range(runs):
+        start = time.time()
+        result = function(buf)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+def main(lines=20000, runs=5):
+    lines, runs = int(lines), int(runs)
+    probe_config = synthetic_probe_config(lines)
+    blah_config = synthetic_blah_config(lines)
+    print("%d lines, %d settings in ProbeConfig, %d in blah.config, best of %d runs" %
+          (lines, len(SUBSCRIPTION), len(BLAH_SETTINGS), runs))
+
+    new_probe, new_time = timed(lambda buf: gratia.GratiaConfiguration.replace_settings(buf, SUBSCRIPTION),
+                                probe_config, runs)
+    old_probe_buf, old_time = timed(old_probe, probe_config, runs)
+    assert new_probe == old_probe_buf
+    print("ProbeConfig: %8.4fs (regex per setting: %8.4fs)" % (new_time, old_time))
+
+    new_blah, new_time = timed(lambda buf: utilities.add_or_replace_settings(buf, BLAH_SETTINGS),
+                               blah_config, runs)
+    old_blah_buf, old_time = timed(old_blah, blah_config, runs)
+    assert new_blah == old_blah_buf
+    print("blah.config: %8.4fs (regex per setting: %8.4fs)" % (new_time, old_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
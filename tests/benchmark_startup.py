@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Benchmark for the module loading osg-configure does at startup
+
+For each command line mode, times (in a new python process each run) the
+loading osg-configure does before it reads the configuration, and compares
+it with importing and constructing every module as all modes used to.  Run
+from the tests directory:
+
+    python benchmark_startup.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+# setup system library path
+pathname = os.path.realpath('../')
+
+SETUP = """
+import sys
+sys.path.insert(0, %r)
+from osg_configure.modules import moduleregistry
+entries = moduleregistry.available_modules()
+""" % pathname
+
+MODES = [('-l', ""),
+         ('-q', ""),
+         ('--enabled-services', "[e.instantiate() for e in entries if e.services is None or e.services]"),
+         ('-v', "[e.instantiate() for e in entries]"),
+         ('-c', "[e.instantiate() for e in entries]")]
+
+EAGER = "[e.instantiate() for e in entries]"
+
+REPORT = """
+imported = [name for name in sys.modules if name.startswith(moduleregistry.PACKAGE + '.')
+            and sys.modules[name] is not None]
+heavy = [name for name in ['urllib2', 'httplib', 'ssl', 'classad'] if sys.modules.get(name)]
+sys.stderr.write('%d %s\\n' % (len(imported), ','.join(heavy) or '-'))
+"""
+
+
+def run(code, runs):
+    """Return the best time of running code in a new python process, and its report"""
+    best = None
+    report = None
+    for _ in range(runs):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-c', SETUP + code + REPORT],
+                                   stderr=subprocess.PIPE)
+        report = process.communicate()[1].strip().splitlines()[-1]
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, report
+
+
+def main(runs=10):
+    runs = int(runs)
+    empty_time, _ = run("", runs)
+    eager_time, eager_report = run(EAGER, runs)
+    print("%-20s %10s %10s   %s" % ("mode", "lazy", "eager", "modules imported, heavy imports"))
+    for mode, code in MODES:
+        lazy_time, report = run(code, runs)
+        print("%-20s %9.3fs %9.3fs   %s (eager: %s)" % (mode, lazy_time, eager_time, report, eager_report))
+    print("(python startup and registry alone: %.3fs, best of %d runs)" % (empty_time, runs))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
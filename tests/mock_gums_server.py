@@ -0,0 +1,150 @@
+"""Local stand-in for the GUMS json interface, for tests and benchmarks
+
+MockGumsServer serves getOsgVoUserMap and generateOsgUserVoMap over HTTPS
+with keep-alive, using a self-signed certificate made with openssl:
+
+    server = MockGumsServer({'osg': ['osg']}, "osg osg\\n")
+    server.start()
+    client = gums_supported_vos.GumsClient(server.host, server.certpath,
+                                           server.keypath, context=server.client_context())
+    ...
+    server.stop()
+"""
+
+import BaseHTTPServer
+import SocketServer
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import urlparse
+
+SUBJECT = "/DC=org/DC=opensciencegrid/O=Open Science Grid/OU=Services/CN=localhost"
+
+
+class _GumsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send each reply in one segment
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.mock.count('connections')
+
+    def do_GET(self):
+        mock = self.server.mock
+        mock.count('requests')
+        if mock.delay:
+            time.sleep(mock.delay)
+        url = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(url.query)
+        mock.hostnames.append(params.get('hostname', [None])[0])
+        if mock.take_failure():
+            self._reply(503, {'result': 'Fail', 'message': 'unavailable'})
+        elif url.path == '/gums/json/getOsgVoUserMap':
+            self._reply(200, {'result': 'OK', 'map': mock.vo_user_map})
+        elif url.path == '/gums/json/generateOsgUserVoMap':
+            self._reply(200, {'result': 'OK', 'map': mock.user_vo_map_text})
+        else:
+            self._reply(404, {'result': 'Fail', 'message': 'no such command'})
+
+    def _reply(self, status, contents):
+        body = json.dumps(contents)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients closing idle keep-alive connections are expected
+        pass
+
+
+class MockGumsServer(object):
+    """
+    HTTPS server on localhost answering GUMS json requests with fixed maps
+    """
+
+    def __init__(self, vo_user_map, user_vo_map_text, delay=0):
+        """
+        Arguments:
+        vo_user_map - dict of VO -> list of users for getOsgVoUserMap
+        user_vo_map_text - user-vo-map file contents for generateOsgUserVoMap
+
+        Keyword arguments:
+        delay - seconds to wait before answering each request
+        """
+        self.vo_user_map = vo_user_map
+        self.user_vo_map_text = user_vo_map_text
+        self.delay = delay
+        # number of requests to answer with 503 before answering normally
+        self.failures = 0
+        self.connections = 0
+        self.requests = 0
+        self.hostnames = []
+        self.temp_dir = None
+        self.certpath = None
+        self.keypath = None
+        self.host = None
+        self._server = None
+        self._lock = threading.Lock()
+
+    def count(self, what):
+        with self._lock:
+            setattr(self, what, getattr(self, what) + 1)
+
+    def take_failure(self):
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+            return False
+
+    def start(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.certpath = os.path.join(self.temp_dir, 'cert.pem')
+        self.keypath = os.path.join(self.temp_dir, 'key.pem')
+        devnull = open(os.devnull, 'w')
+        try:
+            subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                                   '-days', '1', '-subj', SUBJECT,
+                                   '-keyout', self.keypath, '-out', self.certpath],
+                                  stdout=devnull, stderr=devnull)
+        finally:
+            devnull.close()
+        self._server = _ThreadingHTTPServer(('localhost', 0), _GumsHandler)
+        self._server.mock = self
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.load_cert_chain(self.certpath, self.keypath)
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self.host = 'localhost:%d' % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def client_context(self):
+        """Return an ssl.SSLContext that trusts the server's certificate"""
+        return ssl.create_default_context(cafile=self.certpath)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir)
+            self.temp_dir = None
@@ -8,6 +8,8 @@ import sys
 import unittest
 import ConfigParser
 import imp
+import shutil
+import tempfile
 
 # setup system library path
 pathname = os.path.realpath('../')
@@ -150,6 +152,96 @@ class TestConfigFile(unittest.TestCase):
                          "Didn't get the correct location for missing_opt:" +
                          "got %s expected None" % (opt_location))
 
+    def test_get_option_position(self):
+        """
+        Test that get_option_position gives the file and line of an option
+        """
+        config_directory = get_test_config('config-test1.d')
+        position = configfile.get_option_position('second_opt',
+                                                  'Common',
+                                                  config_directory=config_directory)
+        self.assertEqual((get_test_config('config-test1.d/10-test.ini'), 2),
+                         position,
+                         "Wrong position for second_opt: got %s" % (position,))
+        snapshot = configfile.ConfigSnapshot(config_directory=config_directory)
+        self.assertEqual(position,
+                         snapshot.get_option_position('SECOND_OPT', 'Common'),
+                         "Snapshot position differs from get_option_position")
+        self.assertEqual(None, snapshot.get_option_position('second_opt', 'Missing'))
+
+    def test_config_snapshot(self):
+        """
+        Test that a ConfigSnapshot gives the same results as reading the files
+        and tracks option locations
+        """
+        config_directory = get_test_config('config-test1.d')
+        snapshot = configfile.ConfigSnapshot(config_directory=config_directory)
+        config = snapshot.get_config()
+        self.assertEqual(config.get('Common', 'second_opt'), 'bar',
+                         "Later file should override second_opt")
+        self.assertTrue(config is snapshot.get_config(),
+                        "Snapshot should only parse the files once")
+        self.assertFalse(config is snapshot.get_config(case_sensitive=True),
+                         "Case sensitive view should be a separate parser")
+        self.assertEqual(snapshot.get_option_location('second_opt', 'Common'),
+                         get_test_config('config-test1.d/10-test.ini'))
+        self.assertEqual(snapshot.get_option_location('missing_opt', 'Common'), None)
+
+        # get_option_location should use a loaded snapshot
+        snapshot = configfile.load_snapshot(config_directory=config_directory)
+        self.assertEqual(configfile.get_option_location('first_opt', 'Common',
+                                                        config_directory=config_directory),
+                         get_test_config('config-test1.d/00-test.ini'))
+
+    def test_recording_config(self):
+        """
+        Test that a RecordingConfigParser sees the snapshot's configuration and
+        records which sections are read
+        """
+        config_directory = get_test_config('config-test1.d')
+        snapshot = configfile.ConfigSnapshot(config_directory=config_directory)
+        config = snapshot.get_recording_config()
+        self.assertEqual(config.get('Common', 'second_opt'), 'bar')
+        self.assertFalse(config.has_section('Missing'))
+        self.assertEqual(config.read_sections, set(['Common', 'Missing']))
+        self.assertFalse(config.listed_sections)
+        self.assertEqual(config.recorded_contents()[1][0], 'Common')
+        config.sections()
+        self.assertTrue(config.listed_sections)
+        self.assertTrue(snapshot.has_config(config),
+                        "Recording view not recognized as a view of the snapshot")
+
+    def test_snapshot_cache(self):
+        """
+        Test that the snapshot cache is used for unchanged files and
+        invalidated when a file changes
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            config_directory = os.path.join(temp_dir, 'config.d')
+            shutil.copytree(get_test_config('config-test1.d'), config_directory)
+            cache_file = os.path.join(temp_dir, 'cache')
+
+            snapshot = configfile.load_snapshot(config_directory=config_directory, cache_file=cache_file)
+            self.assertFalse(snapshot.from_cache, "Cache used before it was written")
+            snapshot.set_result('check', True)
+            snapshot.save_cache()
+
+            snapshot = configfile.load_snapshot(config_directory=config_directory, cache_file=cache_file)
+            self.assertTrue(snapshot.from_cache, "Cache not used for unchanged files")
+            self.assertEqual(snapshot.get_config().get('Common', 'second_opt'), 'bar')
+            self.assertEqual(snapshot.results, {'check': True})
+
+            config_fh = open(os.path.join(config_directory, '10-test.ini'), 'w')
+            config_fh.write("[Common]\nsecond_opt = changed\n")
+            config_fh.close()
+            snapshot = configfile.load_snapshot(config_directory=config_directory, cache_file=cache_file)
+            self.assertFalse(snapshot.from_cache, "Cache used after a file changed")
+            self.assertEqual(snapshot.get_config().get('Common', 'second_opt'), 'changed')
+            self.assertEqual(snapshot.results, {})
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_get_file_list(self):
         """
         Test the list of files that the module things it's reading and the order
@@ -203,11 +295,8 @@ class TestConfigFile(unittest.TestCase):
         config_dirs = [get_test_config('config-space1.d'),
                        get_test_config('config-space2.d'),
                        get_test_config('config-space3.d')]
-        temp = sys.stderr
-        sys.stderr = open(os.devnull, 'w')
         for directory in config_dirs:
-            self.assertRaises(SystemExit, configfile.read_config_files, config_directory=directory)
-        sys.stderr = temp
+            self.assertRaises(exceptions.ConfigFileError, configfile.read_config_files, config_directory=directory)
 
 
 if __name__ == '__main__':
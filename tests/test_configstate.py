@@ -0,0 +1,107 @@
+"""Unit tests to test configstate functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+import logging
+import shutil
+import tempfile
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import configfile
+from osg_configure.modules import configstate
+from osg_configure.configure_modules import squid
+from osg_configure.modules.utilities import get_test_config
+
+# NullHandler is only available in Python 2.7+
+try:
+    NullHandler = logging.NullHandler
+except AttributeError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+
+global_logger = logging.getLogger(__name__)
+global_logger.addHandler(NullHandler())
+
+
+class TestConfigState(unittest.TestCase):
+    """
+    Class to test configstate module
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_directory = os.path.join(self.temp_dir, 'config.d')
+        os.mkdir(self.config_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_config(self, filename, contents):
+        config_fh = open(os.path.join(self.config_directory, filename), 'w')
+        config_fh.write(contents)
+        config_fh.close()
+
+    def squid_digest(self):
+        snapshot = configfile.ConfigSnapshot(config_directory=self.config_directory)
+        config = snapshot.get_recording_config()
+        settings = squid.SquidConfiguration(logger=global_logger)
+        settings.parse_configuration(config)
+        return configstate.module_digest(settings, config, settings.get_attributes())
+
+    def test_module_digest(self):
+        """
+        Test that a module digest only changes when the sections the module
+        reads change
+        """
+        shutil.copy(get_test_config('squid/squid1.ini'), self.config_directory)
+        digest = self.squid_digest()
+        self.assertEqual(digest, self.squid_digest(), "Digest isn't stable")
+
+        self.write_config('20-other.ini', "[Other]\nsetting = 1\n")
+        self.assertEqual(digest, self.squid_digest(),
+                         "Digest changed for a section squid doesn't read")
+
+        self.write_config('zz-squid.ini', "[Squid]\nlocation = other.com\n")
+        self.assertNotEqual(digest, self.squid_digest(),
+                            "Digest didn't change for a new squid location")
+
+    def test_path_digest(self):
+        """
+        Test that path digests change with the contents of files and directories
+        """
+        missing = configstate.path_digest(os.path.join(self.temp_dir, 'missing'))
+        self.write_config('00-test.ini', "[Test]\n")
+        digest = configstate.path_digest(self.config_directory)
+        self.assertNotEqual(missing, digest)
+        self.write_config('00-test.ini', "[Test]\na = 1\n")
+        self.assertNotEqual(digest, configstate.path_digest(self.config_directory),
+                            "Directory digest didn't change when a file changed")
+
+    def test_configure_state(self):
+        """
+        Test that digests are saved and loaded from the state file
+        """
+        state_file = os.path.join(self.temp_dir, 'state')
+        state = configstate.ConfigureState(state_file)
+        self.assertFalse(state.unchanged('Test', 'abc'))
+        state.record('Test', 'abc')
+        state.record('Other', 'def')
+        self.assertTrue(state.save())
+
+        state = configstate.ConfigureState(state_file)
+        self.assertTrue(state.unchanged('Test', 'abc'))
+        self.assertFalse(state.unchanged('Test', 'abd'))
+        state.forget('Other')
+        self.assertFalse(state.unchanged('Other', 'def'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -412,6 +412,39 @@ class TestGratia(unittest.TestCase):
                          "got %s but expected %s" % (services, expected_services))
 
 
+    def testReplaceSettings(self):
+        """
+        Test that probe config settings are replaced in place and missing
+        ones are added
+        """
+        probe_config = ('<ProbeConfiguration\n'
+                        '    <!-- SiteName="commented" -->\n'
+                        '    SiteName="old"\n'
+                        '    Grid = "OSG"\n'
+                        '    EnableProbe="0"\n'
+                        '/>\n')
+        buf = gratia.GratiaConfiguration.replace_settings(probe_config, [('SiteName', 'a "site"'),
+                                                                         ('EnableProbe', 1),
+                                                                         ('SSLHost', 'host:443'),
+                                                                         ('Grid', 'OSG-ITB'),
+                                                                         ('SSLHost', 'other:443')])
+        self.assertEqual('<ProbeConfiguration\n'
+                         '    <!-- SiteName="commented" -->\n'
+                         '    SiteName=\'a "site"\'\n'
+                         '    Grid="OSG-ITB"\n'
+                         '    EnableProbe="1"\n'
+                         '    SSLHost="other:443"\n'
+                         '/>\n', buf)
+        self.assertEqual(buf, gratia.GratiaConfiguration.replace_setting(buf, 'Grid', 'OSG-ITB'))
+
+        ur_collector = 'pbsAcctLogDir = "/old"\n# lrmsType = "pbs"\n'
+        self.assertEqual('pbsAcctLogDir="/var/spool/pbs"\n# lrmsType = "pbs"\nlrmsType = "pbs"\n',
+                         gratia.GratiaConfiguration.replace_settings(ur_collector,
+                                                                     [('pbsAcctLogDir', '/var/spool/pbs'),
+                                                                      ('lrmsType', 'pbs')],
+                                                                     xml_file=False))
+
+
 if __name__ == '__main__':
     console = logging.StreamHandler()
     console.setLevel(logging.ERROR)
@@ -0,0 +1,113 @@
+"""Unit tests to test gums_supported_vos functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import gums_supported_vos
+from osg_configure.modules import exceptions
+
+import mock_gums_server
+
+
+class TestGumsSupportedVos(unittest.TestCase):
+    """
+    Class to test gums_supported_vos module against a local GUMS stand-in
+    """
+
+    def setUp(self):
+        self.server = mock_gums_server.MockGumsServer({'osg': ['root'], 'cms': ['__no_such_user__']},
+                                                      "root osg\n")
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def client(self, **kwargs):
+        return gums_supported_vos.GumsClient(self.server.host, self.server.certpath,
+                                             self.server.keypath,
+                                             context=self.server.client_context(), **kwargs)
+
+    def test_get_subject(self):
+        """
+        Test that the DN read with openssl is cached until the certificate
+        changes
+        """
+        subject = gums_supported_vos.get_subject(self.server.certpath)
+        self.assertEqual(mock_gums_server.SUBJECT, subject)
+        self.assertTrue(self.server.certpath in gums_supported_vos._subjects)
+        real_openssl_subject = gums_supported_vos._openssl_subject
+        gums_supported_vos._openssl_subject = lambda certpath: self.fail("DN read again")
+        try:
+            self.assertEqual(subject, gums_supported_vos.get_subject(self.server.certpath))
+        finally:
+            gums_supported_vos._openssl_subject = real_openssl_subject
+
+    def test_keep_alive(self):
+        """
+        Test that requests share one connection
+        """
+        client = self.client()
+        for _ in range(5):
+            json_map = client.json_map('getOsgVoUserMap', {'hostname': 'ce.example.com'})
+            self.assertEqual('OK', json_map['result'])
+        self.assertEqual(1, client.connections_made)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(5, self.server.requests)
+        self.assertEqual(['ce.example.com'] * 5, self.server.hostnames)
+
+    def test_retry(self):
+        """
+        Test that server errors are retried and other errors are not
+        """
+        self.server.failures = 2
+        client = self.client(retries=2, backoff=0)
+        self.assertEqual('OK', client.json_map('getOsgVoUserMap', {'hostname': 'x'})['result'])
+        self.assertEqual(3, self.server.requests)
+
+        self.server.failures = 3
+        self.assertRaises(IOError, client.json_map, 'getOsgVoUserMap', {'hostname': 'x'})
+        self.assertEqual(6, self.server.requests)
+
+        self.assertRaises(IOError, client.json_map, 'noSuchCommand', {'hostname': 'x'})
+        self.assertEqual(7, self.server.requests)
+
+    def test_timeout(self):
+        """
+        Test that a slow server makes the request fail
+        """
+        self.server.delay = 0.5
+        client = self.client(timeout=0.2, retries=0)
+        self.assertRaises(IOError, client.json_map, 'getOsgVoUserMap', {'hostname': 'x'})
+
+    def test_gums_json(self):
+        """
+        Test the GUMS queries with the shared client
+        """
+        key = (self.server.host, self.server.certpath, self.server.keypath)
+        gums_supported_vos._clients[key] = self.client()
+        try:
+            self.assertEqual(['osg'], gums_supported_vos.gums_supported_vos(
+                self.server.host, certpath=self.server.certpath, keypath=self.server.keypath))
+            self.assertEqual("root osg\n", gums_supported_vos.gums_json_user_vo_map_file(
+                self.server.host, 'ce.example.com', self.server.certpath, self.server.keypath))
+            self.assertEqual([mock_gums_server.SUBJECT, 'ce.example.com'], self.server.hostnames)
+            self.assertEqual(1, self.server.connections)
+
+            self.server.failures = 10
+            gums_supported_vos._clients[key].backoff = 0
+            self.assertRaises(exceptions.Error, gums_supported_vos.gums_json_vo_user_map,
+                              self.server.host, 'x', self.server.certpath, self.server.keypath)
+        finally:
+            del gums_supported_vos._clients[key]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,8 +8,10 @@ import sys
 import unittest
 import ConfigParser
 import logging
+import shutil
 import tempfile
 import subprocess
+import threading
 
 # setup system library path
 pathname = os.path.realpath('../')
@@ -17,7 +19,9 @@ sys.path.insert(0, pathname)
 
 from osg_configure.modules import utilities
 from osg_configure.modules import exceptions
+from osg_configure.modules import scheduler
 from osg_configure.configure_modules import misc
+from osg_configure.modules.baseconfiguration import BaseConfiguration
 from osg_configure.modules.utilities import get_test_config
 
 # NullHandler is only available in Python 2.7+
@@ -307,6 +311,93 @@ class TestMisc(unittest.TestCase):
                          "got %s but expected %s" % (services, expected_services))
 
 
+    def testGridmapClearsCeConfigValues(self):
+        """
+        Test that writing GRIDMAP to the CE config forgets the CE config
+        values looked up before
+        """
+        temp_dir = tempfile.mkdtemp()
+        old_config_file = misc.HTCONDOR_CE_CONFIG_FILE
+        query = utilities.condor_config_query('condor_ce_config_val')
+        try:
+            misc.HTCONDOR_CE_CONFIG_FILE = os.path.join(temp_dir, '50-osg-configure.conf')
+            settings = misc.MiscConfiguration(logger=global_logger)
+            for method, expected in [('gridmap', 'GRIDMAP=/etc/grid-security/grid-mapfile\n'), ('vomsmap', '')]:
+                query._values['GRIDMAP'] = 'stale'
+                settings.authorization_method = method
+                settings.write_gridmap_to_htcondor_ce_config()
+                self.assertFalse('GRIDMAP' in query._values, "Stale value kept for %s" % method)
+                self.assertEqual("# This file is managed by osg-configure\n" + expected,
+                                 open(misc.HTCONDOR_CE_CONFIG_FILE).read())
+        finally:
+            misc.HTCONDOR_CE_CONFIG_FILE = old_config_file
+            query.clear()
+            shutil.rmtree(temp_dir)
+
+    def testFetchCrlWaitAfterModules(self):
+        """
+        Test that modules configured after misc run while fetch-crl is still
+        running and that finish_configure() waits for it
+        """
+        released = threading.Event()
+        waited = []
+
+        class FakeFetchCrl(object):
+            def __init__(self, crl_path=None, deadline=None):
+                self.succeeded = True
+
+            def start(self):
+                return self
+
+            def wait(self):
+                waited.append(True)
+                released.wait(30)
+                return self.succeeded
+
+        class LaterModule(BaseConfiguration):
+            def configure(self, attributes):
+                self.fetch_crl_running = not released.is_set() and not waited
+                return True
+
+        temp_dir = tempfile.mkdtemp()
+        old_fetch_crl = utilities.FetchCrl
+        old_gsi_authz = misc.GSI_AUTHZ_LOCATION
+        try:
+            utilities.FetchCrl = FakeFetchCrl
+            misc.GSI_AUTHZ_LOCATION = os.path.join(temp_dir, 'gsi-authz.conf')
+            settings = misc.MiscConfiguration(logger=global_logger)
+            settings.enabled = True
+            settings.authorization_method = 'gridmap'
+            settings.htcondor_gateway_enabled = False
+            settings.options['edit_lcmaps_db'].value = False
+            settings.options['fetch_crl_deadline'].value = 0
+            later = LaterModule(logger=global_logger)
+            settings.start_configure()
+
+            results = []
+            runner = threading.Thread(target=lambda: results.append(
+                scheduler.run_modules([settings, later], lambda module: module.configure({}))))
+            runner.setDaemon(True)
+            runner.start()
+            runner.join(10)
+            self.assertFalse(runner.isAlive(), "Configuring waited for fetch-crl")
+            self.assertEqual([[True, True]], results)
+            self.assertTrue(later.fetch_crl_running, "Later module waited for fetch-crl")
+
+            released.set()
+            settings.finish_configure()
+            self.assertEqual([True], waited)
+
+            settings.start_configure()
+            settings._fetch_crl.succeeded = False
+            self.assertRaises(exceptions.ConfigureError, settings.finish_configure)
+        finally:
+            released.set()
+            utilities.FetchCrl = old_fetch_crl
+            misc.GSI_AUTHZ_LOCATION = old_gsi_authz
+            shutil.rmtree(temp_dir)
+
+
 if __name__ == '__main__':
     console = logging.StreamHandler()
     console.setLevel(logging.ERROR)
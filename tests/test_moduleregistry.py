@@ -0,0 +1,60 @@
+"""Unit tests to test the module registry"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import moduleregistry
+
+
+class TestModuleRegistry(unittest.TestCase):
+    """
+    Class to test moduleregistry module
+    """
+
+    def test_registry_matches_modules(self):
+        """
+        Test that the registered metadata agrees with the module classes
+        """
+        entries = moduleregistry.available_modules()
+        self.assertEqual([entry.filename for entry in moduleregistry.MODULES],
+                         [entry.filename for entry in entries],
+                         "Modules missing from the registry")
+        for entry in entries:
+            module = entry.instantiate()
+            self.assertEqual(entry.class_name, module.__class__.__name__)
+            self.assertEqual(entry.name, module.module_name())
+            self.assertEqual(entry.section, module.config_section)
+            self.assertEqual(entry.separately_configurable, module.separately_configurable())
+            self.assertEqual(entry.services is None or bool(entry.services),
+                             'enabled_services' in [name for cls in module.__class__.__mro__[:-2]
+                                                    for name in vars(cls)],
+                             "Wrong services for %s" % entry.filename)
+
+    def test_lazy_import(self):
+        """
+        Test that listing the modules doesn't import them
+        """
+        entry = moduleregistry.ModuleEntry('storage', 'StorageConfiguration', 'Storage',
+                                           'Storage', True, [])
+        package = moduleregistry.PACKAGE + '.storage'
+        saved = sys.modules.pop(package, None)
+        try:
+            moduleregistry.available_modules()
+            self.assertFalse(package in sys.modules)
+            self.assertEqual('StorageConfiguration', entry.load().__name__)
+            self.assertTrue(package in sys.modules)
+        finally:
+            if saved is not None:
+                sys.modules[package] = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
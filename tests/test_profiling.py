@@ -0,0 +1,103 @@
+"""Unit tests to test profiling functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import json
+import os
+import sys
+import unittest
+import shutil
+import tempfile
+import StringIO
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import profiling
+from osg_configure.modules import utilities
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Class to test profiling module
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        profiling.reset()
+
+    def tearDown(self):
+        profiling.reset()
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled(self):
+        """
+        Test that nothing is recorded unless profiling is enabled
+        """
+        with profiling.span('parse', 'module'):
+            pass
+        profiling.record('startup', 'phase', 0, 1)
+        self.assertEqual([], profiling.summary())
+
+    def test_summary(self):
+        """
+        Test that spans with the same name are added up, longest first
+        """
+        profiling.enable(origin=100.0)
+
+        @profiling.timed('module')
+        def configure():
+            """Configure something"""
+            return 'result'
+
+        self.assertEqual('result', configure())
+        self.assertEqual('configure', configure.__name__)
+        profiling.record('condor_config_val', 'subprocess', 101.0, 102.0)
+        profiling.record('condor_config_val', 'subprocess', 103.0, 103.5)
+        summary = profiling.summary()
+        self.assertEqual((1.5, 2, 1.0, 'subprocess', 'condor_config_val'), summary[0])
+        self.assertEqual(('module', 'configure'), summary[1][3:])
+
+        output = StringIO.StringIO()
+        profiling.report(output, limit=1)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[2].split()[-1] == 'condor_config_val', output.getvalue())
+        self.assertEqual("(1 more)", lines[-1])
+
+    def test_trace(self):
+        """
+        Test that the trace is in the Chrome trace event format
+        """
+        profiling.enable(origin=100.0)
+        profiling.record('startup', 'phase', 100.0, 100.25, modules=3)
+        trace_file = os.path.join(self.temp_dir, 'trace.json')
+        profiling.write_trace(trace_file)
+        trace = json.load(open(trace_file))
+        events = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(1, len(events))
+        self.assertEqual('startup', events[0]['name'])
+        self.assertEqual('phase', events[0]['cat'])
+        self.assertEqual(0, events[0]['ts'])
+        self.assertEqual(250000, events[0]['dur'])
+        self.assertEqual({'modules': '3'}, events[0]['args'])
+        self.assertEqual(os.getpid(), events[0]['pid'])
+        self.assertTrue([event for event in trace['traceEvents']
+                         if event['ph'] == 'M' and event['tid'] == events[0]['tid']])
+
+    def test_instrumented(self):
+        """
+        Test that running programs and writing files are recorded
+        """
+        profiling.enable()
+        self.assertTrue(utilities.run_script(['true']))
+        filename = os.path.join(self.temp_dir, 'file')
+        self.assertTrue(utilities.atomic_write(filename, 'contents'))
+        names = [(row[3], row[4]) for row in profiling.summary()]
+        self.assertTrue(('subprocess', 'true') in names, names)
+        self.assertTrue(('write', filename) in names, names)
+
+
+if __name__ == '__main__':
+    unittest.main()
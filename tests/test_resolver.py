@@ -0,0 +1,109 @@
+"""Unit tests to test resolver functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+import shutil
+import socket
+import tempfile
+import threading
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import resolver
+from osg_configure.modules import validation
+
+
+class FakeLookup(object):
+    """Lookup function with known results that counts lookups"""
+
+    def __init__(self):
+        self.calls = []
+        self.hang = threading.Event()
+
+    def __call__(self, host):
+        self.calls.append(host)
+        if host.startswith('slow'):
+            self.hang.wait(5)
+        if host.startswith('bad'):
+            raise socket.gaierror(-2, 'Name or service not known')
+        return '127.0.0.1'
+
+
+class TestResolver(unittest.TestCase):
+    """
+    Class to test resolver module
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.lookup = FakeLookup()
+        self.old_resolver = resolver.get_resolver()
+
+    def tearDown(self):
+        self.lookup.hang.set()
+        resolver.set_resolver(self.old_resolver)
+        shutil.rmtree(self.temp_dir)
+
+    def test_prefetch(self):
+        """
+        Test that hosts are resolved once, that slow lookups time out and
+        that hosts that timed out aren't rejected
+        """
+        dns = resolver.Resolver(timeout=0.5, lookup=self.lookup)
+        dns.prefetch(['good.example.com', 'bad.example.com', 'slow.example.com',
+                      'good.example.com'])
+        self.assertEqual(3, len(self.lookup.calls))
+        self.assertEqual(resolver.RESOLVED, dns.status('good.example.com'))
+        self.assertEqual(resolver.FAILED, dns.status('bad.example.com'))
+        self.assertEqual(resolver.TIMED_OUT, dns.status('slow.example.com'))
+        self.assertEqual(3, len(self.lookup.calls), "Hosts looked up again")
+        self.assertEqual((['slow.example.com'], ['bad.example.com']), dns.problems())
+
+        resolver.set_resolver(dns)
+        self.assertTrue(validation.valid_domain('good.example.com', True))
+        self.assertFalse(validation.valid_domain('bad.example.com', True))
+        self.assertTrue(validation.valid_domain('slow.example.com', True))
+        self.assertTrue(validation.valid_domain('other.example.com', True))
+        self.assertEqual(4, len(self.lookup.calls))
+
+        # a timed out lookup isn't cached, the result is used once it finishes
+        self.lookup.hang.set()
+        self.assertEqual(resolver.RESOLVED, dns.status('slow.example.com'))
+        self.assertEqual(4, len(self.lookup.calls))
+
+    def test_cache_file(self):
+        """
+        Test that only successful lookups are kept in the cache file
+        """
+        cache_file = os.path.join(self.temp_dir, 'cache')
+        dns = resolver.Resolver(timeout=0.5, cache_file=cache_file, lookup=self.lookup)
+        dns.prefetch(['good.example.com', 'bad.example.com', 'slow.example.com'])
+        dns.save_cache()
+
+        lookup = FakeLookup()
+        lookup.hang.set()
+        dns = resolver.Resolver(cache_file=cache_file, lookup=lookup)
+        self.assertTrue(dns.resolves('good.example.com'))
+        self.assertFalse(dns.resolves('bad.example.com'))
+        self.assertTrue(dns.resolves('slow.example.com'))
+        self.assertEqual(['bad.example.com', 'slow.example.com'], lookup.calls)
+
+        # expired entries are looked up again
+        cache_file = os.path.join(self.temp_dir, 'cache2')
+        dns = resolver.Resolver(cache_file=cache_file, ttl=0, lookup=lookup)
+        dns.prefetch(['good.example.com'])
+        dns.save_cache()
+        dns = resolver.Resolver(cache_file=cache_file, lookup=lookup)
+        dns.prefetch(['good.example.com'])
+        self.assertEqual(['bad.example.com', 'slow.example.com', 'good.example.com', 'good.example.com'],
+                         lookup.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit tests to test reversevomap functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import fnmatch
+import os
+import pwd
+import sys
+import unittest
+import shutil
+import tempfile
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import reversevomap
+
+
+class TestReverseVoMap(unittest.TestCase):
+    """
+    Class to test reversevomap module
+    """
+
+    def test_ban_matcher(self):
+        """
+        Test that the ban matcher agrees with fnmatch on each ban
+        """
+        bans = ['/GLOW/*', '/cms/[a-c]?x', '/atlas/Role=*/Capability=NULL', '/x.y/*']
+        matcher = reversevomap.BanMatcher(bans)
+        for pattern in ['/GLOW/a', '/GLOW', '/cms/bzx', '/cms/dzx', '/x.y/b', '/xzy/b',
+                        '/atlas/Role=pilot/Capability=NULL', '/atlas/Role=pilot/Capability=NULLX']:
+            expected = bool([ban for ban in bans if fnmatch.fnmatch(pattern, ban)])
+            self.assertEqual(expected, matcher.banned(pattern),
+                             "Wrong result for %s" % pattern)
+        self.assertFalse(reversevomap.BanMatcher([]).banned('/GLOW/a'))
+
+        mappings = [reversevomap.Mapping('/GLOW/a', 'glow'),
+                    reversevomap.Mapping('/cms/Role=pilot', 'cmspilot')]
+        self.assertEqual([mappings[1]], list(reversevomap.filter_out_bans(mappings, bans)))
+
+    def test_filter_by_existing_users(self):
+        """
+        Test that mappings to users that don't exist are dropped
+        """
+        user = pwd.getpwuid(os.getuid())[0]
+        mappings = [reversevomap.Mapping('/GLOW/*', user),
+                    reversevomap.Mapping('/cms/*', '__no_such_user__')]
+        self.assertEqual([mappings[0]], list(reversevomap.filter_by_existing_users(mappings)))
+
+    def test_streaming(self):
+        """
+        Test that mapfiles are read and VOs are yielded one at a time
+        """
+        temp_dir = tempfile.mkdtemp()
+        old_mapfiles = reversevomap.DEFAULT_VOMS_MAPFILE, reversevomap.VOMS_MAPFILE
+        try:
+            reversevomap.DEFAULT_VOMS_MAPFILE = os.path.join(temp_dir, 'default-voms-mapfile')
+            reversevomap.VOMS_MAPFILE = os.path.join(temp_dir, 'missing-voms-mapfile')
+            map_fh = open(reversevomap.DEFAULT_VOMS_MAPFILE, 'w')
+            map_fh.write('"/GLOW/*" glow\n'
+                         'not a mapping\n'
+                         '"/cms/Role=pilot/Capability=NULL" cmspilot # pilots\n'
+                         '"/GLOW/chtc/*" glow\n')
+            map_fh.close()
+            self.assertEqual([reversevomap.Mapping('/GLOW/*', 'glow'),
+                              reversevomap.Mapping('/cms/Role=pilot/Capability=NULL', 'cmspilot'),
+                              reversevomap.Mapping('/GLOW/chtc/*', 'glow')],
+                             list(reversevomap.read_mapfiles()))
+        finally:
+            reversevomap.DEFAULT_VOMS_MAPFILE, reversevomap.VOMS_MAPFILE = old_mapfiles
+            shutil.rmtree(temp_dir)
+
+        read = []
+
+        def mappings():
+            for vo in ['GLOW', 'glow', 'cms', 'atlas']:
+                read.append(vo)
+                yield reversevomap.Mapping('/%s/*' % vo, 'user')
+
+        vos = reversevomap.iter_vos(mappings())
+        self.assertEqual('glow', next(vos))
+        self.assertEqual('cms', next(vos))
+        self.assertEqual(['GLOW', 'glow', 'cms'], read)
+        self.assertEqual(set(['glow', 'cms', 'atlas']), reversevomap.get_vos(mappings()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ import unittest
 import ConfigParser
 import logging
 import pwd
+import shutil
+import tempfile
 
 
 # setup system library path 
@@ -50,10 +52,16 @@ class TestRSV(unittest.TestCase):
         self._old_getpwnam = pwd.getpwnam
         # pw_name, pw_passwd, pw_uid, pw_gid, pw_gecos, pw_dir, pw_shell
         pwd.getpwnam = lambda name: ('root', '', 0, 0, 'root', '/root', '/bin/bash')
+        # keep the meta cache out of /var/lib/osg
+        self._cache_dir = tempfile.mkdtemp()
+        self._old_meta_cache_file = rsv.META_CACHE_FILE
+        rsv.META_CACHE_FILE = os.path.join(self._cache_dir, 'rsv-meta.cache')
 
     def tearDown(self):
         utilities.rpm_installed = self._old_rpm_installed
         pwd.getpwnam = self._old_getpwnam
+        rsv.META_CACHE_FILE = self._old_meta_cache_file
+        shutil.rmtree(self._cache_dir)
 
     def load_settings_from_files(self, *cfgfiles):
         configuration = ConfigParser.SafeConfigParser()
@@ -378,6 +386,193 @@ class TestRSV(unittest.TestCase):
                          "List of enabled services incorrect, " +
                          "got %s but expected %s" % (services, expected_services))
 
+    def testMetaCache(self):
+        """
+        Test that the meta index is cached and rebuilt when the meta dir changes
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            meta_dir = os.path.join(temp_dir, 'meta')
+            shutil.copytree(RSV_META_DIR, meta_dir)
+            settings = rsv.RsvConfiguration(logger=global_logger)
+            settings.rsv_meta_dir = meta_dir
+            settings.rsv_meta_cache = os.path.join(temp_dir, 'cache')
+            settings.load_rsv_meta_files()
+            ce_metrics = settings._get_metrics_by_type('OSG-CE', enabled=False)
+            self.assertTrue('org.osg.gratia.condor' in ce_metrics)
+            self.assertFalse('org.osg.gratia.condor env' in ce_metrics)
+            self.assertEqual([], settings._get_metrics_by_type('OSG-CE'))
+            self.assertTrue(os.path.exists(settings.rsv_meta_cache))
+
+            # the cached index is used while the meta dir is unchanged
+            settings = rsv.RsvConfiguration(logger=global_logger)
+            settings.rsv_meta_dir = meta_dir
+            settings.rsv_meta_cache = os.path.join(temp_dir, 'cache')
+            settings._save_meta_cache = lambda dir_key: self.fail("Meta files read again")
+            settings.load_rsv_meta_files()
+            self.assertEqual(ce_metrics, settings._get_metrics_by_type('OSG-CE', enabled=False))
+
+            meta_fh = open(os.path.join(meta_dir, 'org.osg.test.meta'), 'w')
+            meta_fh.write("[org.osg.test]\nservice-type = OSG-CE\nenable-by-default = true\n")
+            meta_fh.close()
+            # make sure the directory mtime changes
+            dir_stat = os.stat(meta_dir)
+            os.utime(meta_dir, (dir_stat.st_atime, dir_stat.st_mtime + 10))
+            settings = rsv.RsvConfiguration(logger=global_logger)
+            settings.rsv_meta_dir = meta_dir
+            settings.rsv_meta_cache = os.path.join(temp_dir, 'cache')
+            settings.load_rsv_meta_files()
+            self.assertEqual(['org.osg.test'], settings._get_metrics_by_type('OSG-CE'))
+            self.assertTrue(settings._meta_index.has_metric('org.osg.test'))
+
+            # editing a meta file in place doesn't change the directory
+            dir_stat = os.stat(meta_dir)
+            meta_fh = open(os.path.join(meta_dir, 'org.osg.test.meta'), 'a')
+            meta_fh.write("[org.osg.test2]\nservice-type = OSG-CE\nenable-by-default = true\n")
+            meta_fh.close()
+            os.utime(meta_dir, (dir_stat.st_atime, dir_stat.st_mtime))
+            settings = rsv.RsvConfiguration(logger=global_logger)
+            settings.rsv_meta_dir = meta_dir
+            settings.rsv_meta_cache = os.path.join(temp_dir, 'cache')
+            settings.load_rsv_meta_files()
+            self.assertEqual(['org.osg.test', 'org.osg.test2'], sorted(settings._get_metrics_by_type('OSG-CE')))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def testMetricBatch(self):
+        """
+        Test that metrics for a host are enabled with as few rsv-control calls as possible
+        """
+        batch = rsv.MetricBatch()
+        batch.add('ce.host.com', ['org.osg.general.ping-host', 'org.osg.globus.gridftp-simple'])
+        batch.add('gridftp.host.com', ['org.osg.globus.gridftp-simple'],
+                  ['--arg', 'destination-dir=/tmp'])
+        batch.add('ce.host.com', ['org.osg.gratia.condor'])
+        batch.add('ce.host.com', ['org.osg.globus.gridftp-simple'],
+                  ['--arg', 'destination-dir=/tmp'])
+        expected_calls = [('ce.host.com', ['org.osg.general.ping-host', 'org.osg.gratia.condor'], []),
+                          ('ce.host.com', ['org.osg.globus.gridftp-simple'], ['--arg', 'destination-dir=/tmp']),
+                          ('gridftp.host.com', ['org.osg.globus.gridftp-simple'], ['--arg', 'destination-dir=/tmp'])]
+        self.assertEqual(expected_calls, batch.calls())
+
+    def testWriteMetricConfigs(self):
+        """
+        Test that metrics get enabled by writing the metric config files directly
+        """
+        settings = self.load_settings_from_files("rsv/rsv1.ini")
+        self.assertEqual('rsv-control', settings.options['metric_writer'].value)
+        settings.options['metric_writer'].value = 'native'
+        settings.load_rsv_meta_files()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            settings.rsv_conf_dir = temp_dir
+            settings.rsv_metrics_dir = os.path.join(temp_dir, 'metrics')
+            settings._enable_metrics('ce.host.com', ['org.osg.gratia.condor', 'org.osg.gratia.pbs'])
+            settings._enable_metrics('ce.host.com', ['org.osg.gratia.metric'], ['--arg', 'dir=/tmp'])
+            settings._run_metric_batch()
+            settings._sync_rsv_files()
+
+            config = ConfigParser.RawConfigParser()
+            config.optionxform = str
+            config.read(os.path.join(temp_dir, 'ce.host.com.conf'))
+            self.assertEqual([('org.osg.gratia.condor', '1'),
+                              ('org.osg.gratia.metric', '1'),
+                              ('org.osg.gratia.pbs', '1')],
+                             sorted(config.items('ce.host.com')))
+            config.read(os.path.join(temp_dir, 'metrics', 'ce.host.com', 'org.osg.gratia.metric.conf'))
+            self.assertEqual('/tmp', config.get('org.osg.gratia.metric args', 'dir'))
+            self.assertTrue(settings._check_metric_configs(),
+                            "Native writer output doesn't match itself")
+
+            settings._enable_metrics('ce.host.com', ['org.osg.missing'])
+            self.assertRaises(exceptions.ConfigureError, settings._run_metric_batch)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def testSyncRsvFiles(self):
+        """
+        Test that only the metric files that changed are written and the ones
+        no longer wanted are removed
+        """
+        settings = self.load_settings_from_files("rsv/rsv1.ini")
+        temp_dir = tempfile.mkdtemp()
+        try:
+            settings.rsv_conf_dir = temp_dir
+            settings.rsv_metrics_dir = os.path.join(temp_dir, 'metrics')
+            for filename, contents in [('rsv.conf', 'rsv settings'),
+                                       ('old.host.com.conf', 'old metrics'),
+                                       ('ce.host.com.conf', rsv.config_text({'ce.host.com': {'a': '1'}})),
+                                       ('metrics/old.host.com/allmetrics.conf', 'old'),
+                                       ('metrics/ce.host.com/b.conf', 'old args')]:
+                path = os.path.join(temp_dir, filename)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, 'w').write(contents)
+            unchanged_stat = os.stat(os.path.join(temp_dir, 'ce.host.com.conf'))
+
+            settings._desired_files = {
+                os.path.join(temp_dir, 'ce.host.com.conf'): rsv.config_text({'ce.host.com': {'a': '1'}}),
+                os.path.join(temp_dir, 'metrics/ce.host.com/b.conf'): 'new args',
+                os.path.join(temp_dir, 'consumers.conf'): 'consumers'}
+            settings._sync_rsv_files()
+
+            self.assertEqual(sorted(['ce.host.com.conf', 'consumers.conf', 'metrics/ce.host.com/b.conf']),
+                             sorted([os.path.relpath(x, temp_dir) for x in settings._managed_rsv_files()]))
+            self.assertEqual('rsv settings', open(os.path.join(temp_dir, 'rsv.conf')).read())
+            self.assertEqual('new args', open(os.path.join(temp_dir, 'metrics/ce.host.com/b.conf')).read())
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'metrics/old.host.com')),
+                             "Directory of removed host not cleaned up")
+            self.assertEqual(unchanged_stat.st_ino, os.stat(os.path.join(temp_dir, 'ce.host.com.conf')).st_ino,
+                             "Unchanged file was rewritten")
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def testRemoveStaleRsvFiles(self):
+        """
+        Test that with rsv-control only the metric and consumer files with
+        settings that are no longer wanted are removed
+        """
+        settings = self.load_settings_from_files("rsv/rsv1.ini")
+        settings.load_rsv_meta_files()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            settings.rsv_conf_dir = temp_dir
+            settings.rsv_metrics_dir = os.path.join(temp_dir, 'metrics')
+            settings.options['enable_nagios'].value = False
+            settings.options['enable_zabbix'].value = False
+            settings.htcondor_gateway_enabled = True
+            settings._htcondor_ce_hosts = ['ce.host.com']
+            ce_conf = rsv.config_text({'ce.host.com': {'org.osg.gratia.condor': '1'}})
+            for filename, contents in [('rsv.conf', 'rsv settings'),
+                                       ('old.host.com.conf', rsv.config_text({'old.host.com': {'a': '1'}})),
+                                       ('ce.host.com.conf', ce_conf),
+                                       ('gums.host.com.conf', rsv.config_text({'gums.host.com': {
+                                           'org.osg.gratia.condor': '1', 'org.osg.gratia.pbs': '1'}})),
+                                       ('consumers.conf', rsv.config_text({'consumers': {
+                                           'enabled': 'html-consumer, nagios-consumer'}})),
+                                       ('metrics/old.host.com/allmetrics.conf', 'old'),
+                                       ('metrics/ce.host.com/allmetrics.conf', rsv.config_text({'allmetrics': {
+                                           'ce-type': 'htcondor-ce'}}))]:
+                path = os.path.join(temp_dir, filename)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, 'w').write(contents)
+            unchanged_stat = os.stat(os.path.join(temp_dir, 'ce.host.com.conf'))
+
+            settings._enable_metrics('ce.host.com', ['org.osg.gratia.condor', 'org.osg.gratia.pbs'])
+            settings._enable_metrics('gums.host.com', ['org.osg.gratia.condor'])
+            settings._remove_stale_rsv_files()
+
+            self.assertEqual(sorted(['ce.host.com.conf', 'metrics/ce.host.com/allmetrics.conf']),
+                             sorted([os.path.relpath(x, temp_dir) for x in settings._managed_rsv_files()]))
+            self.assertEqual('rsv settings', open(os.path.join(temp_dir, 'rsv.conf')).read())
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'metrics/old.host.com')),
+                             "Directory of removed host not cleaned up")
+            self.assertEqual(unchanged_stat.st_ino, os.stat(os.path.join(temp_dir, 'ce.host.com.conf')).st_ino,
+                             "File rsv-control only adds to was removed")
+        finally:
+            shutil.rmtree(temp_dir)
+
 
 if __name__ == '__main__':
     console = logging.StreamHandler()
@@ -0,0 +1,132 @@
+"""Unit tests to test scheduler functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+import logging
+import threading
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import exceptions
+from osg_configure.modules import scheduler
+from osg_configure.modules.baseconfiguration import BaseConfiguration
+
+
+class ListHandler(logging.Handler):
+    """Handler that keeps the messages it gets"""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class FakeConfiguration(BaseConfiguration):
+    """Configuration module with declared inputs and outputs"""
+
+    def __init__(self, name, written=None, produced=None, consumed=None):
+        super(FakeConfiguration, self).__init__()
+        self.name = name
+        self.written = written or []
+        self.produced = set(produced or [])
+        self.consumed = set(consumed or [])
+
+    def written_files(self):
+        return self.written
+
+    def produced_attributes(self):
+        return self.produced
+
+    def consumed_attributes(self):
+        return self.consumed
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Class to test scheduler module
+    """
+
+    def setUp(self):
+        self.handler = ListHandler()
+        logging.getLogger().addHandler(self.handler)
+        self.level = logging.getLogger().level
+        logging.getLogger().setLevel(logging.INFO)
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+        logging.getLogger().setLevel(self.level)
+
+    def test_module_dependencies(self):
+        """
+        Test that modules wait for earlier modules sharing files or attributes
+        """
+        modules = [FakeConfiguration('a', written=['/etc/blah.config']),
+                   FakeConfiguration('b', written=['/etc/gratia']),
+                   FakeConfiguration('c', written=['/etc/blah.config'], produced=['X']),
+                   FakeConfiguration('d', written=['/etc/gratia/condor/ProbeConfig'], consumed=['X']),
+                   FakeConfiguration('e')]
+        self.assertEqual([set(), set(), set([0]), set([1, 2]), set()],
+                         scheduler.module_dependencies(modules))
+
+    def test_run_modules(self):
+        """
+        Test that modules run in dependency order and log in module order
+        """
+        modules = [FakeConfiguration('a', written=['/etc/blah.config']),
+                   FakeConfiguration('b'),
+                   FakeConfiguration('c', written=['/etc/blah.config']),
+                   FakeConfiguration('d')]
+        # b and d hold up a until they run, so they have to run in parallel
+        b_started = threading.Event()
+        d_started = threading.Event()
+        order = []
+
+        def task(module):
+            if module.name == 'a':
+                b_started.wait(5)
+                d_started.wait(5)
+            elif module.name == 'b':
+                b_started.set()
+            elif module.name == 'd':
+                d_started.set()
+            logging.info("running %s" % module.name)
+            order.append(module.name)
+            return module.name
+
+        results = scheduler.run_modules(modules, task, jobs=3)
+        self.assertEqual(['a', 'b', 'c', 'd'], results)
+        self.assertTrue(order.index('a') < order.index('c'), "c ran before a")
+        self.assertNotEqual(['a', 'b', 'c', 'd'], order, "Modules didn't run in parallel")
+        self.assertEqual(["running %s" % x for x in ['a', 'b', 'c', 'd']],
+                         self.handler.messages,
+                         "Log messages not in module order")
+
+    def test_run_modules_error(self):
+        """
+        Test that errors in a module are raised and stop later modules
+        """
+        modules = [FakeConfiguration('a', written=['/etc/blah.config']),
+                   FakeConfiguration('b', written=['/etc/blah.config'])]
+        ran = []
+
+        def task(module):
+            ran.append(module.name)
+            if module.name == 'a':
+                raise exceptions.ConfigureError('failed')
+            return True
+
+        self.assertRaises(exceptions.ConfigureError,
+                          scheduler.run_modules, modules, task, 2)
+        self.assertEqual(['a'], ran)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Unit tests to test uservomap functions"""
+
+# pylint: disable=W0703
+# pylint: disable=R0904
+
+import os
+import sys
+import unittest
+import shutil
+import tempfile
+
+# setup system library path
+pathname = os.path.realpath('../')
+sys.path.insert(0, pathname)
+
+from osg_configure.modules import uservomap
+from osg_configure.modules.utilities import get_test_config
+
+
+class TestUserVoMap(unittest.TestCase):
+    """
+    Class to test uservomap module
+    """
+
+    def test_user_vo_map(self):
+        """
+        Test that VOs, accounts and validation results come from one read
+        """
+        user_vo_map = uservomap.UserVoMap(get_test_config('test_files/invalid-user-vo-map.txt'))
+        self.assertEqual(['osg', 'LIGO', 'cdf', 'compbiogrid', 'des', 'DOSAR', 'dzero', '34f3'],
+                         user_vo_map.get_vos())
+        self.assertTrue(user_vo_map.has_vo('LIGO'))
+        self.assertFalse(user_vo_map.has_vo('ligo'))
+        self.assertEqual('dzero', user_vo_map.account_vo('sam'))
+        self.assertEqual(None, user_vo_map.account_vo('nobody'))
+        self.assertFalse(user_vo_map.valid)
+        self.assertEqual(['fdjkf394f023', 'sam= 34f3'], user_vo_map.invalid_lines)
+
+        user_vo_map = uservomap.UserVoMap(get_test_config('test_files/missing-user-vo-map.txt'))
+        self.assertFalse(user_vo_map.valid)
+        self.assertEqual([], user_vo_map.get_vos())
+
+    def test_load(self):
+        """
+        Test that load() shares a map until the file changes
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            map_file = os.path.join(temp_dir, 'user-vo-map')
+            shutil.copy(get_test_config('test_files/sample-vos.txt'), map_file)
+            user_vo_map = uservomap.load(map_file)
+            self.assertTrue(user_vo_map.valid)
+            self.assertTrue(user_vo_map is uservomap.load(map_file), "File read again")
+
+            map_fh = open(map_file, 'a')
+            map_fh.write("usatlas1 usatlas\n")
+            map_fh.close()
+            user_vo_map = uservomap.load(map_file)
+            self.assertEqual(['osg', 'LIGO', 'cdf', 'atlas'], user_vo_map.get_vos())
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
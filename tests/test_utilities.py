@@ -7,6 +7,12 @@ import os
 import sys
 import unittest
 import imp
+import glob
+import shutil
+import tempfile
+import threading
+import time
+import cStringIO
 
 # setup system library path
 pathname = os.path.realpath('../')
@@ -136,6 +142,449 @@ class TestUtilities(unittest.TestCase):
         self.assertTrue(utilities.any_rpms_installed('filesystem', '__foo__'))
         self.assertFalse(utilities.any_rpms_installed('__foo__', '__bar__'))
 
+    def test_fetch_crl(self):
+        """
+        Test that fetch-crl output is passed on and whitelisted errors and
+        the deadline don't cause failures
+        """
+        if glob.glob('/etc/grid-security/certificates/*.r0'):
+            return
+        temp_dir = tempfile.mkdtemp()
+        old_stdout = sys.stdout
+        try:
+            def run_fetch_crl(script_text, deadline=None):
+                crl_path = os.path.join(temp_dir, 'fetch-crl')
+                script = open(crl_path, 'w')
+                script.write("#!/bin/sh\n" + script_text)
+                script.close()
+                os.chmod(crl_path, 0o755)
+                sys.stdout = cStringIO.StringIO()
+                try:
+                    result = utilities.FetchCrl(crl_path, deadline).start().wait()
+                    return result, sys.stdout.getvalue()
+                finally:
+                    sys.stdout = old_stdout
+
+            result, output = run_fetch_crl("echo 'Download error for CA1'\nexit 1\n")
+            self.assertTrue(result, "Whitelisted error caused a failure")
+            self.assertTrue("fetch-crl: Download error for CA1\n" in output)
+            result, output = run_fetch_crl("echo 'Unexpected error'\nexit 1\n")
+            self.assertFalse(result, "Unexpected error not reported")
+            start = time.time()
+            result, output = run_fetch_crl("echo started\nexec sleep 10\n", deadline=0.5)
+            self.assertTrue(result)
+            self.assertTrue(time.time() - start < 5, "Deadline not enforced")
+            self.assertTrue("fetch-crl: started\n" in output)
+        finally:
+            sys.stdout = old_stdout
+            shutil.rmtree(temp_dir)
+
+    def test_package_index(self):
+        """
+        Test that installed packages are looked up in an index read once
+        from the package backend
+        """
+        calls = []
+
+        def backend():
+            calls.append(1)
+            return ['htcondor-ce', 'frontier-squid']
+
+        utilities.set_package_backend(backend)
+        try:
+            self.assertTrue(utilities.rpm_installed('htcondor-ce'))
+            self.assertFalse(utilities.rpm_installed('osg-ce'))
+            self.assertTrue(utilities.rpm_installed(['htcondor-ce', 'frontier-squid']))
+            self.assertFalse(utilities.rpm_installed(['htcondor-ce', 'osg-ce']))
+            self.assertTrue(utilities.any_rpms_installed('osg-ce', 'htcondor-ce'))
+            self.assertFalse(utilities.any_rpms_installed(['osg-ce', 'osg-htcondor-ce']))
+            self.assertTrue(utilities.gateway_installed())
+            self.assertFalse(utilities.ce_installed())
+            self.assertEqual(frozenset(['htcondor-ce', 'frontier-squid']),
+                             utilities.package_index().names())
+            self.assertEqual(1, len(calls), "Package backend queried more than once")
+        finally:
+            utilities.set_package_backend()
+
+    def test_condor_config_query(self):
+        """
+        Test that CondorConfigQuery looks up several variables in one call
+        and remembers them
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            log_file = os.path.join(temp_dir, 'calls')
+            executable = os.path.join(temp_dir, 'condor_config_val')
+            script = open(executable, 'w')
+            script.write("""#!/bin/sh
+echo "$@" >> %s
+for var in "$@"; do
+    case "$var" in
+        SPOOL) echo "SPOOL = /var/lib/condor/spool"
+               echo " # at: /etc/condor/condor_config, line 12"
+               echo " # raw: SPOOL = \\$(LOCAL_DIR)/spool" ;;
+        FULL_HOSTNAME) echo "FULL_HOSTNAME = host.example.com"
+                       echo " # at: <Default>" ;;
+        -*) ;;
+        *) echo "Not defined: $var" >&2 ;;
+    esac
+done
+""" % log_file)
+            script.close()
+            os.chmod(executable, 0o755)
+
+            query = utilities.CondorConfigQuery(executable)
+            query.fetch(['SPOOL', 'FULL_HOSTNAME', 'MISSING'])
+            self.assertEqual('/var/lib/condor/spool', query.get('SPOOL'))
+            self.assertEqual(('/etc/condor/condor_config', 12), query.location('SPOOL'))
+            self.assertEqual('host.example.com', query.get('full_hostname'))
+            self.assertEqual(None, query.location('FULL_HOSTNAME'))
+            self.assertEqual(None, query.get('MISSING', quiet_undefined=True))
+            self.assertTrue(query.error('MISSING').startswith('Not defined:'))
+            self.assertEqual(['-verbose SPOOL FULL_HOSTNAME MISSING'],
+                             open(log_file).read().splitlines())
+
+            query.clear()
+            self.assertEqual('/var/lib/condor/spool', query.get('SPOOL'))
+            self.assertEqual(2, len(open(log_file).read().splitlines()))
+
+            query = utilities.CondorConfigQuery(os.path.join(temp_dir, 'missing'))
+            self.assertEqual(None, query.get('SPOOL'))
+            self.assertTrue(query.error('SPOOL').startswith('Error running'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_condor_config_query_bindings(self):
+        """
+        Test that CondorConfigQuery reads values with the HTCondor bindings
+        when they are available, without changing the environment
+        """
+        class FakeBindings(object):
+            def __init__(self):
+                self.param = {}
+                self.configs = []
+
+            def reload_config(self):
+                self.configs.append(os.environ['CONDOR_CONFIG'])
+                self.param = {'SPOOL': '/var/lib/condor/spool'}
+
+        old_bindings = utilities._htcondor
+        old_config = os.environ.get('CONDOR_CONFIG')
+        bindings = FakeBindings()
+        utilities._htcondor = bindings
+        try:
+            os.environ['CONDOR_CONFIG'] = '/etc/condor/condor_config'
+            query = utilities.CondorConfigQuery('condor_config_val')
+            query.fetch(['SPOOL', 'MISSING'])
+            self.assertEqual('/var/lib/condor/spool', query.get('SPOOL'))
+            self.assertEqual(None, query.get('MISSING', quiet_undefined=True))
+            self.assertEqual(['/etc/condor/condor_config'], bindings.configs)
+            self.assertEqual('/etc/condor/condor_config', os.environ['CONDOR_CONFIG'])
+
+            # other configs and daemons can't be queried with the bindings
+            query = utilities.CondorConfigQuery('/nonexistent/condor_ce_config_val')
+            self.assertEqual(None, query.get('SPOOL', quiet_undefined=True))
+            query = utilities.CondorConfigQuery('/nonexistent/condor_config_val', daemon='schedd')
+            self.assertEqual(None, query.get('SPOOL', quiet_undefined=True))
+            self.assertEqual(1, len(bindings.configs))
+        finally:
+            utilities._htcondor = old_bindings
+            if old_config is None:
+                del os.environ['CONDOR_CONFIG']
+            else:
+                os.environ['CONDOR_CONFIG'] = old_config
+
+    def test_write_transaction(self):
+        """
+        Test that writes in a transaction are staged until commit and thrown
+        away on abort
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            existing = os.path.join(temp_dir, 'existing')
+            new = os.path.join(temp_dir, 'new')
+            utilities.atomic_write(existing, 'old', mode=0o600)
+
+            transaction = utilities.write_transaction()
+            try:
+                self.assertRaises(RuntimeError, utilities.write_transaction)
+                self.assertTrue(utilities.atomic_write(existing, 'first'))
+                self.assertTrue(utilities.atomic_write(existing, 'second'))
+                self.assertTrue(utilities.atomic_write(new, 'new'))
+                self.assertEqual('old', open(existing).read())
+                self.assertFalse(os.path.exists(new))
+                self.assertEqual('second', utilities.read_file(existing))
+                self.assertEqual('new', utilities.read_contents(new))
+                self.assertTrue(transaction.commit())
+            finally:
+                transaction.abort()
+            self.assertEqual('second', open(existing).read())
+            self.assertEqual(0o600, os.stat(existing).st_mode & 0o777)
+            self.assertEqual('new', open(new).read())
+            self.assertEqual(['existing', 'new'], sorted(os.listdir(temp_dir)))
+
+            transaction = utilities.write_transaction()
+            utilities.atomic_write(existing, 'aborted')
+            utilities.atomic_write(os.path.join(temp_dir, 'aborted'), 'aborted')
+            transaction.abort()
+            self.assertEqual('second', open(existing).read())
+            self.assertEqual(['existing', 'new'], sorted(os.listdir(temp_dir)))
+
+            # a file that can't be renamed into place rolls back the others
+            os.mkdir(os.path.join(temp_dir, 'directory'))
+            transaction = utilities.write_transaction()
+            utilities.atomic_write(existing, 'rolled back')
+            utilities.atomic_write(os.path.join(temp_dir, 'created'), 'rolled back')
+            utilities.atomic_write(os.path.join(temp_dir, 'directory'), 'not a directory')
+            self.assertFalse(transaction.commit())
+            self.assertEqual('second', open(existing).read())
+            self.assertEqual(['directory', 'existing', 'new'], sorted(os.listdir(temp_dir)))
+            self.assertTrue(utilities.sync_writes())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_transaction_abort_after_sync(self):
+        """
+        Test that aborting a transaction puts back files written by
+        sync_writes() before the abort
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            existing = os.path.join(temp_dir, 'existing')
+            new = os.path.join(temp_dir, 'new')
+            utilities.atomic_write(existing, 'old', mode=0o600)
+
+            transaction = utilities.write_transaction()
+            self.assertTrue(utilities.atomic_write(existing, 'first'))
+            self.assertTrue(utilities.atomic_write(new, 'new'))
+            self.assertTrue(utilities.sync_writes())
+            self.assertEqual('first', open(existing).read())
+            self.assertEqual('new', open(new).read())
+            self.assertTrue(utilities.atomic_write(existing, 'second'))
+            self.assertTrue(utilities.sync_writes())
+            self.assertTrue(utilities.atomic_write(os.path.join(temp_dir, 'staged'), 'staged'))
+            transaction.abort()
+            self.assertEqual('old', open(existing).read())
+            self.assertEqual(0o600, os.stat(existing).st_mode & 0o777)
+            self.assertEqual(['existing'], os.listdir(temp_dir))
+
+            # a failed commit puts back the flushed files too
+            os.mkdir(os.path.join(temp_dir, 'directory'))
+            transaction = utilities.write_transaction()
+            utilities.atomic_write(existing, 'flushed')
+            self.assertTrue(utilities.sync_writes())
+            utilities.atomic_write(os.path.join(temp_dir, 'directory'), 'not a directory')
+            self.assertFalse(transaction.commit())
+            self.assertEqual('old', open(existing).read())
+            self.assertEqual(['directory', 'existing'], sorted(os.listdir(temp_dir)))
+
+            # a successful commit keeps them and removes the links
+            transaction = utilities.write_transaction()
+            utilities.atomic_write(existing, 'flushed')
+            self.assertTrue(utilities.sync_writes())
+            self.assertTrue(transaction.commit())
+            transaction.abort()
+            self.assertEqual('flushed', open(existing).read())
+            self.assertEqual(['directory', 'existing'], sorted(os.listdir(temp_dir)))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_transaction_hidden_files(self):
+        """
+        Test that the temporary files and rollback links of a transaction
+        are hidden, so HTCondor doesn't parse them from config.d
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(temp_dir, '10-osg-attributes-generated.conf')
+            utilities.atomic_write(config_file, 'OSG_ResourceCatalog = old\n')
+            transaction = utilities.write_transaction()
+            try:
+                self.assertTrue(utilities.atomic_write(config_file, 'OSG_ResourceCatalog = new\n'))
+                self.assertEqual([os.path.basename(config_file)],
+                                 [name for name in os.listdir(temp_dir) if not name.startswith('.')])
+                self.assertTrue(utilities.sync_writes())
+                self.assertEqual([os.path.basename(config_file)],
+                                 [name for name in os.listdir(temp_dir) if not name.startswith('.')])
+                self.assertEqual('OSG_ResourceCatalog = new\n', open(config_file).read())
+                self.assertTrue(transaction.commit())
+            finally:
+                transaction.abort()
+            self.assertEqual([os.path.basename(config_file)], os.listdir(temp_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_managed_files(self):
+        """
+        Test that edits of a file in a transaction are written once, and not
+        at all if they don't change it
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            blah_config = os.path.join(temp_dir, 'blah.config')
+            ce_config = os.path.join(temp_dir, 'ce.conf')
+            unchanged = os.path.join(temp_dir, 'unchanged')
+            utilities.atomic_write(blah_config, 'lsf_binpath="/usr/bin"\n')
+            utilities.atomic_write(unchanged, 'GRIDMAP=/etc/grid-security/grid-mapfile\n')
+            os.utime(unchanged, (0, 0))
+
+            transaction = utilities.write_transaction()
+            try:
+                self.assertTrue(utilities.edit_settings(blah_config, [('lsf_binpath', '/opt/lsf/bin')]))
+                self.assertTrue(utilities.edit_settings(blah_config, [('lsf_confpath', '/etc/lsf')]))
+                self.assertTrue(utilities.edit_settings(ce_config, [('OSG_CONFIGURED', 'true')],
+                                                        quote_value=False, default='# managed\n'))
+                self.assertTrue(utilities.edit_file(ce_config, lambda contents: contents + 'A=b\n'))
+                self.assertTrue(utilities.edit_settings(unchanged,
+                                                        [('GRIDMAP', '/etc/grid-security/grid-mapfile')],
+                                                        quote_value=False))
+                self.assertFalse(utilities.edit_file(os.path.join(temp_dir, 'missing'), lambda c: c))
+                self.assertEqual('lsf_binpath="/usr/bin"\n', open(blah_config).read())
+                self.assertFalse(os.path.exists(ce_config))
+                self.assertEqual('lsf_binpath="/opt/lsf/bin"\nlsf_confpath="/etc/lsf"\n',
+                                 utilities.read_file(blah_config))
+                # a whole-file write replaces the buffered edits
+                self.assertTrue(utilities.atomic_write(ce_config, 'B=c\n'))
+                self.assertTrue(utilities.edit_file(ce_config, lambda contents: contents + 'A=b\n'))
+                self.assertTrue(transaction.commit())
+            finally:
+                transaction.abort()
+            self.assertEqual('lsf_binpath="/opt/lsf/bin"\nlsf_confpath="/etc/lsf"\n', open(blah_config).read())
+            self.assertEqual('B=c\nA=b\n', open(ce_config).read())
+            self.assertEqual(0, os.stat(unchanged).st_mtime)
+
+            # without a transaction the edit is written right away
+            self.assertTrue(utilities.edit_settings(blah_config, [('lsf_confpath', '/etc/lsf')]))
+            self.assertTrue(utilities.edit_settings(unchanged, [('GRIDMAP', '/etc/grid-security/grid-mapfile')],
+                                                    quote_value=False))
+            self.assertEqual(0, os.stat(unchanged).st_mtime)
+            self.assertTrue(utilities.edit_settings(blah_config, [('lsf_confpath', '/etc/lsf2')]))
+            self.assertEqual('lsf_binpath="/opt/lsf/bin"\nlsf_confpath="/etc/lsf2"\n', open(blah_config).read())
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+    def test_managed_files_threads(self):
+        """
+        Test that editing a managed file while another thread flushes the
+        transaction doesn't deadlock
+        """
+        temp_dir = tempfile.mkdtemp()
+        real_read_file = utilities.read_file
+        flushed = threading.Event()
+
+        def flush():
+            utilities.sync_writes()
+            flushed.set()
+
+        def read_file(filename, default=None):
+            # start a flush while the edit is in progress
+            flusher = threading.Thread(target=flush)
+            flusher.setDaemon(True)
+            flusher.start()
+            flushed.wait(0.5)
+            return real_read_file(filename, default)
+
+        try:
+            blah_config = os.path.join(temp_dir, 'blah.config')
+            utilities.atomic_write(blah_config, 'a="b"\n')
+            transaction = utilities.write_transaction()
+            editor = threading.Thread(target=utilities.edit_settings, args=(blah_config, [('c', 'd')]))
+            editor.setDaemon(True)
+            try:
+                utilities.atomic_write(os.path.join(temp_dir, 'staged'), 'staged')
+                utilities.read_file = read_file
+                editor.start()
+                editor.join(10)
+                utilities.read_file = real_read_file
+                flushed.wait(10)
+                self.assertFalse(editor.isAlive(), "edit deadlocked")
+                self.assertTrue(flushed.isSet(), "flush deadlocked")
+                self.assertTrue(transaction.commit())
+            finally:
+                utilities.read_file = real_read_file
+                # aborting would hang too if the threads deadlocked
+                if not editor.isAlive() and flushed.isSet():
+                    transaction.abort()
+            self.assertEqual('a="b"\nc="d"\n', open(blah_config).read())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_skip_unchanged_writes(self):
+        """
+        Test that writing the contents a file already has leaves it alone
+        and is counted as unchanged
+        """
+        temp_dir = tempfile.mkdtemp()
+        utilities.reset_write_stats()
+        try:
+            config_d = os.path.join(temp_dir, 'config.d')
+            os.mkdir(config_d)
+            ce_config = os.path.join(config_d, '50-osg-configure.conf')
+            attributes = os.path.join(temp_dir, 'osg-job-environment.conf')
+            self.assertTrue(utilities.atomic_write(ce_config, 'A=b\n'))
+            utilities.write_attribute_file(attributes, {'OSG_SITE_NAME': 'site'})
+            os.utime(ce_config, (0, 0))
+            os.utime(attributes, (0, 0))
+            utilities.reset_write_stats()
+
+            self.assertTrue(utilities.atomic_write(ce_config, 'A=b\n'))
+            utilities.write_attribute_file(attributes, {'OSG_SITE_NAME': 'site'})
+            self.assertEqual(0, os.stat(ce_config).st_mtime)
+            self.assertEqual(0, os.stat(attributes).st_mtime)
+            # a different mode is a change
+            self.assertTrue(utilities.atomic_write(ce_config, 'A=b\n', mode=0o600))
+            self.assertNotEqual(0, os.stat(ce_config).st_mtime)
+            self.assertEqual([ce_config], utilities.write_stats().changed_files())
+            self.assertEqual("1 file changed, 1 unchanged", utilities.write_stats().summary())
+
+            utilities.reset_write_stats()
+            os.utime(ce_config, (0, 0))
+            transaction = utilities.write_transaction()
+            try:
+                self.assertTrue(utilities.atomic_write(ce_config, 'A=c\n'))
+                self.assertTrue(utilities.atomic_write(ce_config, 'A=b\n'))
+                utilities.write_attribute_file(attributes, {'OSG_SITE_NAME': 'other'})
+                self.assertTrue(transaction.commit())
+            finally:
+                transaction.abort()
+            self.assertEqual(0, os.stat(ce_config).st_mtime)
+            self.assertEqual([attributes], utilities.write_stats().changed_files())
+            self.assertEqual("1 file changed, 1 unchanged", utilities.write_stats().summary())
+            self.assertEqual(['config.d', 'osg-job-environment.conf'], sorted(os.listdir(temp_dir)))
+            self.assertEqual(['50-osg-configure.conf'], os.listdir(config_d))
+        finally:
+            utilities.reset_write_stats()
+            shutil.rmtree(temp_dir)
+
+
+    def test_add_or_replace_settings(self):
+        """
+        Test that settings are replaced in place, comments and other lines
+        are kept, and missing settings are added at the end
+        """
+        blah_config = ('# blah.config\n'
+                       '#lsf_binpath=/usr/bin\n'
+                       '  lsf_binpath = "/usr/bin"\n'
+                       'lsf_confpath="/etc"\n'
+                       'lsf_binpath="/duplicate"\n'
+                       'pbs_binpath="/usr/bin"')
+        self.assertEqual('# blah.config\n'
+                         '#lsf_binpath=/usr/bin\n'
+                         'lsf_binpath="/opt/lsf/bin"\n'
+                         'lsf_confpath="/etc"\n'
+                         'lsf_binpath="/duplicate"\n'
+                         'pbs_binpath="/usr/bin"\n'
+                         'sge_rootpath="/sge"\n'
+                         'sge_cellname="cell"\n',
+                         utilities.add_or_replace_settings(blah_config, [('sge_rootpath', '/old'),
+                                                                         ('lsf_binpath', '/opt/lsf/bin'),
+                                                                         ('sge_cellname', 'cell'),
+                                                                         ('sge_rootpath', '/sge')]))
+        self.assertEqual('A=b\nB=c\n', utilities.add_or_replace_setting('A=b\n', 'B', 'c', quote_value=False))
+        self.assertEqual('A=c', utilities.add_or_replace_setting('A=b', 'A', 'c', quote_value=False))
+        self.assertEqual('A=b\\1\n', utilities.add_or_replace_setting('A=c\n', 'A', 'b\\1', quote_value=False))
+
 
 if __name__ == '__main__':
     unittest.main()
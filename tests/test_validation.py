@@ -174,6 +174,27 @@ class TestValidation(unittest.TestCase):
         self.assertTrue(validation.valid_ini_file(filename),
                         "Got error on valid file %s" % filename)
 
+    def test_scan_ini_file(self):
+        """
+        Test that scan_ini_file reports problems with their locations
+        """
+        filename = get_test_config('utilities/newline.ini')
+        entries, diagnostics = validation.scan_ini_file(filename)
+        self.assertEqual([(1, 'Test', None, None), (2, 'Test', 'bad_option', 'fdfd')], entries)
+        self.assertEqual([(3, 2, 'continuation-line'), (4, 2, 'continuation-line')],
+                         [(x.line, x.column, x.kind) for x in diagnostics])
+        self.assertTrue(diagnostics[0].is_error())
+
+        filename = get_test_config('utilities/invalid_ref2.ini')
+        diagnostics = validation.scan_ini_file(filename)[1]
+        self.assertEqual([(3, 7, 'bad-reference')],
+                         [(x.line, x.column, x.kind) for x in diagnostics])
+        self.assertFalse(diagnostics[0].is_error())
+
+        filename = get_test_config('utilities/valid_ref1.ini')
+        self.assertEqual([], validation.scan_ini_file(filename)[1],
+                         "Got diagnostics for valid file %s" % filename)
+
     # Functionality has been broken for several versions and not going to be added in
     # 1.0.40 will be fixed for 1.0.41
     #   def test_valid_references(self):